@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+# backtest.py
+"""历史回测：在本地K线仓库上按交易日重放 成交金额 → 强势 → 技术 筛选，统计入选后N日收益
+
+不联网，只读 BarStore 已保存的数据。每支股票在自己的K线序列上用规则集的序列模式求值
+（每根K线只看到当时及之前的数据），再按日期对齐：60分钟线取当日最后一根的结果。
+代码按批分给进程池，各批互不依赖。
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from barstore import BarStore
+from panel import build_panel
+from rules import AMOUNT, QIANGRI, TECHNICAL, technical_fields
+
+HORIZONS = (1, 5, 10, 20)
+
+
+class BacktestResult:
+    """回测结果
+
+    selections: 每个 (日期, 代码) 入选记录及其后 N 日收益（次日开盘买入，第 N 日收盘计）
+    funnel: 每日各阶段通过数
+    """
+
+    def __init__(self, selections, funnel, horizons):
+        self.selections = selections
+        self.funnel = funnel
+        self.horizons = horizons
+
+    def summary(self):
+        """各持有期的样本数、平均/中位收益与胜率"""
+        rows = []
+        for h in self.horizons:
+            returns = self.selections[f'ret_{h}'].dropna()
+            rows.append({
+                '持有天数': h,
+                '样本数': len(returns),
+                '平均收益': returns.mean(),
+                '中位收益': returns.median(),
+                '胜率': (returns > 0).mean() if len(returns) else np.nan,
+            })
+        return pd.DataFrame(rows).set_index('持有天数')
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.selections.to_csv(os.path.join(directory, 'selections.csv'), index=False)
+        self.funnel.to_csv(os.path.join(directory, 'funnel.csv'))
+        self.summary().to_csv(os.path.join(directory, 'summary.csv'))
+
+
+DAILY_FIELDS = {'open': '开盘', 'close': '收盘', 'volume': '成交量'}
+MINUTE_FIELDS = {'high': '最高', 'low': '最低', 'close': '收盘', 'amount': '成交额'}
+DAILY_STAGES = ('qiangrizhangfu',)  # 其余阶段用60分钟线
+FUNNEL = ('amount', 'qiangrizhangfu', 'technical')
+
+
+def bar_panel(frames, codes, columns, time_col):
+    """右对齐的字段面板 + 每格所属日期（补齐处为NaT）"""
+    width = max([len(frames[code]) for code in codes] + [1])
+    fields = {
+        field: build_panel([frames[code][column].values if len(frames[code]) else [] for code in codes], width)[0]
+        for field, column in columns.items()
+    }
+    dates = np.full((len(codes), width), np.datetime64('NaT'), dtype='datetime64[D]')
+    for i, code in enumerate(codes):
+        n = len(frames[code])
+        if n:
+            dates[i, width - n:] = pd.to_datetime(frames[code][time_col]).values.astype('datetime64[D]')
+    lengths = np.array([len(frames[code]) for code in codes], dtype=int)
+    return fields, lengths, dates
+
+
+def on_dates(values, dates, grid, fill):
+    """(代码, K线) → (代码, 日期)：每个日期取该日最后一根K线的值，无K线的日期为 fill"""
+    out = np.full((values.shape[0], len(grid)), fill, dtype=np.asarray(values).dtype)
+    if not len(grid):
+        return out
+    idx = np.clip(np.searchsorted(grid, dates), 0, len(grid) - 1)
+    on_grid = ~np.isnat(dates) & (grid[idx] == dates)
+    last = np.ones(dates.shape, dtype=bool)
+    last[:, :-1] = dates[:, 1:] != dates[:, :-1]
+    rows, cols = np.nonzero(on_grid & last)
+    out[rows, idx[rows, cols]] = values[rows, cols]
+    return out
+
+
+def forward_returns(opens, closes, horizon):
+    """自身K线序列上的后N日收益：次日开盘买入，第N日收盘卖出"""
+    out = np.full(closes.shape, np.nan)
+    if horizon < closes.shape[1]:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[:, :-horizon] = closes[:, horizon:] / opens[:, 1:closes.shape[1] - horizon + 1] - 1
+    return out
+
+
+def load_arrays(store_root, codes, horizons, adjust='hfq'):
+    """读取一批代码，整理出与筛选参数无关的数组
+
+    日线字段（open/close/volume）、成交额与技术指标面板、各自的K线日期与长度，
+    交易日网格 grid，以及按网格对齐的后N日收益 ret_N。
+    """
+    store = BarStore(store_root, api=None)
+    daily = {code: store.load(code, 'daily', adjust) for code in codes}
+    minute = {code: store.load(code, '60', adjust) for code in codes}
+
+    d_fields, d_lengths, d_dates = bar_panel(daily, codes, DAILY_FIELDS, '日期')
+    m_fields, m_lengths, m_dates = bar_panel(minute, codes, MINUTE_FIELDS, '时间')
+    grid = np.unique(d_dates[~np.isnat(d_dates)])
+
+    arrays = {
+        **d_fields,
+        'amount': m_fields['amount'],
+        **technical_fields(m_fields['high'], m_fields['low'], m_fields['close']),
+        'd_lengths': d_lengths, 'd_dates': d_dates,
+        'm_lengths': m_lengths, 'm_dates': m_dates,
+        'grid': grid,
+    }
+    for h in horizons:
+        arrays[f'ret_{h}'] = on_dates(forward_returns(d_fields['open'], d_fields['close'], h), d_dates, grid, np.nan)
+    return arrays
+
+
+def stage_signal(arrays, stage, rules):
+    """单个阶段在每个交易日的通过情况，(代码, 日期) 布尔数组"""
+    prefix = 'd' if stage in DAILY_STAGES else 'm'
+    fields = {key: arrays[key] for key in rules.fields}
+    passed = rules.evaluate_series(fields, arrays[f'{prefix}_lengths'])
+    return on_dates(passed, arrays[f'{prefix}_dates'], arrays['grid'], False)
+
+
+def collect(arrays, codes, signals, horizons, start=None, end=None):
+    """按漏斗顺序相交各阶段信号，返回 (入选记录, 每日各阶段通过数)"""
+    grid = arrays['grid']
+    in_range = np.ones(len(grid), dtype=bool)
+    if start is not None:
+        in_range &= grid >= np.datetime64(pd.Timestamp(start).date())
+    if end is not None:
+        in_range &= grid <= np.datetime64(pd.Timestamp(end).date())
+    grid = grid[in_range]
+
+    funnel = {}
+    passed = np.ones((len(codes), len(grid)), dtype=bool)
+    for stage in FUNNEL:
+        passed &= signals[stage][:, in_range]
+        funnel[stage] = passed.sum(axis=0)
+    funnel = pd.DataFrame(funnel, index=pd.DatetimeIndex(grid, name='日期'))
+
+    rows, cols = np.nonzero(passed)
+    selections = pd.DataFrame({
+        '日期': pd.DatetimeIndex(grid[cols]),
+        '代码': [codes[row] for row in rows],
+        **{f'ret_{h}': arrays[f'ret_{h}'][:, in_range][rows, cols] for h in horizons},
+    })
+    return selections, funnel
+
+
+def run_chunk(store_root, codes, rule_sets, horizons, start=None, end=None, adjust='hfq'):
+    """回测一批代码，返回 (入选记录, 每日各阶段通过数)"""
+    arrays = load_arrays(store_root, codes, horizons, adjust)
+    signals = {stage: stage_signal(arrays, stage, rule_sets[stage]) for stage in FUNNEL}
+    return collect(arrays, codes, signals, horizons, start, end)
+
+
+class Backtest:
+    """多进程回测
+
+    rule_sets 默认使用 rules 中的内置规则集，可传入调整过参数的版本（键为阶段名）。
+    未包含市值初筛（本地没有历史市值），代码池由调用方给定。
+    """
+
+    def __init__(self, store_root, rule_sets=None, horizons=HORIZONS, adjust='hfq', workers=None, chunk_size=200):
+        self.store_root = store_root
+        self.rule_sets = {'amount': AMOUNT, 'qiangrizhangfu': QIANGRI, 'technical': TECHNICAL, **(rule_sets or {})}
+        self.horizons = tuple(horizons)
+        self.adjust = adjust
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+
+    def run(self, codes, start=None, end=None):
+        codes = [code.split('.')[0] for code in codes]
+        chunks = [codes[i:i + self.chunk_size] for i in range(0, len(codes), self.chunk_size)]
+        print(f"🔁 回测 {len(codes)} 支，{len(chunks)} 批，{self.workers} 进程")
+        start_time = time.time()
+
+        args = [(self.store_root, chunk, self.rule_sets, self.horizons, start, end, self.adjust) for chunk in chunks]
+        if self.workers <= 1 or len(chunks) <= 1:
+            parts = [run_chunk(*a) for a in args]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                parts = list(pool.map(run_chunk, *zip(*args)))
+
+        selections = pd.concat([p[0] for p in parts], ignore_index=True) if parts else pd.DataFrame()
+        if not selections.empty:
+            selections = selections.sort_values(['日期', '代码'], ignore_index=True)
+        funnel = pd.DataFrame()
+        for _, part in parts:
+            funnel = part if funnel.empty else funnel.add(part, fill_value=0)
+        funnel = funnel.fillna(0).astype(int).sort_index()
+
+        print(f"⏱️ 回测完成：{len(funnel)} 个交易日，入选 {len(selections)} 次，用时 {time.time() - start_time:.1f}s")
+        return BacktestResult(selections, funnel, self.horizons)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+# barstore.py
+"""本地K线仓库：按 周期_复权/代码 分区的列式压缩文件（Parquet + zstd），只增量拉取新K线"""
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from lazyimport import LazyModule
+from resample import INTRADAY_PERIODS, resample
+
+# 各周期的时间列（东财分钟线为"时间"，日线为"日期"）
+TIME_COLUMNS = {'daily': '日期'}
+MIN_TIME_COLUMN = '时间'
+
+# A股收盘时间
+SESSION_CLOSE = (15, 0)
+# 文件元数据：本地数据已覆盖的起始日期（早于第一根K线时说明该段本无数据，如节假日/上市前）
+COVERED_FROM_KEY = b'covered_from'
+
+pq = LazyModule('pyarrow.parquet')
+pa = LazyModule('pyarrow')
+
+
+def last_session_close(now=None):
+    """最近一个已收盘交易时段的收盘时间（按工作日估算，不识别节假日）"""
+    now = now or datetime.now()
+    close = now.replace(hour=SESSION_CLOSE[0], minute=SESSION_CLOSE[1], second=0, microsecond=0)
+    if now < close:
+        close -= timedelta(days=1)
+    while close.weekday() >= 5:
+        close -= timedelta(days=1)
+    return close
+
+
+def slice_by_date(df, time_col, start_date=None, end_date=None):
+    """按日期区间截取（与akshare相同的闭区间、按日匹配语义）"""
+    if df.empty or (start_date is None and end_date is None):
+        return df
+    index = pd.DatetimeIndex(pd.to_datetime(df[time_col]))
+    mask = pd.Series(True, index=df.index)
+    if start_date is not None:
+        mask &= index >= pd.Timestamp(start_date)
+    if end_date is not None:
+        end = pd.Timestamp(end_date)
+        if end == end.normalize():
+            end += pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+        mask &= index <= end
+    return df[mask.values].reset_index(drop=True)
+
+
+class BarStore:
+    """持久化K线仓库
+
+    目录结构：{root}/{period}_{adjust}/{code}.parquet，每个文件保存该代码全部已下载K线。
+    读取时先检查本地文件是否已覆盖最近一次收盘，未覆盖才从最后一根K线开始增量拉取，
+    最后一根K线会被重新下载覆盖（盘中获取的K线可能尚未走完）。
+    只适合后复权(hfq)或不复权数据：前复权会随除权改写历史价格，需要整段重下。
+
+    设置 resample_from（如 '5'）后，60/120分钟线与日线不再单独下载，而是由该周期分钟线
+    本地合成并落盘，每支股票只需下载一次；合成日线只覆盖本地分钟线的时间范围。
+    """
+
+    def __init__(self, root, api, call=None, resample_from=None):
+        self.root = root
+        self.api = api  # akshare模块（或接口相同的替身）
+        self.call = call or (lambda endpoint, func, **kwargs: func(**kwargs))  # 如 FetchEngine.call
+        self.resample_from = str(resample_from) if resample_from else None
+
+    def _fetch(self, endpoint, **kwargs):
+        return self.call(endpoint, getattr(self.api, endpoint), **kwargs)
+
+    def _path(self, code, period, adjust):
+        return os.path.join(self.root, f"{period}_{adjust or 'none'}", f"{code}.parquet")
+
+    @staticmethod
+    def _time_col(period):
+        return TIME_COLUMNS.get(period, MIN_TIME_COLUMN)
+
+    def codes(self, period, adjust='hfq'):
+        """本地已保存的代码"""
+        directory = os.path.dirname(self._path('', period, adjust))
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-len('.parquet')] for name in os.listdir(directory) if name.endswith('.parquet'))
+
+    def load(self, code, period, adjust='hfq'):
+        """读取本地K线（不联网），不存在时返回空表"""
+        path = self._path(code, period, adjust)
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        return pd.read_parquet(path)
+
+    def save(self, code, period, adjust, df, covered_from=None):
+        """原子写入：先写临时文件再替换，避免中断留下半个文件
+
+        covered_from 记入文件元数据，表示该日期起的数据已下载过（见 covered_from()）。
+        """
+        path = self._path(code, period, adjust)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if covered_from is not None:
+            metadata = dict(table.schema.metadata or {})
+            metadata[COVERED_FROM_KEY] = pd.Timestamp(covered_from).strftime("%Y%m%d").encode()
+            table = table.replace_schema_metadata(metadata)
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+
+    def covered_from(self, code, period, adjust='hfq'):
+        """本地数据已覆盖的起始日期；未记录时取第一根K线，无文件时返回 None"""
+        path = self._path(code, period, adjust)
+        if not os.path.exists(path):
+            return None
+        metadata = pq.read_schema(path).metadata or {}
+        if COVERED_FROM_KEY in metadata:
+            return pd.Timestamp(metadata[COVERED_FROM_KEY].decode())
+        stored = self.load(code, period, adjust)
+        return pd.to_datetime(stored[self._time_col(period)]).min() if not stored.empty else None
+
+    def is_fresh(self, code, period, adjust='hfq', now=None):
+        """本地文件是否在最近一次收盘之后更新过"""
+        path = self._path(code, period, adjust)
+        if not os.path.exists(path):
+            return False
+        return datetime.fromtimestamp(os.path.getmtime(path)) >= last_session_close(now)
+
+    def hist_min(self, code, period='60', adjust='hfq', start_date=None, end_date=None):
+        """分钟K线（同 ak.stock_zh_a_hist_min_em 的返回格式）"""
+        if self._derives(period):
+            return self._resampled(code, period, adjust, start_date, end_date)
+        df = self._update(
+            code, period, adjust,
+            fetch=lambda start: self._fetch(
+                'stock_zh_a_hist_min_em',
+                symbol=code,
+                period=period,
+                adjust=adjust,
+                start_date=start.strftime("%Y-%m-%d %H:%M:%S") if start is not None else "1979-09-01 09:32:00",
+                end_date="2222-01-01 09:32:00",
+            ),
+        )
+        return slice_by_date(df, self._time_col(period), start_date, end_date)
+
+    def hist_daily(self, code, adjust='hfq', start_date='20240101', end_date=None):
+        """日K线（同 ak.stock_zh_a_hist 的返回格式），首次下载从 start_date 开始
+
+        start_date 早于本地已覆盖的起始日期时才补拉前段（节假日、上市日晚于 start_date 不会反复补拉）。
+        """
+        if self._derives('daily'):
+            return self._resampled(code, 'daily', adjust, start_date, end_date)
+        df = self._update(
+            code, 'daily', adjust,
+            fetch=lambda start: self._fetch(
+                'stock_zh_a_hist',
+                symbol=code,
+                period="daily",
+                adjust=adjust,
+                start_date=start.strftime("%Y%m%d") if start is not None else start_date,
+                end_date=datetime.now().strftime("%Y%m%d"),
+            ),
+            backfill=lambda covered: self._fetch(
+                'stock_zh_a_hist',
+                symbol=code,
+                period="daily",
+                adjust=adjust,
+                start_date=start_date,
+                end_date=covered.strftime("%Y%m%d"),
+            ),
+            start=pd.Timestamp(start_date),
+        )
+        return slice_by_date(df, self._time_col('daily'), start_date, end_date)
+
+    def _derives(self, period):
+        period = str(period)
+        return (self.resample_from is not None and period != self.resample_from
+                and (period in INTRADAY_PERIODS or period == 'daily'))
+
+    def _resampled(self, code, period, adjust, start_date, end_date):
+        """由 resample_from 周期分钟线合成；源数据更新后才重写合成文件"""
+        source = self.hist_min(code, self.resample_from, adjust)
+        path = self._path(code, period, adjust)
+        source_path = self._path(code, self.resample_from, adjust)
+        if (os.path.exists(path) and os.path.exists(source_path)
+                and os.path.getmtime(path) >= os.path.getmtime(source_path)):
+            df = self.load(code, period, adjust)
+        else:
+            df = resample(source, period)
+            if not df.empty:
+                self.save(code, period, adjust, df)
+        return slice_by_date(df, self._time_col(period), start_date, end_date)
+
+    def _update(self, code, period, adjust, fetch, backfill=None, start=None):
+        """合并本地数据与增量数据并落盘，返回完整K线
+
+        start 为调用方要求的起始日期：早于已覆盖的起始日期时调用 backfill(已覆盖日期) 补拉前段。
+        """
+        time_col = self._time_col(period)
+        stored = self.load(code, period, adjust)
+        if not stored.empty and self.is_fresh(code, period, adjust):
+            return stored
+
+        parts = [stored]
+        covered = start
+        if stored.empty:
+            parts.append(fetch(None))
+        else:
+            times = pd.to_datetime(stored[time_col])
+            covered = self.covered_from(code, period, adjust)
+            if backfill is not None and start is not None and start < covered:
+                parts.insert(0, backfill(covered))
+                covered = start
+            parts.append(fetch(times.max()))
+
+        parts = [p for p in parts if p is not None and not p.empty]
+        if not parts:
+            return stored
+        df = pd.concat(parts, ignore_index=True)
+        df = df.drop_duplicates(subset=time_col, keep='last')
+        df = df.iloc[pd.to_datetime(df[time_col]).argsort(kind='stable')].reset_index(drop=True)
+        self.save(code, period, adjust, df, covered_from=covered)
+        return df
@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+# benchmark.py
+"""离线基准测试：合成行情替代akshare，按规模计时各筛选阶段，结果存为JSON便于跨提交对比
+
+用法：
+  python benchmark.py                          # 100/1000/5000 支
+  python benchmark.py --sizes 100,1000 --latency 0.02
+  python benchmark.py --compare data/benchmarks/上次.json
+"""
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from barstore import last_session_close
+from journal import clear_journal
+from resample import resample_daily
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SLOTS_60 = ('10:30:00', '11:30:00', '14:00:00', '15:00:00')
+STAGE_NAMES = ('amount', 'qiangrizhangfu', 'technical')
+SPOT_SALT = 0x5B07  # 全市场快照的随机数种子附加值（固定整数：字符串哈希随 PYTHONHASHSEED 变化）
+
+
+def _trading_days(end, count):
+    """截至 end（含）的 count 个工作日"""
+    days = []
+    day = end
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= timedelta(days=1)
+    return days[::-1]
+
+
+class SyntheticMarket:
+    """合成A股市场，接口名、参数与返回字段同akshare（可直接替换 ak 模块）
+
+    每支股票的K线由代码序号决定的随机种子生成，重复调用结果一致。
+    60分钟线按真实交易时段标记，日线由60分钟线合成；约1/5的股票在最近20根60分钟线放量，
+    使下游阶段有股票可处理。latency 为每次调用的模拟网络延迟（秒）。
+    """
+
+    def __init__(self, n_codes, days=250, bars_60=480, seed=0, latency=0.0):
+        self.n_codes = n_codes
+        self.bars_60 = bars_60
+        self.seed = seed
+        self.latency = latency
+        prefixes = ('600', '601', '603', '000', '002', '300')
+        self.codes = [f"{prefixes[i % len(prefixes)]}{i // len(prefixes):03d}" for i in range(n_codes)]
+        self._index = {code: i for i, code in enumerate(self.codes)}
+        self.days = _trading_days(last_session_close().date(), days)
+        self.concepts = [f"概念{i:03d}" for i in range(300)]
+        self._cache = {}
+
+    def _sleep(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _rng(self, code, salt=0):
+        return np.random.default_rng((self.seed, self._index[code], salt))
+
+    def _bars_60(self, code):
+        if code not in self._cache:
+            rng = self._rng(code)
+            n = len(self.days) * len(SLOTS_60)
+            close = 10 * np.exp(np.cumsum(rng.normal(0.0002, 0.012, n))) * rng.uniform(0.5, 5)
+            open_ = np.concatenate([[close[0]], close[:-1]]) * (1 + rng.normal(0, 0.002, n))
+            high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.006, n))
+            low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.006, n))
+            volume = rng.lognormal(9, 0.5, n).round()
+            if self._index[code] % 5 == 0:
+                volume[-20:] *= 2.5
+            amount = volume * 100 * close
+            times = [f"{day:%Y-%m-%d} {slot}" for day in self.days for slot in SLOTS_60]
+            df = pd.DataFrame({
+                '时间': times, '开盘': open_, '收盘': close, '最高': high, '最低': low,
+                '成交量': volume, '成交额': amount,
+            })
+            prev = df['收盘'].shift(1).fillna(df['开盘'])
+            df['涨跌幅'] = (df['收盘'] / prev - 1) * 100
+            df['涨跌额'] = df['收盘'] - prev
+            df['振幅'] = (df['最高'] - df['最低']) / prev * 100
+            df['换手率'] = volume / 1e6
+            self._cache[code] = df
+        return self._cache[code]
+
+    @staticmethod
+    def _between(df, time_col, start_date, end_date):
+        times = pd.to_datetime(df[time_col])
+        mask = (times >= pd.Timestamp(start_date)) & (times <= pd.Timestamp(end_date) + pd.Timedelta(hours=23, minutes=59))
+        return df[mask.values].reset_index(drop=True)
+
+    # ---- akshare 接口 ----
+    def stock_zh_a_hist_min_em(self, symbol, period='60', adjust='', start_date="1979-09-01 09:32:00",
+                               end_date="2222-01-01 09:32:00"):
+        self._sleep()
+        df = self._bars_60(symbol).tail(self.bars_60)
+        return self._between(df, '时间', start_date, end_date)
+
+    def stock_zh_a_hist(self, symbol, period='daily', start_date="19700101", end_date="20500101", adjust=''):
+        self._sleep()
+        daily = resample_daily(self._bars_60(symbol))
+        daily['股票代码'] = symbol
+        prev = daily['收盘'].shift(1).fillna(daily['开盘'])
+        daily['振幅'] = (daily['最高'] - daily['最低']) / prev * 100
+        daily['涨跌幅'] = (daily['收盘'] / prev - 1) * 100
+        daily['涨跌额'] = daily['收盘'] - prev
+        daily['换手率'] = daily['成交量'] / 4e6
+        return self._between(daily, '日期', start_date, end_date)
+
+    def stock_zh_a_spot_em(self):
+        self._sleep()
+        rng = np.random.default_rng((self.seed, SPOT_SALT))
+        last = [self._bars_60(code).iloc[-1] for code in self.codes]
+        close = np.array([row['收盘'] for row in last])
+        prev_close = np.array([row['开盘'] for row in last])
+        now = close * (1 + rng.normal(0, 0.01, self.n_codes))
+        return pd.DataFrame({
+            '序号': np.arange(1, self.n_codes + 1),
+            '代码': self.codes,
+            '名称': [f"合成{code}" for code in self.codes],
+            '最新价': now,
+            '涨跌幅': (now / prev_close - 1) * 100,
+            '涨跌额': now - prev_close,
+            '成交量': rng.lognormal(11, 0.5, self.n_codes).round(),
+            '成交额': rng.lognormal(19, 0.8, self.n_codes),
+            '振幅': rng.uniform(1, 8, self.n_codes),
+            '最高': np.maximum(now, close) * 1.01,
+            '最低': np.minimum(now, close) * 0.99,
+            '今开': close * (1 + rng.normal(0, 0.005, self.n_codes)),
+            '昨收': prev_close,
+            '量比': rng.uniform(0.5, 3, self.n_codes),
+            '换手率': rng.uniform(0.2, 10, self.n_codes),
+            '市盈率-动态': rng.uniform(5, 80, self.n_codes),
+            '市净率': rng.uniform(0.5, 10, self.n_codes),
+            '总市值': np.exp(rng.uniform(np.log(1e9), np.log(2e11), self.n_codes)),
+            '流通市值': np.exp(rng.uniform(np.log(8e8), np.log(1.5e11), self.n_codes)),
+        })
+
+    def stock_individual_fund_flow(self, stock, market='sh'):
+        self._sleep()
+        rng = self._rng(stock, 1)
+        daily = resample_daily(self._bars_60(stock)).tail(100)
+        df = pd.DataFrame({'日期': daily['日期'].values, '收盘价': daily['收盘'].values})
+        df['涨跌幅'] = df['收盘价'].pct_change().fillna(0) * 100
+        for name, scale in (('主力', 5e7), ('超大单', 3e7), ('大单', 2e7), ('中单', 1e7), ('小单', 1e7)):
+            df[f'{name}净流入-净额'] = rng.normal(0, scale, len(df))
+            df[f'{name}净流入-净占比'] = rng.normal(0, 5, len(df))
+        return df
+
+    def stock_bid_ask_em(self, symbol):
+        self._sleep()
+        row = self._bars_60(symbol).iloc[-1]
+        items = {'最新': row['收盘'], '今开': row['开盘'], '最高': row['最高'], '最低': row['最低'], '昨收': row['开盘']}
+        return pd.DataFrame({'item': list(items), 'value': list(items.values())})
+
+    def stock_individual_info_em(self, symbol):
+        self._sleep()
+        return pd.DataFrame({'item': ['股票代码', '股票简称'], 'value': [symbol, f"合成{symbol}"]})
+
+    def stock_hot_rank_em(self):
+        self._sleep()
+        codes = self.codes[:100]
+        return pd.DataFrame({
+            '当前排名': np.arange(1, len(codes) + 1),
+            '代码': [('SH' if code.startswith('6') else 'SZ') + code for code in codes],
+            '股票名称': [f"合成{code}" for code in codes],
+            '最新价': [self._bars_60(code)['收盘'].iloc[-1] for code in codes],
+            '涨跌额': 0.0,
+            '涨跌幅': 0.0,
+        })
+
+    def stock_hot_keyword_em(self, symbol):
+        self._sleep()
+        code = symbol[-6:]
+        rng = self._rng(code, 2)
+        n = int(rng.integers(3, 10))
+        # 热门概念集中在少数几个（Zipf分布）
+        picks = np.unique(np.minimum(rng.zipf(1.5, n) - 1, len(self.concepts) - 1))
+        return pd.DataFrame({
+            '时间': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            '股票代码': symbol,
+            '概念名称': [self.concepts[p] for p in picks],
+            '概念代码': [f"BK{p:04d}" for p in picks],
+            '热度': rng.integers(1000, 100000, len(picks)),
+        })
+
+    def keyword_frame(self, codes=None):
+        """MarketAnalyzer.analyze 的输入：全部代码的（股票代码, 概念名称, 热度）"""
+        frames = [self.stock_hot_keyword_em(code) for code in (codes or self.codes)]
+        return pd.concat(frames, ignore_index=True)[['股票代码', '概念名称', '热度']]
+
+
+# ---- 计时 ----
+def _load_main():
+    """导入主脚本（文件名含连字符，按路径加载）"""
+    spec = importlib.util.spec_from_file_location('stock_select_vps', os.path.join(BASE_DIR, 'stock-select-vps.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _configure(config, workdir):
+    """所有路径指向临时目录、取消限速"""
+    data_dir = os.path.join(workdir, 'data')
+    config.DATA_DIR = data_dir
+    config.BAR_STORE_DIR = os.path.join(data_dir, 'bars')
+    config.JOURNAL_DIR = os.path.join(data_dir, 'journal')
+    config.INDICATOR_STATE_DIR = os.path.join(data_dir, 'indicators', '60_hfq')
+    config.SPOT_CACHE_PATH = os.path.join(data_dir, 'spot_snapshot.parquet')
+    config.KEYWORD_CACHE_PATH = os.path.join(data_dir, 'hot_keywords.parquet')
+    config.LLM_CACHE_DIR = os.path.join(data_dir, 'llm_cache')
+    config.METRICS_DIR = os.path.join(data_dir, 'metrics')
+    for name in ('INITIAL_SCREENING_PATH', 'RESULT_PATH', 'TECHNICAL_PATH', 'FINAL_RESULT_PATH'):
+        setattr(config, name, os.path.join(workdir, os.path.basename(getattr(config, name))))
+    config.RATE_LIMITS = {endpoint: (1e9, 1e9) for endpoint in config.RATE_LIMITS}
+    config.DEFAULT_RATE_LIMIT = (1e9, 1e9)
+    config.GLOBAL_RATE_LIMIT = None
+    config.DEBUG_MODE = False
+
+
+def _timed(results, size, stage, mode, rnd, func):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        output = func()
+        seconds = time.perf_counter() - start
+    count = len(output) if hasattr(output, '__len__') else None
+    results.append({'codes': size, 'stage': stage, 'mode': mode, 'round': rnd,
+                    'seconds': round(seconds, 4), 'codes_per_sec': round(size / seconds, 1) if seconds else None,
+                    'output': count})
+    print(f"  {rnd:<5} {stage:<16} {mode:<9} {seconds * 1000:10.1f} ms   输出 {count}")
+
+
+def run_size(ssv, size, latency=0.0, seed=0):
+    """单个规模：冷启动（本地仓库为空）与热启动（本地仓库已最新）各跑一轮"""
+    results = []
+    market = SyntheticMarket(size, seed=seed, latency=latency)
+    with tempfile.TemporaryDirectory() as workdir:
+        _configure(ssv.Config, workdir)
+        ssv.ak = market
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            analyzer = ssv.StockAnalyzer()
+        codes = market.codes
+        print(f"\n=== {size} 支 ===")
+
+        for rnd in ('cold', 'warm'):
+            for stage in STAGE_NAMES:
+                clear_journal(ssv.Config.JOURNAL_DIR, stage)
+            _timed(results, size, 'amount', 'per_code', rnd,
+                   lambda: analyzer.amount_analysis(codes, write_result=False))
+            _timed(results, size, 'amount', 'panel', rnd,
+                   lambda: analyzer.amount_analysis_panel(codes, write_result=False))
+            _timed(results, size, 'qiangrizhangfu', 'per_code', rnd, lambda: analyzer.get_qiangrizhangfu(codes))
+            _timed(results, size, 'qiangrizhangfu', 'panel', rnd, lambda: analyzer.get_qiangrizhangfu_panel(codes))
+            _timed(results, size, 'technical', 'per_code', rnd, lambda: analyzer.technical_analysis(codes))
+            _timed(results, size, 'technical', 'panel', rnd, lambda: analyzer.technical_analysis_panel(codes))
+
+        keywords = market.keyword_frame()
+        from deepseektest import MarketAnalyzer
+        _timed(results, size, 'market_analyze', '-', 'warm', lambda: MarketAnalyzer().analyze(keywords))
+
+        quotes = []
+        _timed(results, size, 'realtime', 'snapshot', 'warm', lambda: quotes.extend(analyzer.get_realtime_data(codes)) or quotes)
+        market_report = "## 市场画像（独立分析）\n暂无有效数据"
+        analysis = "\n".join(f"### {code}\n- 合成分析文本" for code in codes[:20])
+        _timed(results, size, 'report', '-', 'warm',
+               lambda: analyzer._build_report(quotes, market_report, analysis))
+        analyzer.engine.shutdown()
+    return results
+
+
+def _meta(sizes, latency):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'sizes': sizes,
+        'latency': latency,
+    }
+
+
+def compare(old, new, threshold=1.2, min_delta=0.05):
+    """按 (规模, 阶段, 模式, 轮次) 对比两次结果，返回 (对比表, 是否有退化)
+
+    耗时超过 threshold 倍且绝对增量超过 min_delta 秒才算退化，避免毫秒级阶段的抖动误报。
+    """
+    def keyed(report):
+        return {(r['codes'], r['stage'], r['mode'], r['round']): r['seconds'] for r in report['results']}
+
+    before, after = keyed(old), keyed(new)
+    rows = [(*key, before[key], after[key], after[key] / before[key] if before[key] else float('nan'))
+            for key in after if key in before]
+    table = pd.DataFrame(rows, columns=['codes', 'stage', 'mode', 'round', 'before', 'after', 'ratio'])
+    table['regressed'] = (table['ratio'] > threshold) & (table['after'] - table['before'] > min_delta)
+    return table, bool(table['regressed'].any())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线基准测试（合成行情）')
+    parser.add_argument('--sizes', default='100,1000,5000', help='逗号分隔的股票数')
+    parser.add_argument('--latency', type=float, default=0.0, help='每次接口调用的模拟延迟（秒）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='结果JSON路径（默认 data/benchmarks/时间-提交.json）')
+    parser.add_argument('--compare', metavar='OLD_JSON', help='与之前的结果对比，退化超过阈值时返回码为1')
+    parser.add_argument('--threshold', type=float, default=1.2, help='判定退化的耗时倍数')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    ssv = _load_main()
+    report = {'meta': _meta(sizes, args.latency), 'results': []}
+    for size in sizes:
+        report['results'].extend(run_size(ssv, size, args.latency, args.seed))
+
+    out = args.out or os.path.join(
+        BASE_DIR, 'data', 'benchmarks',
+        f"{datetime.now():%Y%m%d-%H%M%S}-{report['meta']['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果保存到 {out}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            old = json.load(f)
+        table, regressed = compare(old, report, args.threshold)
+        print(f"\n=== 与 {old['meta'].get('commit')} 对比 ===")
+        print(table.to_string(index=False))
+        if regressed:
+            print(f"‼️ 存在耗时超过 {args.threshold}x 的退化")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+# cassette.py
+"""外部调用录制/回放：akshare 接口、DeepSeek(OpenAI) 与 PushPlus(requests.post)
+
+录制模式下照常调用真实服务，把每次调用的参数摘要、返回值（或异常）与耗时记入磁带
+（流式响应逐块转交并记录，读到一半出错时连同已收到的块一起记录），
+结束时以 pickle + zlib 写成一个文件；回放模式下不联网，按调用顺序原样返回录制结果，
+可按固定延迟或录制时的真实耗时模拟网络等待。
+
+匹配规则：同一接口优先取参数完全相同、尚未用过的记录；没有时取该接口下一条未用记录
+（日期等参数随运行日期变化，按顺序回放仍能重现当晚的调用序列）。
+回放完整一晚时，应使用空的本地数据目录，否则本地缓存会改变实际发起的调用。
+"""
+import atexit
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import date, datetime
+from functools import reduce
+
+import pandas as pd
+
+FORMAT_VERSION = 1
+# 参数中不写入磁带的字段（令牌、密钥）
+REDACT = frozenset({'token', 'api_key', 'Authorization'})
+
+
+class CassetteMiss(LookupError):
+    """回放时磁带中没有可用的记录"""
+
+
+def _canonical(value):
+    """参数 → 可稳定比较的结构（字典按键排序，敏感字段打码）"""
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), '***' if k in REDACT else _canonical(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_canonical(v) for v in value)
+    if isinstance(value, (datetime, date, pd.Timestamp)):
+        return value.isoformat()
+    if isinstance(value, pd.DataFrame):
+        return ('DataFrame', int(pd.util.hash_pandas_object(value, index=True).sum()))
+    return repr(value)
+
+
+def _dump_error(exc):
+    """异常尽量原样保存；无法序列化的（如带连接对象的）保留类型与消息"""
+    try:
+        return pickle.dumps(exc, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        cls = type(exc)
+        return pickle.dumps((cls.__module__, cls.__qualname__, str(exc)), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load_error(blob):
+    error = pickle.loads(blob)
+    if isinstance(error, BaseException):
+        return error
+    module, qualname, message = error
+    try:
+        cls = reduce(getattr, qualname.split('.'), sys.modules.get(module) or __import__(module))
+        exc = cls.__new__(cls)
+        Exception.__init__(exc, message)
+        return exc
+    except Exception:
+        return RuntimeError(f"{module}.{qualname}: {message}")
+
+
+def _replay_stream(chunks, error):
+    """按录制顺序逐块返回；录制时中途出错的，在同一位置重新抛出"""
+    yield from chunks
+    if error is not None:
+        raise _load_error(error)
+
+
+class Cassette:
+    """一盘磁带：mode 为 'record' 或 'replay'
+
+    latency 仅用于回放：数字为每次调用固定延迟（秒），'recorded' 为录制时的真实耗时。
+    录制模式在进程退出时自动保存，也可手动调用 save()。
+    """
+
+    def __init__(self, path, mode, latency=0.0):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"未知的磁带模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.entries = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+        if self.replaying:
+            with open(path, 'rb') as f:
+                data = pickle.loads(zlib.decompress(f.read()))
+            if data['version'] != FORMAT_VERSION:
+                raise ValueError(f"磁带格式版本不符: {data['version']}")
+            self.entries = data['entries']
+            self._pending = defaultdict(list)  # 接口 → 未用记录序号（按录制顺序）
+            for i, entry in enumerate(self.entries):
+                self._pending[entry['name']].append(i)
+            self._last = {}  # (接口, 参数摘要) → 最近一次用过的记录序号
+        else:
+            atexit.register(self.save)
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    # ---- 调用 ----
+    def call(self, name, resolve, args, kwargs):
+        """执行（录制）或回放一次调用；resolve 返回真实函数，仅录制时调用"""
+        key = hashlib.sha1(repr((_canonical(args), _canonical(kwargs))).encode('utf-8')).hexdigest()
+        if self.replaying:
+            return self._replay(name, key)
+
+        start = time.perf_counter()
+        try:
+            value = resolve()(*args, **kwargs)
+        except Exception as e:
+            self._append(name, key, args, kwargs, start, error=_dump_error(e))
+            raise
+        if hasattr(value, '__next__') and not isinstance(value, pd.DataFrame):
+            return self._record_stream(name, key, args, kwargs, start, value)
+        self._append(name, key, args, kwargs, start, value=value)
+        return value
+
+    def _record_stream(self, name, key, args, kwargs, start, stream):
+        """流式响应：逐块转交调用方并记录；中途异常时连同已收到的块一起录制后抛出"""
+        chunks, error = [], None
+        try:
+            for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            error = _dump_error(e)
+            raise
+        finally:
+            # 调用方提前放弃时（GeneratorExit）也记录已收到的部分
+            self._append(name, key, args, kwargs, start, value=chunks, error=error, stream=True)
+
+    def _append(self, name, key, args, kwargs, start, value=None, error=None, stream=False):
+        now = time.perf_counter()
+        entry = {
+            'name': name,
+            'key': key,
+            'args': repr((_canonical(args), _canonical(kwargs)))[:500],
+            'seconds': now - start,
+            'offset': start - self._start,
+            'stream': stream,
+            # 立即序列化：调用方随后修改返回的DataFrame不影响录制内容
+            'value': pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL) if error is None or stream else None,
+            'error': error,
+        }
+        with self._lock:
+            self.entries.append(entry)
+
+    def _replay(self, name, key):
+        with self._lock:
+            pending = self._pending.get(name, [])
+            index = next((i for i in pending if self.entries[i]['key'] == key), None)
+            if index is None:
+                index = self._last.get((name, key))
+            if index is None and pending:
+                index = pending[0]
+            if index is None:
+                raise CassetteMiss(f"磁带中没有 {name} 的可用记录")
+            if index in pending:
+                pending.remove(index)
+            self._last[(name, key)] = index
+        entry = self.entries[index]
+
+        delay = entry['seconds'] if self.latency == 'recorded' else float(self.latency or 0)
+        if delay > 0:
+            time.sleep(delay)
+        if entry['stream']:
+            return _replay_stream(pickle.loads(entry['value']), entry['error'])
+        if entry['error'] is not None:
+            raise _load_error(entry['error'])
+        return pickle.loads(entry['value'])
+
+    # ---- 代理 ----
+    def wrap(self, name, target, calls=None, factories=None):
+        """包装模块或对象：calls 中的属性路径（None 表示全部顶层属性）经磁带调用
+
+        factories 为 {属性: 其返回对象上需录制的属性路径集合}，如 OpenAI 客户端；返回对象上
+        同名的属性也按工厂处理（如客户端的 with_options）。回放时不创建真实对象。其余属性直接取自 target。
+        """
+        return _Node(self, name, target, calls, factories or {})
+
+    # ---- 存取 ----
+    def save(self):
+        if self.replaying:
+            return
+        with self._lock:
+            data = {'version': FORMAT_VERSION, 'created': datetime.now().isoformat(timespec='seconds'),
+                    'entries': list(self.entries)}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(zlib.compress(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL), 6))
+        os.replace(tmp_path, self.path)
+
+    def summary(self):
+        """各接口的调用数、失败数、总耗时与数据量"""
+        rows = defaultdict(lambda: {'调用': 0, '失败': 0, '耗时(秒)': 0.0, '字节': 0})
+        for entry in self.entries:
+            row = rows[entry['name']]
+            row['调用'] += 1
+            row['失败'] += entry['error'] is not None
+            row['耗时(秒)'] += entry['seconds']
+            row['字节'] += len(entry['value'] or b'')
+        return pd.DataFrame.from_dict(rows, orient='index').sort_values('耗时(秒)', ascending=False)
+
+
+class _Node:
+    """磁带代理节点：按属性路径决定经磁带调用、继续下探还是直接取真实属性"""
+
+    def __init__(self, cassette, name, target, calls, factories, path=''):
+        self._cassette = cassette
+        self._name = name
+        self._target = target  # 回放时可能为 None
+        self._calls = calls
+        self._factories = factories
+        self._path = path
+
+    def _resolve(self, path):
+        return reduce(getattr, path.split('.'), self._target)
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        path = self._path + attr
+        cassette, name = self._cassette, f"{self._name}.{path}"
+
+        if attr in self._factories and not self._path:
+            def factory(*args, **kwargs):
+                target = None if cassette.replaying else self._resolve(path)(*args, **kwargs)
+                return _Node(cassette, name, target, self._factories[attr], self._factories)
+            return factory
+
+        if self._calls is None or path in self._calls:
+            def recorded(*args, **kwargs):
+                return cassette.call(name, lambda: self._resolve(path), args, kwargs)
+            recorded.__name__ = attr
+            return recorded
+
+        if any(call.startswith(path + '.') for call in self._calls):
+            return _Node(cassette, self._name, self._target, self._calls, self._factories, path + '.')
+        return self._resolve(path)
+
+
+if __name__ == '__main__':
+    # 查看磁带内容：python cassette.py 磁带文件
+    tape = Cassette(sys.argv[1], 'replay')
+    print(f"{sys.argv[1]}：{len(tape.entries)} 次调用，文件 {os.path.getsize(sys.argv[1]) / 2 ** 20:.1f}MB")
+    print(tape.summary().to_string())
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# datasource.py
+"""akshare 异步数据源适配器：阻塞调用放进线程池，按接口限制并发、超时与重试"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+
+class AsyncDataSource:
+    """统一的异步数据源
+
+    用法：rows = await source.hist_min("000001", "60", "hfq")
+    每个接口一个信号量控制在途请求数；超时或被取消时，尚未开始的线程任务会被撤销，
+    已在执行的任务跑完后才归还信号量，因此实际并发始终不超过配置。
+    若传入 FetchEngine，则每次调用同时受其令牌桶限速，失败重试也交给引擎（retries 只用于超时）；
+    传入 metrics 时上报重试与超时次数。
+    """
+
+    def __init__(self, api, engine=None, concurrency=None, default_concurrency=4,
+                 timeouts=None, default_timeout=20.0, retries=1, retry_wait=1.0, max_workers=16, metrics=None):
+        self.api = api
+        self.engine = engine
+        self.concurrency = dict(concurrency or {})
+        self.default_concurrency = default_concurrency
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+        self.retries = retries
+        self.retry_wait = retry_wait
+        self.metrics = metrics
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._loop = None
+        self._semaphores = {}
+
+    def _semaphore(self, endpoint):
+        """按接口取信号量（事件循环变化时重建，兼容多次 asyncio.run）"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphores = {}
+        if endpoint not in self._semaphores:
+            limit = self.concurrency.get(endpoint, self.default_concurrency)
+            self._semaphores[endpoint] = asyncio.Semaphore(limit)
+        return self._semaphores[endpoint]
+
+    async def call(self, endpoint, **kwargs):
+        """调用任意akshare接口（带并发限制、超时和重试）"""
+        timeout = self.timeouts.get(endpoint, self.default_timeout)
+        for attempt in range(self.retries + 1):
+            try:
+                return await self._call_once(endpoint, timeout, **kwargs)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 接入引擎时上游故障已在引擎内重试，这里只重试超时
+                if attempt == self.retries or (self.engine is not None and not isinstance(e, asyncio.TimeoutError)):
+                    raise
+                if self.metrics is not None:
+                    self.metrics.count_retry(endpoint, timeout=isinstance(e, asyncio.TimeoutError))
+                await asyncio.sleep(self.retry_wait * (attempt + 1))
+
+    async def _call_once(self, endpoint, timeout, **kwargs):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphore(endpoint)
+        await semaphore.acquire()
+
+        func = getattr(self.api, endpoint)
+        if self.engine is not None:
+            task = partial(self.engine.call, endpoint, func, **kwargs)
+        else:
+            task = partial(func, **kwargs)
+        try:
+            future = self.executor.submit(task)
+        except Exception:
+            semaphore.release()
+            raise
+
+        def release(_):
+            try:
+                loop.call_soon_threadsafe(semaphore.release)
+            except RuntimeError:  # 事件循环已关闭
+                pass
+
+        future.add_done_callback(release)
+        # wrap_future 会把取消传递给线程任务（未开始的直接撤销）
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+    async def gather(self, func, items):
+        """并发执行 func(item)，按输入顺序返回结果（异常作为结果返回）"""
+        return await asyncio.gather(*(func(item) for item in items), return_exceptions=True)
+
+    # ---- 常用接口 ----
+    async def hist_min(self, code, period='60', adjust='hfq',
+                       start_date="1979-09-01 09:32:00", end_date="2222-01-01 09:32:00"):
+        return await self.call('stock_zh_a_hist_min_em', symbol=code, period=period, adjust=adjust,
+                               start_date=start_date, end_date=end_date)
+
+    async def hist_daily(self, code, adjust='hfq', start_date="19700101", end_date="20500101"):
+        return await self.call('stock_zh_a_hist', symbol=code, period="daily", adjust=adjust,
+                               start_date=start_date, end_date=end_date)
+
+    async def spot(self):
+        return await self.call('stock_zh_a_spot_em')
+
+    async def fund_flow(self, code, market=None):
+        market = market or ("sh" if code.startswith('6') else "sz")
+        return await self.call('stock_individual_fund_flow', stock=code, market=market)
+
+    async def bid_ask(self, code):
+        return await self.call('stock_bid_ask_em', symbol=code)
+
+    async def individual_info(self, code):
+        return await self.call('stock_individual_info_em', symbol=code)
+
+    async def hot_rank(self):
+        return await self.call('stock_hot_rank_em')
+
+    async def hot_keyword(self, code):
+        return await self.call('stock_hot_keyword_em', symbol=code)
@@ -1,10 +1,16 @@
-import akshare as ak
+import numpy as np
 import pandas as pd
 import logging
-from concurrent.futures import ThreadPoolExecutor
-from concurrent.futures import as_completed
-import time
-import random
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+from datasource import AsyncDataSource
+from fetcher import FetchEngine
+from lazyimport import LazyModule
+
+ak = LazyModule('akshare')  # 首次调用接口时才导入
+sparse = LazyModule('scipy.sparse')
 
 
 # 配置日志系统
@@ -15,10 +21,79 @@ logging.basicConfig(
 )
 
 
+def _default_source():
+    """独立使用时的数据源：3并发、约1.2次/秒、失败与超时各重试2次"""
+    return AsyncDataSource(
+        ak,
+        engine=FetchEngine(default_limit=(1.2, 3), retries=2),
+        default_concurrency=3,
+        default_timeout=15.0,
+        retries=2,
+    )
+
+
+class KeywordCache:
+    """个股概念关键词缓存：每支股票的（概念名称, 热度）连同抓取时间落盘为Parquet，按TTL复用
+
+    个股所属概念变化很慢，刷新时只需抓取新上榜或已过期的股票。
+    没有关键词的股票也记一行（概念名称为空），避免每次重复抓取。
+    """
+    COLUMNS = ['股票代码', '概念名称', '热度', '抓取时间']
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = timedelta(seconds=ttl)
+        self._df = None
+
+    @property
+    def df(self):
+        if self._df is None:
+            if os.path.exists(self.path):
+                self._df = pd.read_parquet(self.path)
+            else:
+                self._df = pd.DataFrame(columns=self.COLUMNS)
+        return self._df
+
+    def split(self, codes, now=None):
+        """返回 ({代码: 关键词行}, 需要刷新的代码)"""
+        now = now or datetime.now()
+        df = self.df
+        fetched_at = df.groupby('股票代码')['抓取时间'].max() if not df.empty else pd.Series(dtype='datetime64[ns]')
+        fresh_codes = set(fetched_at.index[fetched_at > now - self.ttl])
+        fresh = {code: self.rows(code) for code in codes if code in fresh_codes}
+        return fresh, [code for code in codes if code not in fresh_codes]
+
+    def rows(self, code):
+        """缓存中某支股票的关键词行（不论是否过期）"""
+        df = self.df
+        df = df[(df['股票代码'] == code) & df['概念名称'].notna()]
+        return list(zip(df['股票代码'], df['概念名称'], df['热度']))
+
+    def update(self, rows_by_code, now=None):
+        """替换这些代码的缓存并落盘"""
+        if not rows_by_code:
+            return
+        now = now or datetime.now()
+        new = pd.DataFrame(
+            [row for rows in rows_by_code.values() for row in rows]
+            + [(code, None, None) for code, rows in rows_by_code.items() if not rows],
+            columns=self.COLUMNS[:3],
+        )
+        new['抓取时间'] = pd.Timestamp(now)
+        kept = self.df[~self.df['股票代码'].isin(list(rows_by_code))]
+        self._df = pd.concat([kept, new], ignore_index=True) if not kept.empty else new
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        self._df.to_parquet(tmp_path, compression='zstd', index=False)
+        os.replace(tmp_path, self.path)
+
+
 class HotStockAnalyzer:
-    def __init__(self):
+    def __init__(self, source=None, cache=None):
         self.logger = logging.getLogger('HotStockAnalyzer')
         self.logger.setLevel(logging.DEBUG)
+        self.source = source or _default_source()
+        self.cache = cache
 
     def fetch_hot_stocks(self):
         """获取实时热门股票（增强校验版）"""
@@ -26,7 +101,7 @@ class HotStockAnalyzer:
             self.logger.info("正在获取东方财富实时热度榜...")
 
             # 获取原始数据
-            df = ak.stock_hot_rank_em()
+            df = asyncio.run(self.source.hot_rank())
             self.logger.debug(f"原始数据字段: {df.columns.tolist()}")
 
             # 校验必要字段存在
@@ -43,90 +118,163 @@ class HotStockAnalyzer:
             return []
 
     def fetch_keywords(self, stock_codes):
-        """获取股票关键词（带重试机制）"""
-        results = []
+        """获取股票关键词（异步并发，限速与重试由数据源统一处理）
+
+        有缓存时只抓取新上榜或已过期的股票；抓取失败的股票沿用过期的缓存（若有）。
+        """
+        by_code = {}
         failed_codes = []
 
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            futures = {executor.submit(self._get_single_keyword, code): code for code in stock_codes}
-
-            for future in as_completed(futures):
-                code = futures[future]
-                try:
-                    data = future.result()
-                    if data:
-                        results.extend(data)
-                        self.logger.info(f"{code} 采集成功，获取{len(data)}个关键词")
-                    else:
-                        failed_codes.append(code)
-                except Exception as e:
-                    self.logger.warning(f"{code} 采集失败: {str(e)}")
+        todo_codes = stock_codes
+        if self.cache is not None:
+            by_code, todo_codes = self.cache.split(stock_codes)
+            self.logger.info(f"关键词缓存命中 {len(by_code)} 支，需刷新 {len(todo_codes)} 支")
+
+        fetched = {}
+        outcomes = asyncio.run(self.source.gather(self._get_single_keyword, todo_codes)) if todo_codes else []
+        for code, data in zip(todo_codes, outcomes):
+            if isinstance(data, Exception):
+                self.logger.warning(f"{code} 采集失败: {str(data) or type(data).__name__}")
+                failed_codes.append(code)
+                if self.cache is not None and self.cache.rows(code):
+                    by_code[code] = self.cache.rows(code)
+            else:
+                fetched[code] = data
+                by_code[code] = data
+                if data:
+                    self.logger.info(f"{code} 采集成功，获取{len(data)}个关键词")
+                else:
                     failed_codes.append(code)
-                # 添加随机延迟防止封禁
-                time.sleep(random.uniform(0.5, 1.2))
+        if self.cache is not None:
+            self.cache.update(fetched)
 
+        results = [row for code in stock_codes for row in by_code.get(code, [])]
         self.logger.info(f"关键词采集完成 | 成功: {len(results)} | 失败: {len(failed_codes)}")
         return pd.DataFrame(results, columns=['股票代码', '概念名称', '热度']) if results else pd.DataFrame()
 
-    def _get_single_keyword(self, code):
-        """获取单个股票的关键词（带重试）"""
-        max_retries = 2
-        for attempt in range(max_retries + 1):
-            try:
-                df = ak.stock_hot_keyword_em(symbol=code)
-                self.logger.debug(f"{code} 原始返回字段: {df.columns.tolist() if not df.empty else '空数据'}")
-
-                # 校验数据格式
-                if df.empty:
-                    return []
-                if not {'概念名称', '热度'}.issubset(df.columns):
-                    raise KeyError(f"缺失必要字段，现有字段: {df.columns.tolist()}")
-
-                # 清洗数据
-                return [(code, row['概念名称'], row['热度']) for _, row in df.iterrows()]
-
-            except Exception as e:
-                if attempt == max_retries:
-                    raise
-                self.logger.warning(f"{code} 第{attempt + 1}次重试...")
-                time.sleep(1.5 ** attempt)
-                return []
+    async def _get_single_keyword(self, code):
+        """获取单个股票的关键词（重试由数据源处理）"""
+        df = await self.source.hot_keyword(code)
+        self.logger.debug(f"{code} 原始返回字段: {df.columns.tolist() if not df.empty else '空数据'}")
+
+        # 校验数据格式
+        if df.empty:
+            return []
+        if not {'概念名称', '热度'}.issubset(df.columns):
+            raise KeyError(f"缺失必要字段，现有字段: {df.columns.tolist()}")
+
+        # 清洗数据
+        return [(code, row['概念名称'], row['热度']) for _, row in df.iterrows()]
+
+class ConceptIndex:
+    """概念 × 股票 稀疏热度矩阵（行、列为整数编码的概念与股票）
+
+    同一（股票, 概念）出现多行时热度相加。股票按首次出现的顺序编码。
+    """
+
+    def __init__(self, keyword_df):
+        self.concept_codes, self.concepts = pd.factorize(keyword_df['概念名称'], sort=True)
+        self.stock_codes, self.stocks = pd.factorize(keyword_df['股票代码'])
+        heat = keyword_df['热度'].to_numpy()
+        shape = (len(self.concepts), len(self.stocks))
+        self.heat = sparse.csr_matrix((heat, (self.concept_codes, self.stock_codes)), shape=shape)
+        self.heat.sum_duplicates()
+        self.member = self.heat.copy()
+        self.member.data = np.ones_like(self.member.data, dtype=np.int64)
+
+    @property
+    def concept_heat(self):
+        return np.asarray(self.heat.sum(axis=1)).ravel()
+
+    @property
+    def stock_count(self):
+        return np.diff(self.heat.indptr).astype(np.int64)
+
+    def stocks_of(self, row):
+        """某概念包含的股票（按编码顺序）"""
+        return list(self.stocks[self.heat.indices[self.heat.indptr[row]:self.heat.indptr[row + 1]]])
+
+    def leaders(self):
+        """每个概念热度最高的股票：(股票编码, 热度)"""
+        columns = np.asarray(self.heat.argmax(axis=1)).ravel()
+        values = np.asarray(self.heat.max(axis=1).todense()).ravel()
+        return columns, values
+
+    def cooccurrence(self):
+        """概念两两共有的股票数（上三角，稀疏）"""
+        return sparse.triu(self.member @ self.member.T, k=1).tocoo()
+
+
+def top_k(values, k, tiebreak=None):
+    """最大的 k 个元素的下标（先部分排序再对这 k 个排序，同值按 tiebreak 升序）"""
+    k = min(k, len(values))
+    if k == 0:
+        return np.array([], dtype=int)
+    tiebreak = np.arange(len(values)) if tiebreak is None else tiebreak
+    candidates = np.argpartition(-values, k - 1)[:k] if k < len(values) else np.arange(len(values))
+    # 部分排序截断处若有同值，补齐所有同值元素后再排序截取
+    threshold = values[candidates].min()
+    candidates = np.union1d(candidates, np.flatnonzero(values == threshold))
+    order = np.lexsort((tiebreak[candidates], -values[candidates]))
+    return candidates[order][:k]
+
 
 class MarketAnalyzer:
-     def analyze(self, keyword_df):
-         """执行市场分析"""
-         if keyword_df.empty:
-             return {}
+    def __init__(self, top_concepts=10, top_pairs=10):
+        self.top_concepts = top_concepts
+        self.top_pairs = top_pairs
 
-         return {
-             "概念热度": self._concept_heat_analysis(keyword_df),
-             "龙头个股": self._stock_leader_analysis(keyword_df)
-         }
+    def analyze(self, keyword_df):
+        """执行市场分析"""
+        if keyword_df.empty:
+            return {}
 
-     def _concept_heat_analysis(self, df):
-         """生成概念热度报告"""
-         concept_stats = df.groupby('概念名称').agg(
-             总热度=('热度', 'sum'),
-             涉及股票数=('股票代码', 'nunique'),
-             股票列表=('股票代码', lambda x: list(x.unique()))
-         ).reset_index().sort_values('总热度', ascending=False)
+        index = ConceptIndex(keyword_df)
+        return {
+            "概念热度": self._concept_heat_analysis(index),
+            "龙头个股": self._stock_leader_analysis(index, keyword_df['热度'].dtype),
+            "概念共现": self._cooccurrence_analysis(index),
+        }
 
-         return concept_stats.head(10)
+    def _concept_heat_analysis(self, index):
+        """生成概念热度报告"""
+        heat = index.concept_heat
+        rows = top_k(heat, self.top_concepts)
+        return pd.DataFrame({
+            '概念名称': index.concepts[rows],
+            '总热度': heat[rows],
+            '涉及股票数': index.stock_count[rows],
+            '股票列表': [index.stocks_of(row) for row in rows],
+        })
 
-     def _stock_leader_analysis(self, df):
-         """识别概念龙头股"""
-         leaders = df.loc[df.groupby('概念名称')['热度'].idxmax()]
-         return leaders[['概念名称', '股票代码', '热度']].rename(
-             columns={'热度': '最高热度'}
-         ).sort_values('最高热度', ascending=False)
+    def _stock_leader_analysis(self, index, dtype):
+        """识别概念龙头股"""
+        columns, values = index.leaders()
+        rows = top_k(values, len(values))
+        return pd.DataFrame({
+            '概念名称': index.concepts[rows],
+            '股票代码': index.stocks[columns[rows]],
+            '最高热度': values[rows].astype(dtype),
+        })
 
-     # 使用示例
+    def _cooccurrence_analysis(self, index):
+        """概念共现排行：同时属于两个概念的股票数，及其占两概念股票并集的比例"""
+        pairs = index.cooccurrence()
+        counts = index.stock_count
+        union = counts[pairs.row] + counts[pairs.col] - pairs.data
+        rows = top_k(pairs.data.astype(float) + pairs.data / union / 2, self.top_pairs)  # 同数时按占比
+        return pd.DataFrame({
+            '概念A': index.concepts[pairs.row[rows]],
+            '概念B': index.concepts[pairs.col[rows]],
+            '共同股票数': pairs.data[rows],
+            '重合度': (pairs.data[rows] / union[rows]).round(3),
+        })
 
 
-def get_market_analysis(stock_count=100, top_concepts=10):
+def get_market_analysis(stock_count=100, top_concepts=10, source=None, cache=None):
     """对外暴露的主接口函数（修正版）"""
-    stock_fetcher = HotStockAnalyzer()
-    analyzer = MarketAnalyzer()
+    stock_fetcher = HotStockAnalyzer(source, cache)
+    analyzer = MarketAnalyzer(top_concepts)
 
     hot_codes = stock_fetcher.fetch_hot_stocks()
     if not hot_codes:
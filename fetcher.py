@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+# fetcher.py
+"""并发抓取引擎：有界线程池 + 令牌桶限速（全局 + 按接口）+ 自适应并发 + 熔断与统一重试"""
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def is_upstream_failure(exc):
+    """上游故障（网络错误、超时、被封返回的非JSON页面），这类错误才重试、降并发、计入熔断
+
+    requests 的异常都继承自 OSError；KeyError 等数据问题重试也无济于事。
+    """
+    return isinstance(exc, (OSError, json.JSONDecodeError))
+
+
+class CircuitOpenError(RuntimeError):
+    """接口熔断中，调用被直接拒绝"""
+
+
+class TokenBucket:
+    """线程安全令牌桶：每秒补充 rate 个令牌，最多积攒 burst 个"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """阻塞直到拿到令牌"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimit:
+    """AIMD 并发上限：延迟与错误率正常时每完成约 limit 次调用加 1，变慢或出错时乘性下降
+
+    以观测到的最小延迟为基准，延迟超过 slow_factor 倍视为拥塞（乘 0.9），上游故障视为限流（减半）；
+    一次下降后，在途请求全部换新（约一个往返）之前不再下降，避免同一批失败把上限压到底。
+    """
+
+    def __init__(self, initial=2, min_limit=1, max_limit=16, slow_factor=2.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.slow_factor = slow_factor
+        self.inflight = 0
+        self.min_latency = None
+        self._started = 0  # 已开始的调用数
+        self._hold_until = 0  # 该序号之前开始的调用不再触发下降
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """阻塞直到在途请求数低于上限，返回本次调用序号"""
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                self._cond.wait()
+            self.inflight += 1
+            self._started += 1
+            return self._started
+
+    def release(self, ticket, latency, failed=False):
+        with self._cond:
+            self.inflight -= 1
+            if failed:
+                self._decrease(ticket, 0.5)
+            else:
+                if self.min_latency is None or latency < self.min_latency:
+                    self.min_latency = latency
+                if latency > self.slow_factor * max(self.min_latency, 0.05):
+                    self._decrease(ticket, 0.9)
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def _decrease(self, ticket, factor):
+        if ticket > self._hold_until:
+            self.limit = max(self.min_limit, self.limit * factor)
+            self._hold_until = self._started
+
+
+class CircuitBreaker:
+    """熔断器：最近 window 次调用中上游故障不少于 threshold 次且占一半以上时打开，
+    reset_timeout 秒内直接拒绝；之后半开放行一次探测，成功则关闭，失败则重新打开
+
+    按比例而不是按连续次数判定，限流时同一批并发请求一起失败不会误触发熔断（交给并发控制降速）。
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30.0, window=20):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.outcomes = deque(maxlen=window)  # True 为失败
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def allow(self, endpoint=''):
+        """放行返回是否为半开探测；熔断中抛出 CircuitOpenError"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return False
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            raise CircuitOpenError(f"接口 {endpoint} 熔断中（最近 {len(self.outcomes)} 次调用失败 "
+                                   f"{sum(self.outcomes)} 次，{max(remaining, 0):.0f}s 后重试）")
+
+    def record(self, failed, probe=False):
+        with self._lock:
+            if self.opened_at is not None:
+                if not probe:
+                    return  # 熔断前已发出的请求，结果不改变状态
+                self._probing = False
+                if failed:
+                    self.opened_at = time.monotonic()
+                else:
+                    self.opened_at = None
+                    self.outcomes.clear()
+                return
+            self.outcomes.append(failed)
+            failures = sum(self.outcomes)
+            if failures >= self.threshold and failures * 2 >= len(self.outcomes):
+                self.opened_at = time.monotonic()
+
+
+class FetchEngine:
+    """共享抓取引擎
+
+    所有akshare调用经 call() 取令牌后执行：先过全局桶（整体不超过上游封禁阈值），
+    再过接口自己的桶。map() 把逐支处理函数放到有界线程池上并发执行，
+    吞吐量由允许的请求速率决定，而不是固定sleep加往返延迟。
+    传入 metrics 时，每次调用的排队时间、耗时、成败与返回数据量都会上报。
+
+    重试统一在这里处理：上游故障（见 is_upstream_failure）按指数退避重试 retries 次。
+    concurrency 为 (初始, 最小, 最大) 时，每个接口的在途请求数由 AdaptiveLimit 自适应调整；
+    令牌桶速率仍是硬上限。breaker 为 (失败次数阈值, 熔断秒数) 时按接口熔断（见 CircuitBreaker）。
+    """
+
+    def __init__(self, rate_limits=None, default_limit=(1.0, 1), global_limit=None, max_workers=8, metrics=None,
+                 retries=0, retry_wait=1.0, concurrency=None, breaker=None):
+        self.rate_limits = dict(rate_limits or {})
+        self.default_limit = default_limit
+        self.global_bucket = TokenBucket(*global_limit) if global_limit else None
+        self.max_workers = max_workers
+        self.metrics = metrics
+        self.retries = retries
+        self.retry_wait = retry_wait
+        self.concurrency = concurrency
+        self.breaker_config = breaker
+        self._buckets = {}
+        self._limits = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def limiter(self, endpoint):
+        """按接口名取令牌桶（首次使用时创建）"""
+        with self._lock:
+            if endpoint not in self._buckets:
+                rate, burst = self.rate_limits.get(endpoint, self.default_limit)
+                self._buckets[endpoint] = TokenBucket(rate, burst)
+            return self._buckets[endpoint]
+
+    def adaptive_limit(self, endpoint):
+        """按接口取自适应并发上限（未启用时为 None）"""
+        if self.concurrency is None:
+            return None
+        with self._lock:
+            if endpoint not in self._limits:
+                self._limits[endpoint] = AdaptiveLimit(*self.concurrency)
+            return self._limits[endpoint]
+
+    def breaker(self, endpoint):
+        """按接口取熔断器（未启用时为 None）"""
+        if self.breaker_config is None:
+            return None
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(*self.breaker_config)
+            return self._breakers[endpoint]
+
+    def call(self, endpoint, func, *args, **kwargs):
+        """限速后执行一次接口调用，上游故障时退避重试"""
+        for attempt in range(self.retries + 1):
+            try:
+                return self._call_once(endpoint, func, args, kwargs)
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                if attempt == self.retries or not is_upstream_failure(e):
+                    raise
+                if self.metrics is not None:
+                    self.metrics.count_retry(endpoint, timeout=isinstance(e, TimeoutError))
+                time.sleep(self.retry_wait * 2 ** attempt * random.uniform(0.8, 1.2))
+
+    def _call_once(self, endpoint, func, args, kwargs):
+        breaker = self.breaker(endpoint)
+        probe = breaker.allow(endpoint) if breaker is not None else False
+        limit = self.adaptive_limit(endpoint)
+        ticket = limit.acquire() if limit is not None else None
+
+        failed = True
+        start = queued = time.perf_counter()
+        try:
+            if self.global_bucket is not None:
+                self.global_bucket.acquire()
+            self.limiter(endpoint).acquire()
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                failed = is_upstream_failure(e)
+                if self.metrics is not None:
+                    self.metrics.observe_call(endpoint, time.perf_counter() - start, start - queued, failed=True)
+                raise
+            failed = False
+            if self.metrics is not None:
+                self.metrics.observe_call(endpoint, time.perf_counter() - start, start - queued, result=result)
+            return result
+        finally:
+            if limit is not None:
+                limit.release(ticket, time.perf_counter() - start, failed)
+            if breaker is not None:
+                breaker.record(failed, probe)
+
+    def stats(self):
+        """各接口当前的并发上限与熔断状态"""
+        with self._lock:
+            endpoints = set(self._limits) | set(self._breakers)
+            return {
+                endpoint: {
+                    'limit': round(self._limits[endpoint].limit, 2) if endpoint in self._limits else None,
+                    'breaker': self._breakers[endpoint].state if endpoint in self._breakers else None,
+                }
+                for endpoint in sorted(endpoints)
+            }
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def map(self, func, items):
+        """并发执行 func(item)，按完成顺序产出 (item, result, error)"""
+        futures = {self.executor.submit(func, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
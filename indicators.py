@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+# indicators.py
+"""技术指标：逐支增量更新的 MACD / 威廉指标状态"""
+import copy
+import json
+import math
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+
+def _ema_step(prev, value, length):
+    """EMA递推（与 pandas ewm(adjust=False) 的计算顺序一致）"""
+    alpha = 2.0 / (length + 1)
+    old_wt = 1.0 - alpha
+    return (old_wt * prev + alpha * value) / (old_wt + alpha)
+
+
+def _willr(highs, lows, close, window):
+    if len(highs) < window:
+        return math.nan
+    hh = max(list(highs)[-window:])
+    ll = min(list(lows)[-window:])
+    num = 100 * (hh - close)
+    den = hh - ll
+    if den == 0:
+        return math.nan if num == 0 else math.copysign(math.inf, num)
+    return num / den
+
+
+class MacdWrState:
+    """单支股票的 MACD + 威廉指标递推状态
+
+    MACD 口径与 pandas_ta.macd 一致：EMA 以前 length 根的简单均值为种子，
+    信号线从 DIF 第一个有效值起同样以简单均值为种子。
+    威廉指标保存最近 max(wr_windows) 根的最高/最低价窗口。
+    """
+
+    def __init__(self, fast=12, slow=26, signal=9, wr_windows=(21, 42), tail=6):
+        self.params = {'fast': fast, 'slow': slow, 'signal': signal,
+                       'wr_windows': list(wr_windows), 'tail': tail}
+        self.count = 0
+        self.last_time = None
+        self.seed_closes = []  # 前 slow 根收盘价（EMA种子）
+        self.ema_fast = math.nan
+        self.ema_slow = math.nan
+        self.seed_dif = []  # 前 signal 个有效DIF（信号线种子）
+        self.ema_signal = math.nan
+        window = max(wr_windows)
+        self.highs = deque(maxlen=window)
+        self.lows = deque(maxlen=window)
+        self.tail = {key: deque(maxlen=tail) for key in ('dif', 'dea', 'hist', 'wr1', 'wr2')}
+
+    def push(self, time, high, low, close):
+        """追加一根K线，O(1)"""
+        fast, slow, signal = self.params['fast'], self.params['slow'], self.params['signal']
+        n = self.count
+        if n < slow:
+            self.seed_closes.append(close)
+
+        self.ema_fast = self._ema(self.ema_fast, close, fast, n, self.seed_closes)
+        self.ema_slow = self._ema(self.ema_slow, close, slow, n, self.seed_closes)
+        dif = self.ema_fast - self.ema_slow
+
+        dea = math.nan
+        if not math.isnan(dif):
+            m = n - (slow - 1)  # DIF 有效值序号
+            if m < signal:
+                self.seed_dif.append(dif)
+            dea = self.ema_signal = self._ema(self.ema_signal, dif, signal, m, self.seed_dif)
+
+        self.highs.append(high)
+        self.lows.append(low)
+        wr1_window, wr2_window = self.params['wr_windows']
+        self.tail['dif'].append(dif)
+        self.tail['dea'].append(dea)
+        self.tail['hist'].append(dif - dea)
+        self.tail['wr1'].append(_willr(self.highs, self.lows, close, wr1_window))
+        self.tail['wr2'].append(_willr(self.highs, self.lows, close, wr2_window))
+
+        self.count += 1
+        self.last_time = time
+
+    @staticmethod
+    def _ema(prev, value, length, index, seeds):
+        if index < length - 1:
+            return math.nan
+        if index == length - 1:
+            return float(np.sum(np.asarray(seeds[:length])) / length)
+        return _ema_step(prev, value, length)
+
+    def values(self, key):
+        """最近 tail 根的指标值（旧 → 新）"""
+        return list(self.tail[key])
+
+    def to_dict(self):
+        def clean(x):
+            return None if isinstance(x, float) and math.isnan(x) else x
+
+        return {
+            'params': self.params,
+            'count': self.count,
+            'last_time': self.last_time,
+            'seed_closes': self.seed_closes,
+            'ema_fast': clean(self.ema_fast),
+            'ema_slow': clean(self.ema_slow),
+            'seed_dif': self.seed_dif,
+            'ema_signal': clean(self.ema_signal),
+            'highs': list(self.highs),
+            'lows': list(self.lows),
+            'tail': {key: [clean(v) for v in values] for key, values in self.tail.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        def restore(x):
+            return math.nan if x is None else x
+
+        params = data['params']
+        state = cls(params['fast'], params['slow'], params['signal'], params['wr_windows'], params['tail'])
+        state.count = data['count']
+        state.last_time = data['last_time']
+        state.seed_closes = data['seed_closes']
+        state.ema_fast = restore(data['ema_fast'])
+        state.ema_slow = restore(data['ema_slow'])
+        state.seed_dif = data['seed_dif']
+        state.ema_signal = restore(data['ema_signal'])
+        state.highs.extend(data['highs'])
+        state.lows.extend(data['lows'])
+        for key, values in data['tail'].items():
+            state.tail[key].extend(restore(v) for v in values)
+        return state
+
+
+class IncrementalIndicators:
+    """按代码持久化的增量指标引擎
+
+    每支股票一个JSON状态文件。只有已收盘的K线会写入状态；
+    盘中未走完的K线在状态副本上计算，不落盘，下次拉到完整K线后再正式追加。
+    本地K线与状态对不上（例如仓库重建）时从头重算。
+    """
+
+    def __init__(self, root, fast=12, slow=26, signal=9, wr_windows=(21, 42), tail=6):
+        self.root = root
+        self.params = {'fast': fast, 'slow': slow, 'signal': signal,
+                       'wr_windows': list(wr_windows), 'tail': tail}
+
+    def _path(self, code):
+        return os.path.join(self.root, f"{code}.json")
+
+    def _new_state(self):
+        p = self.params
+        return MacdWrState(p['fast'], p['slow'], p['signal'], p['wr_windows'], p['tail'])
+
+    def load(self, code):
+        path = self._path(code)
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    state = MacdWrState.from_dict(json.load(f))
+                if state.params == self.params:
+                    return state
+            except (ValueError, KeyError, TypeError):
+                pass  # 状态文件损坏，重算
+        return self._new_state()
+
+    def save(self, code, state):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self._path(code) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state.to_dict(), f)
+        os.replace(tmp_path, self._path(code))
+
+    def update(self, code, times, highs, lows, closes, committed_until):
+        """用完整K线序列更新状态，只处理上次之后的新K线
+
+        times 为升序的时间字符串；不晚于 committed_until 的K线视为已走完并持久化。
+        返回包含全部K线（含未走完K线）的状态。
+        """
+        times = [str(t) for t in times]
+        state = self.load(code)
+
+        start = 0
+        if state.last_time is not None:
+            pos = int(np.searchsorted(times, state.last_time))
+            if pos < len(times) and times[pos] == state.last_time and pos + 1 == state.count:
+                start = pos + 1
+            else:
+                state = self._new_state()
+
+        committed = start
+        while committed < len(times) and times[committed] <= committed_until:
+            committed += 1
+
+        for i in range(start, committed):
+            state.push(times[i], float(highs[i]), float(lows[i]), float(closes[i]))
+        if committed > start:
+            self.save(code, state)
+
+        if committed < len(times):
+            state = copy.deepcopy(state)
+            for i in range(committed, len(times)):
+                state.push(times[i], float(highs[i]), float(lows[i]), float(closes[i]))
+        return state
+
+
+# ---- 二维（代码 × K线）指标：一次计算全部代码 ----
+# 输入每行为一支股票，左侧可以是补齐的NaN（如 panel.build_panel 的右对齐面板），
+# 有效数据开始后不应再出现NaN。预热期输出NaN，口径与 pandas_ta / 上方逐支实现一致。
+
+def _first_valid(x):
+    """每行第一个非NaN的位置，全NaN的行为列数"""
+    valid = ~np.isnan(x)
+    return np.where(valid.any(axis=1), valid.argmax(axis=1), x.shape[1])
+
+
+def ema_2d(x, length):
+    """逐行EMA：以前 length 个有效值的简单均值为种子，之后按 ewm(adjust=False) 递推"""
+    x = np.asarray(x, dtype=float)
+    n, width = x.shape
+    out = np.full((n, width), np.nan)
+    seed_at = _first_valid(x) + length - 1
+    has_seed = seed_at < width
+    if not has_seed.any():
+        return out
+
+    rows = np.nonzero(has_seed)[0]
+    csum = np.cumsum(np.nan_to_num(x[rows]), axis=1)
+    first = seed_at[rows] - length + 1
+    before = np.where(first > 0, csum[np.arange(len(rows)), np.maximum(first - 1, 0)], 0.0)
+    out[rows, seed_at[rows]] = (csum[np.arange(len(rows)), seed_at[rows]] - before) / length
+
+    alpha = 2.0 / (length + 1)
+    old_wt = 1.0 - alpha
+    start = int(seed_at[has_seed].min())
+    prev = out[:, start].copy()
+    for t in range(start + 1, width):
+        step = seed_at < t
+        current = (old_wt * prev + alpha * x[:, t]) / (old_wt + alpha)
+        out[step, t] = current[step]
+        prev = np.where(seed_at == t, out[:, t], np.where(step, current, prev))
+    return out
+
+
+def macd_2d(close, fast=12, slow=26, signal=9):
+    """MACD（DIF、DEA、柱），信号线从DIF第一个有效值起算"""
+    dif = ema_2d(close, fast) - ema_2d(close, slow)
+    dea = ema_2d(dif, signal)
+    return dif, dea, dif - dea
+
+
+def _rolling_extreme(x, window, func):
+    """van Herk/Gil-Werman：块内前缀/后缀累计极值，O(代码数 × K线数)，与窗口长度无关
+
+    窗口内有NaN（含预热期）时结果为NaN，同 pandas rolling(window) 的默认口径。
+    """
+    x = np.asarray(x, dtype=float)
+    n, width = x.shape
+    out = np.full((n, width), np.nan)
+    if window > width:
+        return out
+    blocks = -(-width // window)
+    padded = np.full((n, blocks * window), np.nan)
+    padded[:, :width] = x
+    padded = padded.reshape(n, blocks, window)
+    prefix = func.accumulate(padded, axis=2).reshape(n, -1)
+    suffix = func.accumulate(padded[:, :, ::-1], axis=2)[:, :, ::-1].reshape(n, -1)
+    out[:, window - 1:] = func(suffix[:, :width - window + 1], prefix[:, window - 1:width])
+    return out
+
+
+def rolling_max_2d(x, window):
+    return _rolling_extreme(x, window, np.maximum)
+
+
+def rolling_min_2d(x, window):
+    return _rolling_extreme(x, window, np.minimum)
+
+
+def willr_2d(high, low, close, window):
+    """威廉指标（本项目口径：100 × (最高 − 收盘) / (最高 − 最低)，0~100）"""
+    hh = rolling_max_2d(high, window)
+    ll = rolling_min_2d(low, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 * (hh - np.asarray(close, dtype=float)) / (hh - ll)
+
+
+def macd_wr_full(high, low, close, fast=12, slow=26, signal=9, wr_windows=(21, 42)):
+    """整段重算（pandas实现，作为增量结果的对照）"""
+    close = pd.Series(close, dtype=float)
+    high = pd.Series(high, dtype=float)
+    low = pd.Series(low, dtype=float)
+
+    def ema(series, length):
+        if len(series) < length:
+            return pd.Series(np.nan, index=series.index)
+        series = series.copy()
+        series.iloc[length - 1] = series.iloc[:length].mean()
+        series.iloc[:length - 1] = np.nan
+        return series.ewm(span=length, adjust=False).mean()
+
+    dif = ema(close, fast) - ema(close, slow)
+    dea = pd.Series(np.nan, index=close.index)
+    valid = dif.first_valid_index()
+    if valid is not None and len(dif) - valid >= signal:
+        dea.loc[valid:] = ema(dif.loc[valid:], signal)
+
+    result = {'dif': dif, 'dea': dea, 'hist': dif - dea}
+    for key, window in zip(('wr1', 'wr2'), wr_windows):
+        hh = high.rolling(window).max()
+        ll = low.rolling(window).min()
+        result[key] = 100 * (hh - close) / (hh - ll)
+    return pd.DataFrame(result)
+
+
+if __name__ == '__main__':
+    # 性能对比：python indicators.py [代码数] [K线数]（数值对照见 tests/test_indicators.py）
+    import sys
+    import time
+
+    try:
+        import pandas_ta as ta
+    except ImportError:
+        sys.exit("逐支基线（technical_analysis 原来的 pandas_ta 路径）需要安装 pandas_ta")
+
+    n_codes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_bars = int(sys.argv[2]) if len(sys.argv) > 2 else 240
+
+    rng = np.random.default_rng(0)
+    close = np.exp(np.cumsum(rng.normal(0, 0.02, (n_codes, n_bars)), axis=1)) * 10
+    high = close * (1 + rng.uniform(0, 0.02, close.shape))
+    low = close * (1 - rng.uniform(0, 0.02, close.shape))
+    # 部分代码历史较短，左侧补NaN
+    for i in np.nonzero(rng.random(n_codes) < 0.2)[0]:
+        cut = rng.integers(1, n_bars)
+        close[i, :cut] = high[i, :cut] = low[i, :cut] = np.nan
+
+    def per_frame(h, l, c):
+        """technical_analysis 原来的逐支 DataFrame 路径"""
+        df = pd.DataFrame({'high': h, 'low': l, 'close': c}).dropna()
+        wr = {}
+        for key, window in (('wr1', 21), ('wr2', 42)):
+            hh = df['high'].rolling(window).max()
+            ll = df['low'].rolling(window).min()
+            wr[key] = 100 * (hh - df['close']) / (hh - ll)
+        return wr, ta.macd(df['close'], fast=12, slow=26, signal=9)
+
+    start = time.perf_counter()
+    for i in range(n_codes):
+        per_frame(high[i], low[i], close[i])
+    frame_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    macd_2d(close)
+    willr_2d(high, low, close, 21)
+    willr_2d(high, low, close, 42)
+    panel_seconds = time.perf_counter() - start
+
+    print(f"{n_codes} 支 × {n_bars} 根:")
+    print(f"  逐支 DataFrame: {frame_seconds * 1000:8.1f} ms")
+    print(f"  二维面板:       {panel_seconds * 1000:8.1f} ms  （{frame_seconds / panel_seconds:.0f}x）")
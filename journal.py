@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# journal.py
+"""阶段断点日志：每处理完一支就追加一行并fsync，续跑时按内存索引跳过已完成代码"""
+import glob
+import json
+import os
+import threading
+
+
+def write_atomic(path, lines):
+    """整体替换结果文件（先写临时文件并fsync，再原子替换）"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + ('\n' if lines else ''))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def clear_journal(directory, stage):
+    """删除某阶段的全部日志（强制该阶段重新处理）"""
+    for path in glob.glob(os.path.join(directory, f"{stage}_*.jsonl")):
+        os.remove(path)
+
+
+class StageJournal:
+    """按 阶段+日期 划分的追加写日志
+
+    每行一条 {"code": ..., "passed": ...}；崩溃时最多丢失正在写的最后一行，
+    读取时跳过不完整的行。其他日期的旧日志在打开时清理。
+    """
+
+    def __init__(self, directory, stage, date):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{stage}_{date}.jsonl")
+        self.done = {}  # code -> passed
+        self._lock = threading.Lock()
+        self._prune(directory, stage)
+        self._load()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _prune(self, directory, stage):
+        for path in glob.glob(os.path.join(directory, f"{stage}_*.jsonl")):
+            if path != self.path:
+                os.remove(path)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            for line in data.splitlines():
+                try:
+                    entry = json.loads(line)
+                    self.done[entry['code']] = entry['passed']
+                except (ValueError, KeyError):
+                    continue  # 崩溃时写了一半的行
+            if data and not data.endswith(b'\n'):
+                f.write(b'\n')  # 补齐换行，避免新记录接在残行后面
+
+    def __contains__(self, code):
+        return code in self.done
+
+    def pending(self, codes):
+        """尚未处理的代码（保持原顺序）"""
+        return [code for code in codes if code not in self.done]
+
+    def passed(self, codes):
+        """codes 中已判定通过的代码（保持原顺序）"""
+        return [code for code in codes if self.done.get(code)]
+
+    def record(self, code, passed):
+        """记录一支的结果并立即落盘"""
+        with self._lock:
+            self._file.write(json.dumps({'code': code, 'passed': bool(passed)}) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.done[code] = bool(passed)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
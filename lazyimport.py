@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# lazyimport.py
+"""延迟导入与启动耗时统计：重量级依赖在首次使用时才导入"""
+import importlib
+import threading
+import time
+import unicodedata
+
+
+def _display_width(text):
+    """终端显示宽度（中文占两列）"""
+    return sum(2 if unicodedata.east_asian_width(ch) in 'WF' else 1 for ch in text)
+
+
+class StartupProfile:
+    """记录启动各环节耗时（导入、初始化、延迟导入）"""
+
+    def __init__(self):
+        self.records = []
+        self._last = time.perf_counter()
+
+    def mark(self, label, since=None):
+        """记录从上一个标记（或 since）到现在的耗时"""
+        now = time.perf_counter()
+        self.records.append((label, now - (self._last if since is None else since)))
+        self._last = now
+
+    def add(self, label, seconds):
+        self.records.append((label, seconds))
+
+    def report(self):
+        rows = self.records + [("合计", sum(seconds for _, seconds in self.records))]
+        width = max(_display_width(label) for label, _ in rows)
+        lines = ["=== 启动耗时 ==="]
+        for label, seconds in rows:
+            lines.append(f"{label}{' ' * (width - _display_width(label))}  {seconds * 1000:8.1f} ms")
+        return '\n'.join(lines)
+
+
+PROFILE = StartupProfile()
+
+
+class LazyModule:
+    """模块代理：第一次访问属性时才真正导入，并把导入耗时记入 PROFILE"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):  # 避免 copy/pickle 等探测触发导入
+            raise AttributeError(attr)
+        return getattr(self._load(), attr)
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                start = time.perf_counter()
+                self._module = importlib.import_module(self._name)
+                PROFILE.add(f"延迟导入 {self._name}", time.perf_counter() - start)
+            return self._module
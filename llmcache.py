@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# llmcache.py
+"""DeepSeek 分析缓存与流式输出
+
+缓存以 (模型, 系统提示词, 用户内容, temperature) 的哈希为键，按日期分目录存放，只在当天有效：
+同一天内提示词完全相同的请求（如交互控制台先单独分析、再推送报告）直接复用结果。
+"""
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+
+
+class LLMCache:
+    """按内容寻址的当日缓存：{directory}/{YYYY-MM-DD}/{key}.json"""
+
+    def __init__(self, directory, keep_days=7):
+        self.directory = directory
+        self.keep_days = keep_days  # 过期目录保留天数（只用于排查，不再命中）
+
+    @staticmethod
+    def key(model, system_prompt, user_content, temperature):
+        payload = json.dumps([model, system_prompt, user_content, temperature], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key, day):
+        return os.path.join(self.directory, day.strftime("%Y-%m-%d"), f"{key}.json")
+
+    def get(self, key, now=None):
+        """当天的缓存内容，没有则返回 None"""
+        path = self._path(key, now or datetime.now())
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)['content']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key, content, now=None, **meta):
+        now = now or datetime.now()
+        path = self._path(key, now)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'created': now.isoformat(timespec='seconds'), 'content': content, **meta}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._prune(now)
+
+    def _prune(self, now):
+        cutoff = (now - timedelta(days=self.keep_days)).strftime("%Y-%m-%d")
+        for name in os.listdir(self.directory):
+            if len(name) == 10 and name < cutoff:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+
+def stream_to_file(chunks, path, header=''):
+    """把流式响应逐块写入文件（写一块刷一次盘），返回完整文本
+
+    chunks 为 chat.completions.create(stream=True) 的返回值。
+    中途出错时已收到的部分仍保留在文件中。
+    """
+    parts = []
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(header)
+        f.flush()
+        for chunk in chunks:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                f.write(delta)
+                f.flush()
+                parts.append(delta)
+    return ''.join(parts)
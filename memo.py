@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# memo.py
+"""请求记忆层：同一交易日内相同K线不重复下载（区间包含即命中、并发相同请求合并、按行数LRU淘汰）"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+
+import pandas as pd
+
+from barstore import slice_by_date
+from snapshot import in_session, next_open
+
+# 按区间缓存的接口 -> 时间列
+RANGE_ENDPOINTS = {
+    'stock_zh_a_hist_min_em': '时间',
+    'stock_zh_a_hist': '日期',
+}
+
+
+def _parse_bound(value, is_end):
+    """区间端点转为Timestamp；只有日期的结束端点扩展到当天结束"""
+    if value is None:
+        return pd.Timestamp.max if is_end else pd.Timestamp.min
+    bound = pd.Timestamp(value)
+    if is_end and bound == bound.normalize():
+        bound += pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+    return bound
+
+
+class _Entry:
+    __slots__ = ('key', 'start', 'end', 'fetched_at', 'value', 'weight')
+
+    def __init__(self, key, start, end, fetched_at, value, weight):
+        self.key = key
+        self.start = start
+        self.end = end
+        self.fetched_at = fetched_at
+        self.value = value
+        self.weight = weight
+
+    @property
+    def covered_end(self):
+        """数据实际覆盖到的时间：盘中抓取只到抓取时刻，盘后抓取一直有效到下次开盘"""
+        complete_until = self.fetched_at if in_session(self.fetched_at) else next_open(self.fetched_at)
+        return min(self.end, pd.Timestamp(complete_until))
+
+
+class FetchMemo:
+    """akshare 请求记忆层（接口与 FetchEngine.call 相同，可直接替换）
+
+    - K线接口按 (接口, 代码, 周期, 复权) 缓存，已缓存的更宽区间可直接截取回答较窄的请求；
+    - 相同请求并发到达时只发一次，其余等待同一结果；
+    - 条目总行数超过 max_rows 时按最近最少使用淘汰；跨日自动清空。
+    其他接口直接透传。
+    """
+
+    def __init__(self, call=None, max_rows=500_000, range_endpoints=None):
+        self.call_through = call or (lambda endpoint, func, **kwargs: func(**kwargs))
+        self.max_rows = max_rows
+        self.range_endpoints = dict(RANGE_ENDPOINTS if range_endpoints is None else range_endpoints)
+        self._lru = OrderedDict()  # (key, start, end) -> _Entry
+        self._by_key = {}  # key -> {(key, start, end)}
+        self._weight = 0
+        self._inflight = {}
+        self._day = datetime.now().date()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0}
+
+    def call(self, endpoint, func, **kwargs):
+        time_col = self.range_endpoints.get(endpoint)
+        if time_col is None:
+            return self.call_through(endpoint, func, **kwargs)
+
+        key = (endpoint, kwargs.get('symbol'), kwargs.get('period'), kwargs.get('adjust'))
+        start = _parse_bound(kwargs.get('start_date'), is_end=False)
+        end = _parse_bound(kwargs.get('end_date'), is_end=True)
+        df = self._get_or_fetch(
+            (key, start, end),
+            lambda entry: entry.start <= start and min(end, pd.Timestamp.now()) <= entry.covered_end,
+            lambda: self.call_through(endpoint, func, **kwargs),
+            weigh=len,
+        )
+        if df.empty:
+            return df
+        return slice_by_date(df, time_col, start, end)
+
+    def cached(self, key, compute, max_age, cache_if=None):
+        """通用记忆：max_age 秒内直接返回上次 compute() 的结果（同样合并并发请求）
+
+        cache_if(结果) 为假时不记忆（如获取失败返回的空结果），下次调用重新计算。
+        """
+        return self._get_or_fetch(
+            (('value', key), pd.Timestamp.min, pd.Timestamp.max),
+            lambda entry: (datetime.now() - entry.fetched_at).total_seconds() <= max_age,
+            compute,
+            weigh=lambda value: 1,
+            cache_if=cache_if,
+        )
+
+    def _get_or_fetch(self, flight_key, matches, fetch, weigh, cache_if=None):
+        with self._lock:
+            self._expire_day()
+            for lru_key in self._by_key.get(flight_key[0], ()):
+                entry = self._lru[lru_key]
+                if matches(entry):
+                    self._lru.move_to_end(lru_key)
+                    self.stats['hits'] += 1
+                    return entry.value
+            future = self._inflight.get(flight_key)
+            owner = future is None
+            if owner:
+                future = self._inflight[flight_key] = Future()
+                self.stats['misses'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not owner:
+            return future.result()
+
+        fetched_at = datetime.now()
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(flight_key, None)
+            future.set_exception(e)
+            raise
+
+        if cache_if is not None and not cache_if(value):
+            with self._lock:
+                self._inflight.pop(flight_key, None)
+            future.set_result(value)
+            return value
+
+        with self._lock:
+            self._inflight.pop(flight_key, None)
+            key, start, end = flight_key
+            entry = _Entry(key, start, end, fetched_at, value, weigh(value))
+            old = self._lru.pop(flight_key, None)
+            if old is not None:
+                self._weight -= old.weight
+            self._lru[flight_key] = entry
+            self._by_key.setdefault(key, set()).add(flight_key)
+            self._weight += entry.weight
+            self._evict()
+        future.set_result(value)
+        return value
+
+    def _evict(self):
+        while self._weight > self.max_rows and len(self._lru) > 1:
+            lru_key, entry = self._lru.popitem(last=False)
+            self._weight -= entry.weight
+            self._by_key[entry.key].discard(lru_key)
+            if not self._by_key[entry.key]:
+                del self._by_key[entry.key]
+
+    def _expire_day(self):
+        today = datetime.now().date()
+        if today != self._day:
+            self._lru.clear()
+            self._by_key.clear()
+            self._weight = 0
+            self._day = today
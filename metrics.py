@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# metrics.py
+"""运行指标：各阶段耗时/CPU、各接口请求数、延迟分位、重试、失败与数据量
+
+阶段用 stage() 包住（可嵌套，接口调用记在最内层阶段下），接口调用由 FetchEngine / AsyncDataSource
+上报，计算密集的代码段用 cpu() 统计所在线程的CPU时间。每次运行结束写出
+Prometheus 文本格式（metrics.prom）与 JSON（metrics.json），并把 JSON 追加到历史文件便于长期对比。
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+# 延迟直方图分桶（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PERCENTILES = (50, 90, 99)
+NO_STAGE = '-'
+
+
+class _CallStats:
+    __slots__ = ('latencies', 'failures', 'retries', 'timeouts', 'rows', 'bytes', 'wait')
+
+    def __init__(self):
+        self.latencies = []
+        self.failures = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.rows = 0
+        self.bytes = 0
+        self.wait = 0.0  # 限速排队时间
+
+
+class Metrics:
+    """线程安全的指标登记表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = datetime.now()
+            self.calls = defaultdict(_CallStats)  # (阶段, 接口) -> 统计
+            self.stages = {}  # 阶段 -> {'wall', 'cpu', 'runs'}
+            self.cpu_sections = defaultdict(float)  # (阶段, 代码段) -> CPU秒
+            self._stack = []
+
+    @property
+    def current_stage(self):
+        return self._stack[-1] if self._stack else NO_STAGE
+
+    # ---- 采集 ----
+    @contextmanager
+    def stage(self, name):
+        """统计一个阶段的墙钟时间与进程CPU时间（含线程池）"""
+        with self._lock:
+            self._stack.append(name)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            with self._lock:
+                self._stack.remove(name)
+                stats = self.stages.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'runs': 0})
+                stats['wall'] += wall
+                stats['cpu'] += cpu
+                stats['runs'] += 1
+
+    def timed_stage(self, name):
+        """方法装饰器：整个调用计为阶段 name"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def cpu(self, section):
+        """统计当前线程在代码段内的CPU时间（pandas/指标计算）"""
+        start = time.thread_time()
+        try:
+            yield
+        finally:
+            elapsed = time.thread_time() - start
+            with self._lock:
+                self.cpu_sections[(self.current_stage, section)] += elapsed
+
+    def observe_call(self, endpoint, seconds, wait=0.0, result=None, failed=False):
+        """记录一次接口调用；result 为DataFrame时累计行数与内存字节数"""
+        rows = nbytes = 0
+        if result is not None and hasattr(result, 'memory_usage'):
+            rows, nbytes = len(result), int(result.memory_usage(index=True).sum())
+        with self._lock:
+            stats = self.calls[(self.current_stage, endpoint)]
+            stats.latencies.append(seconds)
+            stats.wait += wait
+            stats.failures += failed
+            stats.rows += rows
+            stats.bytes += nbytes
+
+    def count_retry(self, endpoint, timeout=False):
+        with self._lock:
+            stats = self.calls[(self.current_stage, endpoint)]
+            stats.retries += 1
+            stats.timeouts += timeout
+
+    # ---- 导出 ----
+    def to_dict(self):
+        with self._lock:
+            endpoints = []
+            for (stage, endpoint), stats in sorted(self.calls.items()):
+                latencies = np.array(stats.latencies)
+                row = {
+                    'stage': stage, 'endpoint': endpoint,
+                    'requests': len(latencies), 'failures': stats.failures,
+                    'retries': stats.retries, 'timeouts': stats.timeouts,
+                    'rows': stats.rows, 'bytes': stats.bytes,
+                    'wait_seconds': round(stats.wait, 4),
+                    'latency_seconds': round(float(latencies.sum()), 4),
+                }
+                if len(latencies):
+                    row.update({f'p{p}': round(float(v), 4)
+                                for p, v in zip(PERCENTILES, np.percentile(latencies, PERCENTILES))})
+                    row['max'] = round(float(latencies.max()), 4)
+                endpoints.append(row)
+            return {
+                'started': self.started.isoformat(timespec='seconds'),
+                'finished': datetime.now().isoformat(timespec='seconds'),
+                'stages': {name: {key: round(value, 4) for key, value in stats.items()}
+                           for name, stats in self.stages.items()},
+                'endpoints': endpoints,
+                'cpu': [{'stage': stage, 'section': section, 'seconds': round(seconds, 4)}
+                        for (stage, section), seconds in sorted(self.cpu_sections.items())],
+            }
+
+    def to_prometheus(self, prefix='stock'):
+        """Prometheus 文本格式（可由 node_exporter textfile collector 采集）"""
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{prefix}_{name}{suffix}{{{label_text}}} {float(value):.10g}")
+
+        with self._lock:
+            stages = dict(self.stages)
+            calls = sorted(self.calls.items())
+            cpu_sections = sorted(self.cpu_sections.items())
+
+        family('stage_wall_seconds', 'gauge', 'Stage wall-clock time',
+               [('', {'stage': s}, v['wall']) for s, v in stages.items()])
+        family('stage_cpu_seconds', 'gauge', 'Stage process CPU time',
+               [('', {'stage': s}, v['cpu']) for s, v in stages.items()])
+        for name, attr, help_text in (
+            ('fetch_failures_total', 'failures', 'Failed upstream calls'),
+            ('fetch_retries_total', 'retries', 'Retried upstream calls'),
+            ('fetch_timeouts_total', 'timeouts', 'Upstream calls that timed out'),
+            ('fetch_rows_total', 'rows', 'Rows received'),
+            ('fetch_bytes_total', 'bytes', 'Bytes received (DataFrame memory)'),
+            ('fetch_wait_seconds_total', 'wait', 'Time spent waiting for rate limit tokens'),
+        ):
+            family(name, 'counter', help_text,
+                   [('', {'stage': s, 'endpoint': e}, getattr(stats, attr)) for (s, e), stats in calls])
+
+        samples = []
+        for (stage, endpoint), stats in calls:
+            labels = {'stage': stage, 'endpoint': endpoint}
+            latencies = np.sort(np.array(stats.latencies))
+            for bound in LATENCY_BUCKETS:
+                samples.append(('_bucket', {**labels, 'le': f'{bound:g}'},
+                                np.searchsorted(latencies, bound, side='right')))
+            samples.append(('_bucket', {**labels, 'le': '+Inf'}, len(latencies)))
+            samples.append(('_sum', labels, float(latencies.sum())))
+            samples.append(('_count', labels, len(latencies)))
+        family('fetch_latency_seconds', 'histogram', 'Upstream call latency', samples)
+
+        family('compute_cpu_seconds_total', 'counter', 'Thread CPU time in compute sections',
+               [('', {'stage': s, 'section': c}, v) for (s, c), v in cpu_sections])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, directory):
+        """写出 metrics.prom、metrics.json，并追加到 metrics_history.jsonl"""
+        os.makedirs(directory, exist_ok=True)
+        data = self.to_dict()
+        for filename, text in (('metrics.prom', self.to_prometheus()),
+                               ('metrics.json', json.dumps(data, ensure_ascii=False, indent=2))):
+            path = os.path.join(directory, filename)
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(path + '.tmp', path)
+        with open(os.path.join(directory, 'metrics_history.jsonl'), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(data, ensure_ascii=False) + '\n')
+        return directory
+
+
+METRICS = Metrics()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# panel.py
+"""代码 × K线 二维面板：把全市场的序列放进一个NumPy数组，一次完成横截面筛选"""
+import warnings
+
+import numpy as np
+
+
+def build_panel(series_list, bars):
+    """按右对齐拼成 (代码数, bars) 的二维数组
+
+    每个序列只保留最近 bars 个值，历史不足的左侧用NaN补齐。
+    返回 (panel, lengths)，lengths 为各代码实际放入的K线数量。
+    """
+    panel = np.full((len(series_list), bars), np.nan)
+    lengths = np.zeros(len(series_list), dtype=int)
+    for i, values in enumerate(series_list):
+        tail = np.asarray(values, dtype=float)[-bars:]
+        if len(tail):
+            panel[i, bars - len(tail):] = tail
+        lengths[i] = len(tail)
+    return panel, lengths
+
+
+def amount_ratio_screen(panel, lengths, window, ratio, min_length):
+    """成交金额放量筛选（向量化版 StockAnalyzer._amount_passed）
+
+    近 window 根均额 >= ratio × 之前均额，且K线数量不少于 min_length。
+    返回 (passed, historical_mean, recent_mean)，均为按代码排列的一维数组。
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)  # 全NaN行求均值
+        historical_mean = np.nanmean(panel[:, :-window], axis=1)
+        recent_mean = np.nanmean(panel[:, -window:], axis=1)
+        passed = (lengths >= min_length) & (recent_mean >= ratio * historical_mean)
+    return passed, historical_mean, recent_mean
+
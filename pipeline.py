@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# pipeline.py
+"""单进程流水线：按 市值 → 成交金额 → 强势 → 技术 → 推送 的顺序在内存中传递结果，可常驻定时运行"""
+import os
+import time
+import traceback
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from barstore import last_session_close
+from journal import clear_journal, write_atomic
+
+# 阶段依赖顺序（每个阶段的输入是上一阶段的输出）
+STAGES = ('market_cap', 'amount', 'qiangrizhangfu', 'technical', 'send_report')
+
+
+@dataclass
+class StageResult:
+    """阶段结果"""
+    stage: str
+    codes: List[str]
+    started_at: datetime
+    elapsed: float
+    artifact: Optional[str] = None  # 写出的结果文件（未写出为None）
+
+
+@dataclass
+class PipelineJob:
+    """定时任务：在 weekdays（isoweekday，1=周一 … 7=周日）的 at（HH:MM）运行 stages"""
+    name: str
+    stages: List[str]
+    weekdays: List[int]
+    at: str
+    last_run: Optional[str] = field(default=None, compare=False)  # 最近一次运行的日期
+
+
+class Pipeline:
+    """流水线
+
+    阶段输出保存在 self.results 中供下游直接使用；本次未运行的上游阶段，
+    优先使用同一进程里上一次的结果，其次读取其结果文件（兼容分开运行的旧方式）。
+    两者都只认最近一次收盘之后产生的，更早的视为缺失，该阶段直接失败（不拿前几晚的结果筛选）。
+    结果文件仅作为可选产物写出。
+    """
+
+    def __init__(self, analyzer, config, panel=False, write_artifacts=True):
+        self.analyzer = analyzer
+        self.config = config
+        self.panel = panel
+        self.write_artifacts = write_artifacts
+        self.results: Dict[str, StageResult] = {}
+        # 阶段 -> 结果文件
+        self.artifacts = {
+            'market_cap': config.INITIAL_SCREENING_PATH,
+            'amount': config.RESULT_PATH,
+            'qiangrizhangfu': config.TECHNICAL_PATH,
+            'technical': config.FINAL_RESULT_PATH,
+        }
+
+    def run(self, stages):
+        """按依赖顺序运行指定阶段，返回 {阶段: StageResult}"""
+        unknown = [s for s in stages if s not in STAGES]
+        if unknown:
+            raise ValueError(f"未知阶段: {unknown}，可选: {', '.join(STAGES)}")
+
+        self.analyzer.today = datetime.now()  # 常驻进程每次运行刷新日期
+        ordered = [s for s in STAGES if s in stages]
+        if 'market_cap' in ordered and 'amount' in ordered:
+            clear_journal(self.config.JOURNAL_DIR, 'amount')  # 股票池已更新，成交金额重新筛选
+
+        print(f"\n=== 流水线开始: {' → '.join(ordered)} ===")
+        for stage in ordered:
+            started_at = datetime.now()
+            start_time = time.time()
+            codes = getattr(self, f'_run_{stage}')(self._input_of(stage))
+            if codes is None:
+                raise RuntimeError(f"阶段 {stage} 执行失败")
+
+            artifact = self.artifacts.get(stage) if self.write_artifacts else None
+            if artifact:
+                write_atomic(artifact, codes)
+            self.results[stage] = StageResult(stage, list(codes), started_at, time.time() - start_time, artifact)
+            print(f"⏱️ 阶段 {stage} 完成：输出 {len(codes)} 支，用时 {time.time() - start_time:.1f}s")
+        return {stage: self.results[stage] for stage in ordered}
+
+    def _input_of(self, stage):
+        """上游阶段的输出（market_cap 无输入）"""
+        index = STAGES.index(stage)
+        if index == 0:
+            return None
+        upstream = STAGES[index - 1]
+        session = last_session_close(self.analyzer.today)
+        result = self.results.get(upstream)
+        if result is not None and result.started_at >= session:
+            return result.codes
+
+        path = self.artifacts[upstream]
+        produced_at = datetime.fromtimestamp(os.path.getmtime(path)) if os.path.exists(path) else None
+        if produced_at is not None and produced_at >= session:
+            return self.analyzer._read_codes(path)
+
+        found = [f"进程内结果 {result.started_at:%Y-%m-%d %H:%M}" if result else "无进程内结果",
+                 f"结果文件 {produced_at:%Y-%m-%d %H:%M}" if produced_at else f"无结果文件 {path}"]
+        raise RuntimeError(f"阶段 {stage} 缺少上游 {upstream} 在 {session:%Y-%m-%d %H:%M} 收盘之后的结果"
+                           f"（{'，'.join(found)}）")
+
+    # ---- 各阶段 ----
+    def _run_market_cap(self, _):
+        return self.analyzer.run_market_cap_screening(write_result=False)
+
+    def _run_amount(self, codes):
+        if self.panel:
+            result = self.analyzer.amount_analysis_panel(codes, write_result=False)
+        else:
+            result = self.analyzer.amount_analysis(codes, write_result=False)
+        return result if isinstance(result, list) else None
+
+    def _run_qiangrizhangfu(self, codes):
+        if self.panel:
+            return self.analyzer.get_qiangrizhangfu_panel(codes)
+        return self.analyzer.get_qiangrizhangfu(codes)
+
+    def _run_technical(self, codes):
+        if self.panel:
+            return self.analyzer.technical_analysis_panel(codes)
+        return self.analyzer.technical_analysis(codes)
+
+    def _run_send_report(self, codes):
+        data = self.analyzer.get_realtime_data(codes)
+        self.analyzer.send_notification(data)
+        return codes
+
+    # ---- 常驻模式 ----
+    def serve(self, jobs, poll_interval=20):
+        """常驻进程：到点运行任务，单个任务失败不影响后续调度"""
+        print(f"🕒 流水线常驻启动，任务: {', '.join(f'{job.name}@{job.at}' for job in jobs)}")
+        while True:
+            now = datetime.now()
+            for job in jobs:
+                today = now.strftime("%Y-%m-%d")
+                if now.isoweekday() in job.weekdays and now.strftime("%H:%M") == job.at and job.last_run != today:
+                    job.last_run = today
+                    print(f"\n===== 任务 {job.name} 开始 {now} =====")
+                    try:
+                        self.run(job.stages)
+                    except Exception as e:
+                        print(f"‼️ 任务 {job.name} 异常: {str(e)}")
+                        traceback.print_exc()
+                    finally:
+                        self.analyzer.write_metrics(reset=True)  # 每个任务单独一份指标
+                    print(f"===== 任务 {job.name} 完成 {datetime.now()} =====")
+            time.sleep(poll_interval)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# prompt.py
+"""LLM 提示词压缩：资金流与概念表转成紧凑的数值特征行，按 token 预算分级取舍
+
+预算不够时依次减少：个股大小单明细 → 龙头/概念行数 → 个股逐日序列；
+每支股票至少保留一行（5日主力净额合计与连续流入天数），不会整支丢弃。
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+FLOW_COLUMNS = {
+    '主力': '主力净流入-净额',
+    '超大': '超大单净流入-净额',
+    '大': '大单净流入-净额',
+    '中': '中单净流入-净额',
+    '小': '小单净流入-净额',
+}
+# 由详到简的取舍方案：(个股详细程度, 概念行数, 龙头行数)
+#   个股详细程度 2=合计+逐日+大小单，1=合计+逐日，0=合计
+PLANS = (
+    (2, 8, 8),
+    (2, 8, 5),
+    (1, 8, 5),
+    (1, 5, 3),
+    (0, 5, 3),
+    (0, 3, 0),
+)
+
+_CJK = re.compile(r'[　-鿿＀-￯]')
+
+
+def count_tokens(text):
+    """估算 token 数：中文字符（含全角标点）约 0.6 个，其余约 3.5 个字符 1 个
+
+    DeepSeek 的分词器未公开发布为独立包，按其文档给出的换算比例估算，用于预算取舍足够。
+    """
+    cjk = len(_CJK.findall(text))
+    return int(np.ceil(cjk * 0.6 + (len(text) - cjk) / 3.5))
+
+
+def _yi(value):
+    return f"{value / 1e8:+.2f}"
+
+
+def flow_features(money_flow):
+    """按股票汇总近5日资金流：{代码: 特征字典}"""
+    features = {}
+    if money_flow.empty:
+        return features
+    for code, group in money_flow.sort_values('日期').groupby('股票代码', sort=False):
+        main = group[FLOW_COLUMNS['主力']].astype(float).to_numpy()
+        streak = 0
+        for value in main[::-1]:
+            if value <= 0:
+                break
+            streak += 1
+        features[code] = {
+            'days': len(main),
+            'main': main,
+            'total': {name: float(group[column].astype(float).sum()) for name, column in FLOW_COLUMNS.items()},
+            'streak': streak,
+            'peak': float(main[np.argmax(np.abs(main))]) if len(main) else 0.0,
+        }
+    return features
+
+
+def stock_line(code, feature, level):
+    """单支股票的一行特征（金额单位：亿元）"""
+    if feature is None:
+        return f"{code}｜无资金流数据"
+    parts = [f"{code}｜主力{feature['days']}日{_yi(feature['total']['主力'])}", f"连续流入{feature['streak']}日"]
+    if level >= 1:
+        parts.append("逐日" + "/".join(_yi(v) for v in feature['main']))
+        parts.append(f"单日峰值{_yi(feature['peak'])}")
+    if level >= 2:
+        parts.append(" ".join(f"{name}{_yi(feature['total'][name])}" for name in ('超大', '大', '中', '小')))
+    return "｜".join(parts)
+
+
+def concept_lines(concept_table, rows):
+    if concept_table is None or concept_table.empty or rows == 0:
+        return []
+    items = [f"{row['概念名称']} {row['总热度']:.0f}({row['涉及股票数']}支)" for _, row in concept_table.head(rows).iterrows()]
+    return ["概念热度：" + "；".join(items)]
+
+
+def leader_lines(leader_table, rows):
+    if leader_table is None or leader_table.empty or rows == 0:
+        return []
+    items = [f"{row['概念名称']}→{row['股票代码']}({row['最高热度']:.0f})" for _, row in leader_table.head(rows).iterrows()]
+    return ["概念龙头：" + "；".join(items)]
+
+
+def render(codes, features, concept_table, leader_table, plan):
+    level, concept_rows, leader_rows = plan
+    lines = ["## 市场画像"]
+    lines += concept_lines(concept_table, concept_rows) or ["暂无有效概念数据"]
+    lines += leader_lines(leader_table, leader_rows)
+    if codes is None:
+        return "\n".join(lines)
+    lines += ["", "## 个股资金流（近5日，亿元，+为净流入）", f"目标股票代码：{', '.join(codes) or '无有效代码'}"]
+    lines += [stock_line(code, features.get(code), level) for code in codes]
+    return "\n".join(lines)
+
+
+def build_prompt(codes, money_flow, concept_table=None, leader_table=None, budget=3000):
+    """在 token 预算内生成用户消息，返回 (文本, 估算token数, 采用的方案)
+
+    codes 为 money_flow 中的股票代码格式（如 600000.SH），为 None 时只生成市场画像部分。
+    最简方案仍超预算时原样返回最简方案。
+    """
+    features = flow_features(money_flow if money_flow is not None else pd.DataFrame())
+    for plan in PLANS:
+        text = render(codes, features, concept_table, leader_table, plan)
+        tokens = count_tokens(text)
+        if tokens <= budget:
+            return text, tokens, plan
+    return text, tokens, plan
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# resample.py
+"""多周期重采样：由本地细粒度分钟线按A股交易时段合成 60/120分钟、日、周K线"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+# 交易时段（分钟数，自零点起）：09:30–11:30、13:00–15:00，共240分钟
+MORNING_OPEN = 9 * 60 + 30
+MORNING_CLOSE = 11 * 60 + 30
+AFTERNOON_OPEN = 13 * 60
+SESSION_MINUTES = 240
+
+INTRADAY_PERIODS = {'60': 60, '120': 120}
+TARGETS = ('60', '120', 'daily', 'weekly')
+
+# 字段聚合方式（与东财K线字段同名）；涨跌幅、换手率等派生字段不合成
+AGGREGATIONS = {
+    '开盘': 'first',
+    '收盘': 'last',
+    '最高': 'max',
+    '最低': 'min',
+    '成交量': 'sum',
+    '成交额': 'sum',
+}
+
+
+def _elapsed_minutes(times):
+    """距开盘已交易的分钟数（午休不计）"""
+    clock = (times.dt.hour * 60 + times.dt.minute).to_numpy()
+    return np.where(clock <= MORNING_CLOSE, clock - MORNING_OPEN, clock - AFTERNOON_OPEN + SESSION_MINUTES // 2)
+
+
+def _clock_label(elapsed):
+    """已交易分钟数 → 当日时钟时间（分钟）"""
+    return np.where(elapsed <= SESSION_MINUTES // 2, MORNING_OPEN + elapsed, AFTERNOON_OPEN + elapsed - SESSION_MINUTES // 2)
+
+
+def _aggregate(df, keys, label_col, labels):
+    columns = {col: how for col, how in AGGREGATIONS.items() if col in df.columns}
+    grouped = df.groupby(keys, sort=True).agg(columns).reset_index(drop=True)
+    grouped.insert(0, label_col, labels)
+    return grouped
+
+
+def resample_intraday(df, period, time_col='时间'):
+    """分钟线 → 60/120分钟线
+
+    东财分钟线以K线结束时间标记（如 10:30 表示 09:30–10:30），合成结果沿用同一口径；
+    09:30 的集合竞价K线并入第一根，15:00 之后的盘后K线并入最后一根。
+    """
+    step = INTRADAY_PERIODS[str(period)]
+    if df.empty:
+        return pd.DataFrame(columns=[time_col] + [c for c in AGGREGATIONS if c in df.columns])
+
+    df = df.sort_values(time_col, kind='stable')
+    times = pd.to_datetime(df[time_col])
+    bucket = np.clip(np.ceil(_elapsed_minutes(times) / step), 1, SESSION_MINUTES // step).astype(int)
+    end = _clock_label(bucket * step)
+    label = (
+        times.dt.normalize()
+        + pd.to_timedelta(end // 60, unit='h')
+        + pd.to_timedelta(end % 60, unit='m')
+    ).dt.strftime("%Y-%m-%d %H:%M:%S").to_numpy()
+
+    labels = pd.unique(label)
+    return _aggregate(df, label, time_col, labels)
+
+
+def resample_daily(df, time_col='时间'):
+    """分钟线 → 日线（日期列为 datetime.date，与 ak.stock_zh_a_hist 一致）"""
+    if df.empty:
+        return pd.DataFrame(columns=['日期'] + [c for c in AGGREGATIONS if c in df.columns])
+    df = df.sort_values(time_col, kind='stable')
+    dates = pd.to_datetime(df[time_col]).dt.date.to_numpy()
+    return _aggregate(df, dates, '日期', pd.unique(dates))
+
+
+def resample_weekly(daily):
+    """日线 → 周线（以当周最后一个交易日标记）"""
+    if daily.empty:
+        return daily.copy()
+    daily = daily.sort_values('日期', kind='stable')
+    dates = pd.to_datetime(daily['日期'])
+    iso = dates.dt.isocalendar()
+    week = (iso['year'] * 100 + iso['week']).to_numpy()
+    last_days = dates.groupby(week, sort=True).max().dt.date.to_numpy()
+    return _aggregate(daily, week, '日期', last_days)
+
+
+def resample(df, target):
+    """按目标周期合成K线；输入为分钟线（时间列）或日线（日期列，仅可合成周线）"""
+    target = str(target)
+    if target not in TARGETS:
+        raise ValueError(f"不支持的目标周期: {target}，可选: {', '.join(TARGETS)}")
+
+    if '时间' not in df.columns:
+        if target != 'weekly':
+            raise ValueError(f"日线只能合成周线，不能合成 {target}")
+        return resample_weekly(df)
+
+    if target in INTRADAY_PERIODS:
+        return resample_intraday(df, target)
+    daily = resample_daily(df)
+    return daily if target == 'daily' else resample_weekly(daily)
+
+
+def compare_bars(local, exchange, columns=None, rtol=0.005):
+    """本地合成K线与交易所K线逐根对照，返回不一致的记录
+
+    两边按时间对齐；一边缺失的K线也会列出（缺失侧为NaN）。
+    返回列：时间、字段、本地、交易所、相对误差。
+    """
+    time_col = '时间' if '时间' in exchange.columns else '日期'
+    columns = columns or [c for c in AGGREGATIONS if c in local.columns and c in exchange.columns]
+
+    def keyed(df):
+        df = df.copy()
+        df['_key'] = pd.to_datetime(df[time_col]).dt.strftime("%Y-%m-%d %H:%M:%S")
+        return df.set_index('_key')[columns].astype(float)
+
+    merged = keyed(local).join(keyed(exchange), how='outer', lsuffix='_local', rsuffix='_exchange')
+    rows = []
+    for col in columns:
+        mine, theirs = merged[f'{col}_local'], merged[f'{col}_exchange']
+        diff = (mine - theirs).abs() / theirs.abs().where(theirs != 0, 1.0)
+        bad = ~np.isclose(mine, theirs, rtol=rtol, atol=0) | mine.isna() | theirs.isna()
+        for key in merged.index[bad.to_numpy()]:
+            rows.append((key, col, mine[key], theirs[key], diff[key]))
+    return pd.DataFrame(rows, columns=['时间', '字段', '本地', '交易所', '相对误差']).sort_values(
+        ['时间', '字段'], ignore_index=True)
+
+
+if __name__ == '__main__':
+    # 对照检查：python resample.py 600519 [源周期=5] [复权=hfq]
+    import akshare as ak
+
+    code = sys.argv[1] if len(sys.argv) > 1 else '600519'
+    source_period = sys.argv[2] if len(sys.argv) > 2 else '5'
+    adjust = sys.argv[3] if len(sys.argv) > 3 else 'hfq'
+
+    source = ak.stock_zh_a_hist_min_em(symbol=code, period=source_period, adjust=adjust)
+    first, last = pd.to_datetime(source['时间']).agg(['min', 'max'])
+    # 首日可能不完整，从第二个交易日开始对照
+    start = (first.normalize() + pd.Timedelta(days=1)).strftime("%Y-%m-%d 09:30:00")
+    source = source[pd.to_datetime(source['时间']) >= pd.Timestamp(start)]
+    print(f"{code} {source_period}分钟线 {len(source)} 根，{start} ~ {last}")
+
+    for target in ('60', 'daily'):
+        if target == 'daily':
+            exchange = ak.stock_zh_a_hist(symbol=code, period='daily', adjust=adjust,
+                                          start_date=start[:10].replace('-', ''),
+                                          end_date=last.strftime("%Y%m%d"))
+        else:
+            exchange = ak.stock_zh_a_hist_min_em(symbol=code, period=target, adjust=adjust,
+                                                 start_date=start, end_date=last.strftime("%Y-%m-%d %H:%M:%S"))
+        report = compare_bars(resample(source, target), exchange)
+        print(f"\n=== {target}: 交易所 {len(exchange)} 根，不一致 {len(report)} 项 ===")
+        if not report.empty:
+            print(report.head(20).to_string())
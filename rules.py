@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+# rules.py
+"""筛选规则DSL：条件写成表达式字符串，编译为对 代码 × K线 面板的NumPy运算，全市场一次求值
+
+表达式语法（Python表达式的子集）：
+  - 字段名（如 close、wr1）表示当前K线的值；close[-6] 表示往前数第6根（-1 即当前）
+  - close[-3:]、hist[-6:-2] 表示窗口，可用 all/any/mean/count/min/max 归约
+  - 运算：+ - * /、比较（可连写，如 a <= x <= b）、and/or/not、abs()
+  - bars 为各代码的有效K线数；其余大写名称为规则集参数（如 WR1_MAX）
+"""
+import ast
+import operator
+import warnings
+
+import numpy as np
+
+from indicators import macd_2d, rolling_max_2d, rolling_min_2d, willr_2d
+
+
+class RuleError(ValueError):
+    """规则表达式不合法"""
+
+
+_BINOPS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+_COMPARES = {
+    ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt,
+    ast.GtE: operator.ge, ast.Eq: operator.eq, ast.NotEq: operator.ne,
+}
+# 窗口归约：(元素变换, 两两合并)，沿窗口逐个元素累计，任何时候只占一个 (代码数, 位置数) 数组
+# 口径同 np.all/any/count_nonzero/mean/min/max（NaN 视为真值/非零，参与均值与极值时结果为NaN）
+_REDUCERS = {
+    'all': (lambda x: np.asarray(x, dtype=bool), np.logical_and),
+    'any': (lambda x: np.asarray(x, dtype=bool), np.logical_or),
+    'count': (lambda x: np.not_equal(x, 0).astype(int), operator.add),
+    'mean': (lambda x: np.asarray(x, dtype=float), operator.add),
+    'min': (lambda x: np.asarray(x, dtype=float), np.minimum),
+    'max': (lambda x: np.asarray(x, dtype=float), np.maximum),
+}
+
+
+class _Context:
+    """求值上下文：fields 为 {字段: (代码数, K线数) 数组}，at 为要求值的K线位置"""
+
+    def __init__(self, fields, lengths, at):
+        self.fields = fields
+        self.lengths = lengths
+        self.at = at
+        self.width = next(iter(fields.values())).shape[1] if fields else 0
+        self._cache = {}
+
+    def value(self, name, offset):
+        """字段在 at + offset 处的值，越界为NaN"""
+        data = self.fields[name]
+        pos = self.at + offset
+        out = data[:, np.clip(pos, 0, None)].astype(float)
+        out[:, pos < 0] = np.nan
+        return out
+
+    def _prefix(self, name):
+        """字段的前缀和与前缀NaN计数（首列补0，第 j 列为前 j 根之和）"""
+        key = ('prefix', name)
+        if key not in self._cache:
+            data = self.fields[name].astype(float)
+            nans = np.isnan(data)
+            zero = np.zeros((len(data), 1))
+            self._cache[key] = (np.hstack([zero, np.cumsum(np.where(nans, 0.0, data), axis=1)]),
+                                np.hstack([zero, np.cumsum(nans, axis=1)]))
+        return self._cache[key]
+
+    def field_mean(self, name, start, stop):
+        """字段在 [at + start, at + stop) 上的均值（前缀和相减），窗口内有NaN或越界为NaN"""
+        csum, nans = self._prefix(name)
+        lo, hi = self.at + start, self.at + stop
+        lo_c, hi_c = np.clip(lo, 0, None), np.clip(hi, 0, None)
+        out = (csum[:, hi_c] - csum[:, lo_c]) / (stop - start)
+        out[nans[:, hi_c] > nans[:, lo_c]] = np.nan
+        out[:, lo < 0] = np.nan
+        return out
+
+    def field_extreme(self, name, start, stop, func):
+        """字段在 [at + start, at + stop) 上的最大/最小值（滑动窗口，与窗口长度无关）"""
+        key = ('extreme', name, stop - start, func)
+        if key not in self._cache:
+            rolling = rolling_max_2d if func is np.maximum else rolling_min_2d
+            self._cache[key] = rolling(self.fields[name], stop - start)
+        pos = self.at + stop - 1
+        out = self._cache[key][:, np.clip(pos, 0, None)]
+        out[:, pos < 0] = np.nan
+        return out
+
+    def bars(self):
+        """各位置的有效K线数（面板右对齐，左侧为补齐的NaN）"""
+        return self.lengths[:, None] - (self.width - 1 - self.at)[None, :]
+
+
+class _Window:
+    """窗口节点：不展开成 (代码数, 位置数, 窗口长度) 数组，prepare(ctx) 返回按序号取窗口元素的函数
+
+    field 为 (字段, 起始偏移, 结束偏移) 时表示直接取字段的窗口，均值/极值走前缀和/滑动窗口。
+    """
+
+    def __init__(self, size, prepare, field=None):
+        self.size = size
+        self.prepare = prepare
+        self.field = field
+
+
+class _Compiler:
+    """AST → 闭包；单值节点为 fn(ctx)，窗口节点为 _Window"""
+
+    def __init__(self, fields, params):
+        self.fields = fields
+        self.params = params
+
+    def compile(self, source):
+        try:
+            tree = ast.parse(source, mode='eval')
+        except SyntaxError as e:
+            raise RuleError(f"语法错误: {source}") from e
+        fn = self.visit(tree.body)
+        if isinstance(fn, _Window):
+            raise RuleError(f"规则结果必须是单值，窗口需用 all/any 等归约: {source}")
+        return fn
+
+    def visit(self, node):
+        method = getattr(self, f'visit_{type(node).__name__}', None)
+        if method is None:
+            raise RuleError(f"不支持的语法: {ast.dump(node)}")
+        return method(node)
+
+    def visit_Constant(self, node):
+        if not isinstance(node.value, (int, float, bool)):
+            raise RuleError(f"不支持的常量: {node.value!r}")
+        value = node.value
+        return lambda ctx: value
+
+    def visit_Name(self, node):
+        name = node.id
+        if name == 'bars':
+            return lambda ctx: ctx.bars()
+        if name in self.fields:
+            return lambda ctx: ctx.value(name, 0)
+        if name in self.params:
+            value = self.params[name]
+            return lambda ctx: value
+        raise RuleError(f"未知名称: {name}")
+
+    def visit_Subscript(self, node):
+        if not isinstance(node.value, ast.Name) or node.value.id not in self.fields:
+            raise RuleError("只能对字段取下标")
+        name = node.value.id
+        index = node.slice
+        if isinstance(index, ast.Slice):
+            if index.step is not None:
+                raise RuleError("窗口不支持步长")
+            start = self._offset(index.lower)
+            stop = 0 if index.upper is None else self._offset(index.upper)
+            if start >= stop:
+                raise RuleError(f"空窗口: {name}[{start}:{stop}]")
+            start, stop = start + 1, stop + 1
+            return _Window(stop - start, lambda ctx: lambda k: ctx.value(name, start + k), field=(name, start, stop))
+        offset = self._offset(index)
+        return lambda ctx: ctx.value(name, offset + 1)
+
+    def _offset(self, node):
+        """下标只能是负整数常量（相对当前K线）"""
+        value = ast.literal_eval(node) if node is not None else None
+        if not isinstance(value, int) or isinstance(value, bool) or value >= 0:
+            raise RuleError("下标必须是负整数（-1 为当前K线）")
+        return value
+
+    def visit_UnaryOp(self, node):
+        operand = self.visit(node.operand)
+        if isinstance(node.op, ast.Not):
+            return self._map(np.logical_not, operand)
+        if isinstance(node.op, ast.USub):
+            return self._map(operator.neg, operand)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        raise RuleError(f"不支持的运算: {type(node.op).__name__}")
+
+    def visit_BinOp(self, node):
+        op = _BINOPS.get(type(node.op))
+        if op is None:
+            raise RuleError(f"不支持的运算: {type(node.op).__name__}")
+        return self._pair(op, self.visit(node.left), self.visit(node.right))
+
+    def visit_Compare(self, node):
+        # a < b < c  →  (a < b) and (b < c)
+        operands = [self.visit(n) for n in [node.left] + node.comparators]
+        parts = []
+        for op, left, right in zip(node.ops, operands, operands[1:]):
+            func = _COMPARES.get(type(op))
+            if func is None:
+                raise RuleError(f"不支持的比较: {type(op).__name__}")
+            parts.append(self._pair(func, left, right))
+        return self._reduce(np.logical_and, parts)
+
+    def visit_BoolOp(self, node):
+        func = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return self._reduce(func, [self.visit(n) for n in node.values])
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or len(node.args) != 1 or node.keywords:
+            raise RuleError("函数调用形如 any(窗口)")
+        name = node.func.id
+        arg = self.visit(node.args[0])
+        if name == 'abs':
+            return self._map(np.abs, arg)
+        if name not in _REDUCERS:
+            raise RuleError(f"未知函数: {name}")
+        if not isinstance(arg, _Window):
+            raise RuleError(f"{name}() 的参数必须是窗口")
+        if arg.field is not None and name == 'mean':
+            return lambda ctx: ctx.field_mean(*arg.field)
+        if arg.field is not None and name in ('min', 'max'):
+            func = np.minimum if name == 'min' else np.maximum
+            return lambda ctx: ctx.field_extreme(*arg.field, func)
+
+        convert, merge = _REDUCERS[name]
+
+        def reduce(ctx):
+            element = arg.prepare(ctx)
+            acc = convert(element(0))
+            for k in range(1, arg.size):
+                acc = merge(acc, convert(element(k)))
+            return acc / arg.size if name == 'mean' else acc
+        return reduce
+
+    @staticmethod
+    def _map(func, operand):
+        if isinstance(operand, _Window):
+            def prepare(ctx):
+                element = operand.prepare(ctx)
+                return lambda k: func(element(k))
+            return _Window(operand.size, prepare)
+        return lambda ctx: func(operand(ctx))
+
+    @staticmethod
+    def _pair(func, left, right):
+        left_window, right_window = isinstance(left, _Window), isinstance(right, _Window)
+        if not left_window and not right_window:
+            return lambda ctx: func(left(ctx), right(ctx))
+        if left_window and right_window and left.size != right.size:
+            raise RuleError(f"窗口长度不一致: {left.size} 与 {right.size}")
+
+        # 单值与窗口运算时，单值只算一次，与窗口的每个元素运算
+        def prepare(ctx):
+            a = left.prepare(ctx) if left_window else left(ctx)
+            b = right.prepare(ctx) if right_window else right(ctx)
+            if left_window and right_window:
+                return lambda k: func(a(k), b(k))
+            if left_window:
+                return lambda k: func(a(k), b)
+            return lambda k: func(a, b(k))
+        return _Window(left.size if left_window else right.size, prepare)
+
+    @staticmethod
+    def _reduce(func, parts):
+        fn = parts[0]
+        for part in parts[1:]:
+            fn = _Compiler._pair(func, fn, part)
+        return fn
+
+
+class RuleSet:
+    """一组同时满足的筛选条件
+
+    rules 为 [(条件名, 表达式)]，params 为表达式中可引用的参数。
+    evaluate 只在最后一根K线求值（选股）；evaluate_series 在每根K线上求值（回测）。
+    """
+
+    def __init__(self, name, rules, fields, params=None):
+        self.name = name
+        self.fields = tuple(fields)
+        self.params = dict(params or {})
+        self.rules = list(rules)
+        compiler = _Compiler(set(self.fields), self.params)
+        self._compiled = [(label, compiler.compile(expr)) for label, expr in self.rules]
+
+    def __reduce__(self):
+        # 编译结果是闭包，跨进程传递时按定义重新编译
+        return RuleSet, (self.name, self.rules, self.fields, self.params)
+
+    def with_params(self, **params):
+        """覆盖部分参数，返回新的规则集"""
+        return RuleSet(self.name, self.rules, self.fields, {**self.params, **params})
+
+    def _evaluate(self, fields, lengths, at):
+        missing = [f for f in self.fields if f not in fields]
+        if missing:
+            raise RuleError(f"缺少字段: {missing}")
+        ctx = _Context({f: np.asarray(fields[f]) for f in self.fields}, np.asarray(lengths), at)
+        details = {}
+        with warnings.catch_warnings(), np.errstate(divide='ignore', invalid='ignore'):
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            for label, fn in self._compiled:
+                details[label] = np.broadcast_to(fn(ctx), (len(ctx.lengths), len(at))).astype(bool)
+        passed = np.logical_and.reduce(list(details.values())) if details else np.ones((len(ctx.lengths), len(at)), bool)
+        return passed, details
+
+    def evaluate(self, fields, lengths):
+        """最后一根K线上求值，返回 (passed, {条件名: 逐代码结果})，均为一维布尔数组"""
+        width = np.asarray(fields[self.fields[0]]).shape[1]
+        passed, details = self._evaluate(fields, lengths, np.array([width - 1]))
+        return passed[:, 0], {label: values[:, 0] for label, values in details.items()}
+
+    def evaluate_series(self, fields, lengths):
+        """每根K线上求值（只用到该K线及之前的数据），返回 (代码数, K线数) 布尔数组"""
+        width = np.asarray(fields[self.fields[0]]).shape[1]
+        passed, _ = self._evaluate(fields, lengths, np.arange(width))
+        return passed
+
+
+# ---- 内置规则集（与 StockAnalyzer 逐支判定一致）----
+def amount_rules(window=20, min_length=120, ratio=1.8):
+    """成交金额放量（同 panel.amount_ratio_screen：最近 min_length 根内，近 window 根均额对比之前均额）"""
+    return RuleSet(
+        'amount',
+        [
+            ('数据充足', 'bars >= MIN_BARS'),
+            ('放量', f'mean(amount[-{window}:]) >= RATIO * mean(amount[-{min_length}:-{window}])'),
+        ],
+        fields=('amount',),
+        params={'MIN_BARS': min_length, 'RATIO': ratio},
+    )
+
+
+AMOUNT = amount_rules()
+
+QIANGRI = RuleSet(
+    'qiangrizhangfu',
+    [
+        ('数据充足', 'bars >= MIN_BARS'),
+        ('3日阳线', 'all(close[-3:] > open[-3:])'),
+        ('量能增长', 'volume[-1] > volume[-2] or volume[-2] > volume[-3]'),
+        ('六日涨幅', 'PCT6_MIN <= (close[-1] - close[-6]) / close[-6] <= PCT6_MAX'),
+    ],
+    fields=('open', 'close', 'volume'),
+    params={'MIN_BARS': 30, 'PCT6_MIN': -0.05, 'PCT6_MAX': 0.3},
+)
+
+TECHNICAL = RuleSet(
+    'technical',
+    [
+        ('数据充足', 'bars >= MIN_BARS'),
+        ('WR1', 'wr1 < WR1_MAX'),
+        ('WR差值', 'wr1 - wr2 < WR_DIFF_MAX'),
+        ('DIF', 'dif > 0'),
+        ('DEA', 'dea > 0'),
+        ('MACD柱增长', 'hist[-1] > hist[-2] and hist[-2] > hist[-3]'),
+        ('前四根有负值', 'any(hist[-6:-2] < 0)'),
+    ],
+    fields=('wr1', 'wr2', 'dif', 'dea', 'hist'),
+    params={'MIN_BARS': 100, 'WR1_MAX': 60, 'WR_DIFF_MAX': 20},
+)
+
+
+# 各阶段规则用到的参数（名称同 Config 属性）
+STAGE_PARAMS = {
+    'amount': ('AMOUNT_WINDOW', 'MIN_DATA_LENGTH', 'AMOUNT_RATIO'),
+    'qiangrizhangfu': ('QIANGRI_MIN_BARS', 'PCT6_MIN', 'PCT6_MAX'),
+    'technical': ('TECHNICAL_MIN_BARS', 'WR1_MAX', 'WR_DIFF_MAX'),
+}
+
+
+def build_stage_rules(stage, params):
+    """按参数构造单个阶段的规则集，params 为 {参数名: 值}"""
+    if stage == 'amount':
+        return amount_rules(params['AMOUNT_WINDOW'], params['MIN_DATA_LENGTH'], params['AMOUNT_RATIO'])
+    if stage == 'qiangrizhangfu':
+        return QIANGRI.with_params(
+            MIN_BARS=params['QIANGRI_MIN_BARS'], PCT6_MIN=params['PCT6_MIN'], PCT6_MAX=params['PCT6_MAX']
+        )
+    if stage == 'technical':
+        return TECHNICAL.with_params(
+            MIN_BARS=params['TECHNICAL_MIN_BARS'], WR1_MAX=params['WR1_MAX'], WR_DIFF_MAX=params['WR_DIFF_MAX']
+        )
+    raise ValueError(f"未知阶段: {stage}")
+
+
+def build_rule_sets(params):
+    """各阶段规则集 {阶段: RuleSet}"""
+    return {stage: build_stage_rules(stage, params) for stage in STAGE_PARAMS}
+
+
+def technical_fields(high, low, close):
+    """由右对齐的价格面板一次算出 TECHNICAL 所需的指标面板"""
+    dif, dea, hist = macd_2d(close, fast=12, slow=26, signal=9)
+    return {
+        'wr1': willr_2d(high, low, close, 21),
+        'wr2': willr_2d(high, low, close, 42),
+        'dif': dif,
+        'dea': dea,
+        'hist': hist,
+    }
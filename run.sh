@@ -1,22 +1,6 @@
 #!/bin/bash
-while true; do
-  # 任务1：每周日到周四晚8:30执行
-  if { [[ $(date +%u) -eq 7 ]] || [[ $(date +%u) -le 4 ]]; } && [[ $(date +%H:%M) == "20:30" ]]; then
-    echo "===== 任务1开始 $(date) =====" >> /root/stock/cron.log
-    /root/stock/venv/bin/python3 /root/stock/stock-select-vps.py --market-cap --debug >> /root/stock/cron.log 2>&1
-    rm -f /root/stock/process_status.json /root/stock/amount_result.txt
-    /root/stock/venv/bin/python3 /root/stock/stock-select-vps.py --amount --debug >> /root/stock/cron.log 2>&1
-    echo "===== 任务1完成 $(date) =====" >> /root/stock/cron.log
-  fi
-
-  # 任务2：每周一到周五早7:30执行
-  if [[ $(date +%u) -le 5 ]] && [[ $(date +%H:%M) == "07:30" ]]; then
-    echo "===== 任务2开始 $(date) =====" >> /root/stock/cron.log
-    /root/stock/venv/bin/python3 /root/stock/stock-select-vps.py --qiangrizhangfu --debug >> /root/stock/cron.log 2>&1
-    /root/stock/venv/bin/python3 /root/stock/stock-select-vps.py --technical --debug >> /root/stock/cron.log 2>&1
-    /root/stock/venv/bin/python3 /root/stock/stock-select-vps.py --send-report --debug >> /root/stock/cron.log 2>&1
-    echo "===== 任务2完成 $(date) =====" >> /root/stock/cron.log
-  fi
-
-  sleep 60
-done
\ No newline at end of file
+# 单进程常驻流水线：
+#   任务night   每周日到周四晚8:30  市值筛选 → 成交金额筛选
+#   任务morning 每周一到周五早7:30  强势股筛选 → 技术分析 → 发送报告
+# 定时配置见 Config.PIPELINE_JOBS
+exec /root/stock/venv/bin/python3 /root/stock/stock-select-vps.py --daemon --debug >> /root/stock/cron.log 2>&1
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# snapshot.py
+"""全市场快照缓存：stock_zh_a_spot_em 结果连同抓取时间落盘为Parquet，按TTL在阶段与进程间复用"""
+import os
+import threading
+from datetime import datetime, timedelta
+
+FETCHED_AT_KEY = b'fetched_at'
+
+# 行情可能变化的时段（含集合竞价与午休，宁可多刷新）
+MARKET_OPEN = (9, 15)
+MARKET_CLOSE = (15, 0)
+
+
+def in_session(t):
+    """t 是否处于行情可能变化的时段"""
+    if t.weekday() >= 5:
+        return False
+    return MARKET_OPEN <= (t.hour, t.minute) < MARKET_CLOSE
+
+
+def next_open(t):
+    """t 之后最近一次开盘（按工作日估算，不识别节假日）"""
+    open_ = t.replace(hour=MARKET_OPEN[0], minute=MARKET_OPEN[1], second=0, microsecond=0)
+    if t >= open_:
+        open_ += timedelta(days=1)
+    while open_.weekday() >= 5:
+        open_ += timedelta(days=1)
+    return open_
+
+
+class SnapshotCache:
+    """全市场快照TTL缓存
+
+    命中顺序：进程内存 → 磁盘文件 → 重新抓取。
+    快照在 max_age 秒内有效；收盘后抓取的快照在下一次开盘前一直有效（行情不会再变）。
+    """
+
+    def __init__(self, path, fetch, ttl):
+        self.path = path
+        self.fetch = fetch  # 无参函数，返回全市场快照DataFrame
+        self.ttl = ttl
+        self._df = None
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def fetched_at(self):
+        return self._fetched_at
+
+    def get(self, max_age=None):
+        """取快照，超过 max_age 秒（默认 ttl）则重新抓取"""
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            if self._df is not None and self._is_valid(self._fetched_at, max_age):
+                return self._df
+
+            df, fetched_at = self._read()
+            if df is None or not self._is_valid(fetched_at, max_age):
+                df, fetched_at = self.fetch(), datetime.now()
+                self._write(df, fetched_at)
+
+            self._df, self._fetched_at = df, fetched_at
+            return df
+
+    @staticmethod
+    def _is_valid(fetched_at, max_age, now=None):
+        now = now or datetime.now()
+        if (now - fetched_at).total_seconds() <= max_age:
+            return True
+        return not in_session(fetched_at) and now < next_open(fetched_at)
+
+    def _read(self):
+        import pyarrow.parquet as pq
+
+        if not os.path.exists(self.path):
+            return None, None
+        try:
+            table = pq.read_table(self.path)
+            fetched_at = datetime.fromisoformat((table.schema.metadata or {})[FETCHED_AT_KEY].decode())
+            return table.to_pandas(), fetched_at
+        except Exception:
+            return None, None  # 文件损坏或格式不符，当作未缓存
+
+    def _write(self, df, fetched_at):
+        """原子写入，抓取时间存入Parquet元数据"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[FETCHED_AT_KEY] = fetched_at.isoformat().encode()
+        tmp_path = self.path + '.tmp'
+        pq.write_table(table.replace_schema_metadata(metadata), tmp_path, compression='zstd')
+        os.replace(tmp_path, self.path)
@@ -1,22 +1,46 @@
 # -*- coding: utf-8 -*-
 # stock_analysis_vps.py
+import time
+_T_START = time.perf_counter()
+
 import os
 import sys
-import json
 import argparse
-import akshare as ak
-import pandas as pd
-import time
-import numpy as np
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import requests
-#import talib
-import pandas_ta as ta
 
+from lazyimport import LazyModule, PROFILE
+PROFILE.mark("导入标准库", since=_T_START)
+
+import numpy as np
+PROFILE.mark("导入 numpy")
+import pandas as pd
+PROFILE.mark("导入 pandas")
+
+#import talib
 from getpass import getpass
-from openai import OpenAI
-from openai import APIConnectionError
-from deepseektest import get_market_analysis
+from barstore import BarStore, last_session_close
+from fetcher import CircuitOpenError, FetchEngine
+from datasource import AsyncDataSource
+from snapshot import SnapshotCache
+from journal import StageJournal, write_atomic
+from pipeline import Pipeline, PipelineJob, STAGES
+from panel import build_panel, amount_ratio_screen
+from indicators import IncrementalIndicators
+from llmcache import LLMCache, stream_to_file
+from memo import FetchMemo
+from prompt import build_prompt, count_tokens
+from metrics import METRICS
+from rules import STAGE_PARAMS, TECHNICAL, build_rule_sets, technical_fields
+PROFILE.mark("导入本地模块")
+
+# 重量级依赖延迟到首次使用时导入（--market-cap/--amount 等不会加载 openai/pandas_ta）
+ak = LazyModule('akshare')
+ta = LazyModule('pandas_ta')
+openai = LazyModule('openai')
+httpx = LazyModule('httpx')  # openai 的传输层，流式读取中途超时直接抛出 httpx 异常
+requests = LazyModule('requests')
 
 # 获取当前文件所在目录
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -29,33 +53,168 @@ class Config:
     TECHNICAL_PATH = os.path.join(BASE_DIR, "technical_result.txt")
     FINAL_RESULT_PATH = os.path.join(BASE_DIR, "final_selected.txt")
 
+    # 本地数据目录（K线仓库等）
+    DATA_DIR = os.path.join(BASE_DIR, "data")
+    BAR_STORE_DIR = os.path.join(DATA_DIR, "bars")
+    RESAMPLE_FROM = None  # 如 '5'：60分钟线与日线由5分钟线本地合成（每支只下载一次）
+    JOURNAL_DIR = os.path.join(DATA_DIR, "journal")
+    INDICATOR_STATE_DIR = os.path.join(DATA_DIR, "indicators", "60_hfq")
+    INCREMENTAL_INDICATORS = True  # 技术分析使用增量MACD/WR状态（False则每次整段重算）
+    SPOT_CACHE_PATH = os.path.join(DATA_DIR, "spot_snapshot.parquet")
+    SPOT_CACHE_TTL = 600  # 全市场快照复用时长（秒），收盘后的快照在下次开盘前一直有效
+    SPOT_REALTIME_MAX_AGE = 60  # 实时行情允许的快照最大年龄（秒）
+    MEMO_MAX_ROWS = 500_000  # 进程内K线记忆层最多保留的行数
+    MARKET_ANALYSIS_TTL = 1800  # 热门概念分析复用时长（秒）
+    KEYWORD_CACHE_PATH = os.path.join(DATA_DIR, "hot_keywords.parquet")
+    KEYWORD_CACHE_TTL = 86400  # 个股概念关键词复用时长（秒），只刷新新上榜或过期的股票
+    LLM_CACHE_DIR = os.path.join(DATA_DIR, "llm_cache")  # 相同提示词当天复用DeepSeek分析结果
+
     # 从环境变量读取敏感信息
     PUSHPLUS_TOKEN = os.getenv("PUSHPLUS_TOKEN", "d1c91dc828e1430d92af54e58ca8c443")
     DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", "sk-8a83960eb1df4bb08e48ba4e74a4a5be")
     DEEPSEEK_BASE_URL = "https://api.deepseek.com/v1"
-
-    REQUEST_INTERVAL = 1.0
+    DEEPSEEK_MODEL = "deepseek-chat"
+    DEEPSEEK_TEMPERATURE = 0.2
+    LLM_PROMPT_BUDGET = 3000  # 用户消息的 token 预算（估算），超时重试时降到上次的 0.7
+    DEEPSEEK_STREAM = True  # 流式生成：边收边写报告文件，超时只限制相邻两块之间的等待
+    # 分批请求不走流式：整体超时才能限住每批耗时。代价是超过 LLM_BATCH_SIZE 支时 DEEPSEEK_STREAM 不生效，
+    # 长报告分批后每批较短，需要边收边写时可把 LLM_BATCH_SIZE 设为 0
+    LLM_BATCH_SIZE = 5  # 个股超过此数时分批并发分析（每批一个请求，市场画像单独一个），0 为不分批
+    LLM_MAX_PARALLEL = 4  # 分批分析同时在途的请求数
+    LLM_BATCH_TIMEOUT = 90  # 分批分析单个请求的超时（秒，客户端不自动重试，重试次数只由下一项控制）
+    LLM_BATCH_RETRIES = 1  # 分批请求超时后的重试次数（每次按 0.7 压缩该批提示词）
+
+    REQUEST_INTERVAL = 1.0  # 旧版固定间隔，已由下方限速配置取代
+
+    # 抓取引擎：接口名 -> (每秒请求数, 突发容量)
+    RATE_LIMITS = {
+        'stock_zh_a_hist_min_em': (2.0, 4),
+        'stock_zh_a_hist': (2.0, 4),
+        'stock_zh_a_spot_em': (0.5, 2),
+        'stock_bid_ask_em': (3.0, 5),
+        'stock_individual_info_em': (3.0, 5),
+        'stock_individual_fund_flow': (3.0, 5),
+        'stock_hot_keyword_em': (1.2, 3),
+    }
+    DEFAULT_RATE_LIMIT = (1.0, 2)
+    GLOBAL_RATE_LIMIT = (5.0, 8)  # 所有接口合计，保持在东财封禁阈值以下
+    FETCH_WORKERS = 8
+    FETCH_RETRIES = 2  # 上游故障（网络错误/超时/被封页面）的重试次数，指数退避
+    FETCH_RETRY_WAIT = 1.0
+    ADAPTIVE_CONCURRENCY = (4, 1, FETCH_WORKERS)  # 每个接口在途请求数：(初始, 最小, 最大)，AIMD 调整
+    CIRCUIT_BREAKER = (5, 60.0)  # 最近20次调用中失败次数（且过半）, 熔断秒数
+
+    # 异步数据源：接口名 -> 最大在途请求数 / 单次超时（秒）
+    SOURCE_CONCURRENCY = {
+        'stock_individual_fund_flow': 5,
+        'stock_hot_keyword_em': 3,
+    }
+    SOURCE_TIMEOUTS = {
+        'stock_individual_fund_flow': 8.0,
+        'stock_hot_keyword_em': 10.0,
+    }
     MIN_DATA_LENGTH = 120
     WINDOW_RATIO = 0.2
     AMOUNT_RATIO = 1.8
+    AMOUNT_WINDOW = 20  # 近期均额窗口（60分钟K线根数）
+
+    # 强势/技术筛选条件（逐支判定与 rules.py 面板规则共用）
+    QIANGRI_MIN_BARS = 30
+    PCT6_MIN = -0.05  # 六日涨幅下限
+    PCT6_MAX = 0.3  # 六日涨幅上限
+    TECHNICAL_MIN_BARS = 100
+    WR1_MAX = 60
+    WR_DIFF_MAX = 20
+
+    # 历史回测（只读本地K线仓库）
+    BACKTEST_DIR = os.path.join(DATA_DIR, "backtest")
+    BACKTEST_HORIZONS = (1, 5, 10, 20)  # 入选后持有天数
+    BACKTEST_WORKERS = None  # 进程数，None 为CPU核数
+
+    # 参数扫描：参数名 -> 候选值（未列出的参数取上方当前值）
+    SWEEP_GRID = {
+        'AMOUNT_RATIO': [1.5, 1.8, 2.1],
+        'AMOUNT_WINDOW': [10, 20, 30],
+        'WR1_MAX': [50, 60, 70],
+        'WR_DIFF_MAX': [10, 20, 30],
+        'PCT6_MIN': [-0.05, 0.0],
+        'PCT6_MAX': [0.2, 0.3],
+    }
+    SWEEP_PATH = os.path.join(DATA_DIR, "backtest", "sweep.csv")
+
+    # 外部调用录制/回放（--record/--replay）：录制的接口与回放延迟
+    CASSETTE_REQUESTS_CALLS = {'post'}  # PushPlus 推送
+    CASSETTE_OPENAI_CALLS = {'chat.completions.create'}  # DeepSeek
+    CASSETTE_OPENAI_FACTORIES = {'OpenAI', 'with_options'}  # 创建客户端（含分批分析用的不重试副本）
+
+    # 运行指标（每次运行结束写出 metrics.prom / metrics.json）
+    METRICS_DIR = os.path.join(DATA_DIR, "metrics")
     DEBUG_MODE = False  # 生产环境关闭调试模式
 
+    # 常驻流水线定时任务（weekdays 为 isoweekday：1=周一 … 7=周日）
+    PIPELINE_JOBS = [
+        {'name': 'night', 'stages': ['market_cap', 'amount'], 'weekdays': [7, 1, 2, 3, 4], 'at': '20:30'},
+        {'name': 'morning', 'stages': ['qiangrizhangfu', 'technical', 'send_report'], 'weekdays': [1, 2, 3, 4, 5], 'at': '07:30'},
+    ]
+
 
 class StockAnalyzer:
     def __init__(self):
         self.today = datetime.now()
         self.start_date = self._calculate_start_date()
-        self.quotation = ak.stock_zh_a_spot_em
-        self.deepseek_client = OpenAI(
-            api_key=Config.DEEPSEEK_API_KEY,
-            base_url=Config.DEEPSEEK_BASE_URL,
-            timeout=30.0
+        self.engine = FetchEngine(
+            rate_limits=Config.RATE_LIMITS,
+            default_limit=Config.DEFAULT_RATE_LIMIT,
+            global_limit=Config.GLOBAL_RATE_LIMIT,
+            max_workers=Config.FETCH_WORKERS,
+            metrics=METRICS,
+            retries=Config.FETCH_RETRIES,
+            retry_wait=Config.FETCH_RETRY_WAIT,
+            concurrency=Config.ADAPTIVE_CONCURRENCY,
+            breaker=Config.CIRCUIT_BREAKER,
+        )
+        self.memo = FetchMemo(call=self.engine.call, max_rows=Config.MEMO_MAX_ROWS)
+        self.bar_store = BarStore(Config.BAR_STORE_DIR, ak, call=self.memo.call, resample_from=Config.RESAMPLE_FROM)
+        self.indicators = IncrementalIndicators(Config.INDICATOR_STATE_DIR)
+        self.spot_cache = SnapshotCache(
+            Config.SPOT_CACHE_PATH,
+            fetch=lambda: self.engine.call('stock_zh_a_spot_em', ak.stock_zh_a_spot_em),
+            ttl=Config.SPOT_CACHE_TTL,
+        )
+        self.source = AsyncDataSource(
+            ak,
+            engine=self.engine,
+            concurrency=Config.SOURCE_CONCURRENCY,
+            timeouts=Config.SOURCE_TIMEOUTS,
+            metrics=METRICS,
         )
+        self._deepseek_client = None
+        self.llm_cache = LLMCache(Config.LLM_CACHE_DIR)
+
+    @property
+    def deepseek_client(self):
+        """DeepSeek客户端（首次使用时创建，非LLM阶段不导入openai）"""
+        if self._deepseek_client is None:
+            self._deepseek_client = openai.OpenAI(
+                api_key=Config.DEEPSEEK_API_KEY,
+                base_url=Config.DEEPSEEK_BASE_URL,
+                timeout=30.0
+            )
+        return self._deepseek_client
 
     def getsc(self):
-        result = get_market_analysis(
-            stock_count=100,  # 只处理前50支热门股
-            top_concepts=8  # 展示前5个概念
+        from deepseektest import KeywordCache, get_market_analysis
+
+        result = self.memo.cached(
+            ('market_analysis', 100, 8),
+            lambda: get_market_analysis(
+                stock_count=100,  # 只处理前50支热门股
+                top_concepts=8,  # 展示前5个概念
+                source=self.source,
+                cache=KeywordCache(Config.KEYWORD_CACHE_PATH, Config.KEYWORD_CACHE_TTL),
+            ),
+            max_age=Config.MARKET_ANALYSIS_TTL,
+            cache_if=bool,  # 获取失败返回的空结果不缓存，下次重新获取
         )
         # 处理结果
         if result:
@@ -65,10 +224,15 @@ class StockAnalyzer:
 
             print("\n=== 概念龙头股TOP8 ===")
             print(result['龙头个股'].head(8))
+
+            print("\n=== 概念共现TOP8 ===")
+            print(result['概念共现'].head(8))
         else:
             print("未获取到有效数据")
+            return pd.DataFrame(), pd.DataFrame()
         return(result['概念热度'].head(8),result['龙头个股'].head(8))
 
+    @METRICS.timed_stage('deepseek')
     def deepseek_analysis(self, stocks_data):
         """深度分析（市场画像与个股分析独立）"""
         print("\n=== DeepSeek金融分析 ===")
@@ -91,39 +255,25 @@ class StockAnalyzer:
 
         # 获取股票代码（带容错处理）
         stock_codes = [str(s.get('code', '')).split('.')[0] for s in stocks_data if s.get('code')]  # 统一格式处理
-        stock_codes = list(set([c for c in stock_codes if c.isdigit() and len(c) == 6]))  # 去重并验证有效性
+        stock_codes = sorted(set([c for c in stock_codes if c.isdigit() and len(c) == 6]))  # 去重并验证有效性（排序保证提示词稳定）
 
         # 获取实时数据（带股票代码过滤）
         def fetch_realtime_data(codes):
-            """多线程获取实时数据"""
-            from concurrent.futures import ThreadPoolExecutor, as_completed
-
-            def fetch_single(code):
-                """带超时和重试的单个股票获取"""
-                max_retries = 2
-                for attempt in range(max_retries):
-                    try:
-                        market = "sh" if code.startswith('6') else "sz"
-                        # 优化点2：设置单个请求超时（8秒）
-                        flow_data = ak.stock_individual_fund_flow(
-                            stock=code, market=market
-                        ).tail(5)
-                        flow_data['股票代码'] = f"{code}.{market.upper()}"
-                        return flow_data
-                    except Exception as e:
-                        if attempt == max_retries - 1:
-                            print(f"股票{code}资金流获取失败: {str(e)}")
-                            return None
-                        time.sleep(1)  # 重试前等待
-
-            # 多线程执行
+            """异步并发获取资金流（并发数、单次超时与重试由数据源统一控制）"""
+
+            async def fetch_single(code):
+                market = "sh" if code.startswith('6') else "sz"
+                flow_data = (await self.source.fund_flow(code, market)).tail(5).copy()
+                flow_data['股票代码'] = f"{code}.{market.upper()}"
+                return flow_data
+
             money_flow_dfs = []
-            with ThreadPoolExecutor(max_workers=5) as executor:  # 控制并发数
-                futures = {executor.submit(fetch_single, code): code for code in codes}
-                for future in as_completed(futures, timeout=15):  # 总超时15秒
-                    result = future.result()
-                    if result is not None:
-                        money_flow_dfs.append(result)
+            outcomes = asyncio.run(self.source.gather(fetch_single, codes))
+            for code, result in zip(codes, outcomes):
+                if isinstance(result, Exception):
+                    print(f"股票{code}资金流获取失败: {str(result) or type(result).__name__}")
+                else:
+                    money_flow_dfs.append(result)
 
             # 合并数据（优化点3：限制数据量）
             money_flow = pd.concat(money_flow_dfs)[['股票代码', '日期', '主力净流入-净额', '超大单净流入-净额', '大单净流入-净额', '中单净流入-净额', '小单净流入-净额']] \
@@ -134,35 +284,23 @@ class StockAnalyzer:
 
         realtime_data = fetch_realtime_data(stock_codes)
 
-        # 结构化用户消息内容
-        flow_str = ""
-        if not realtime_data['money_flow'].empty:
-            # 按股票代码分组展示
-            grouped_flow = realtime_data['money_flow'].groupby('股票代码')
-
-            flow_str = "\n## 个股资金流向\n"
-            for stock_code, group in grouped_flow:
-                flow_str += f"### {stock_code}\n"
-                flow_str += group.to_markdown(index=False) + "\n\n"
-
-        user_content = f"""
-        {market_report}
-
-        === 个股分析数据 ===
-        目标股票代码：{', '.join(stock_codes) or '无有效代码'}
-
-        {flow_str}
-        """
+        # 结构化用户消息内容：资金流与概念表压缩为特征行，按 token 预算取舍（不整支丢弃）
+        flow_codes = [f"{code}.{'SH' if code.startswith('6') else 'SZ'}" for code in stock_codes]
 
-        # 重构后的系统提示词
-        system_prompt = """作为A股中短线实战派专家，请按以下结构生成可操作性分析报告：
+        def compose(budget):
+            text, tokens, plan = build_prompt(flow_codes, realtime_data['money_flow'], concept_table, leader_table, budget)
+            print(f"🧾 提示词约 {tokens} tokens（预算 {budget}，取舍方案 {plan}）")
+            return text
 
-        # 市场画像分析（独立）
+        # 重构后的系统提示词（分批分析时市场画像与个股分开请求，各取对应段落）
+        prompt_intro = "作为A股中短线实战派专家，请按以下结构生成可操作性分析报告：\n\n"
+        market_section = """        # 市场画像分析（独立）
         1. 概念热度解读：分析资金聚集的持续性，识别伪热点
         2. 龙头股特征：行业分布/流通市值/技术形态共性
         3. 预警信号：过热概念或异常龙头股
 
-        # 个股分析（独立）
+"""
+        stock_section = """        # 个股分析（独立）
         1. 资金验证：结合近5日数据，分析主力流向的持续性（重点观察：单日净流入超1亿/连续3日流入/占比突变超5%等关键信号）
         2. 热点关联度：
            - 显性关联：当前所属概念在市场热度TOP3中的匹配度
@@ -174,10 +312,21 @@ class StockAnalyzer:
            - 筹码异动：股东户数变化率超±15%需特别警示
            - 短期策略：根据上述风险给出具体建议（例：跌破10.5元建议止损）
 
-        <格式规范>
+"""
+        format_rules = """        <格式规范>
         1. 每个风险点必须包含量化指标和阈值判断
         2. 使用【关键信号】、【警戒线】等明确标记决策点
         3. 禁用模糊表述，如"关注"、"注意"等，改为具体建议"""
+        system_prompt = prompt_intro + market_section + stock_section + format_rules
+
+        if Config.LLM_BATCH_SIZE and len(flow_codes) > Config.LLM_BATCH_SIZE:
+            return self._fan_out_analysis(
+                stocks_data, flow_codes, realtime_data['money_flow'], concept_table, leader_table,
+                market_prompt=prompt_intro + market_section + format_rules,
+                stock_prompt=prompt_intro + stock_section + format_rules)
+
+        prompt_budget = Config.LLM_PROMPT_BUDGET
+        user_content = compose(prompt_budget)
 
         try:
             print("🔍 正在生成深度报告...")
@@ -194,6 +343,16 @@ class StockAnalyzer:
             # 动态内容压缩（新增调试日志）
             compressed_content = user_content
 
+            # 相同提示词当天已分析过则直接复用
+            cache_key = self.llm_cache.key(Config.DEEPSEEK_MODEL, system_prompt, user_content, Config.DEEPSEEK_TEMPERATURE)
+            cached = self.llm_cache.get(cache_key)
+            if cached is not None:
+                print(f"♻️ 命中当日分析缓存（{cache_key[:12]}），跳过请求")
+                return cached
+
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"DeepSeek_Analysis_{timestamp}.md"
+
             # 自适应超时重试循环
             analysis = None
             for attempt in range(max_retries + 1):
@@ -204,36 +363,40 @@ class StockAnalyzer:
 
                     # API请求（新增请求时间戳记录）
                     start_time = time.time()
-                    response = self.deepseek_client.chat.completions.create(
-                        model="deepseek-chat",
+                    request = dict(
+                        model=Config.DEEPSEEK_MODEL,
                         messages=[
                             {"role": "system", "content": system_prompt},
                             {"role": "user", "content": compressed_content}
                         ],
-                        temperature=0.2,
+                        temperature=Config.DEEPSEEK_TEMPERATURE,
                         max_tokens=8000,
-                        stream=False,
                         timeout=current_timeout
                     )
+                    header = self._report_header(timestamp, compressed_content)
+                    if Config.DEEPSEEK_STREAM:
+                        # 流式：逐块写入报告文件，长文本不再因整体超时而重试/截断
+                        chunks = self.deepseek_client.chat.completions.create(stream=True, **request)
+                        analysis = stream_to_file(chunks, filename, header)
+                    else:
+                        response = self.deepseek_client.chat.completions.create(stream=False, **request)
+                        analysis = response.choices[0].message.content if response and response.choices else None
+                        if analysis:
+                            # 强制保存报告（新增校验）
+                            try:
+                                with open(filename, 'w', encoding='utf-8') as f:
+                                    f.write(header + analysis)
+                            except Exception as save_error:
+                                print(f"⚠️ 文件保存失败：{str(save_error)}")
                     elapsed_time = time.time() - start_time
+                    METRICS.observe_call('deepseek', elapsed_time)
                     print(f"✅ 请求成功 | 耗时：{elapsed_time:.1f}s")
 
                     # 处理响应（新增空值校验）
-                    if response and response.choices:
-                        analysis = response.choices[0].message.content
-
-                        # 强制保存报告（新增校验）
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        filename = f"DeepSeek_Analysis_{timestamp}.md"
-                        try:
-                            with open(filename, 'w', encoding='utf-8') as f:
-                                f.write(f"# DeepSeek分析报告\n\n")
-                                f.write(f"**生成时间：** {timestamp}\n\n")
-                                f.write(f"## 输入参数\n{compressed_content[:1000]}...\n\n")
-                                f.write(f"## 分析结果\n{analysis}")
+                    if analysis:
+                        self.llm_cache.put(cache_key, analysis, model=Config.DEEPSEEK_MODEL)
+                        if os.path.exists(filename):
                             print(f"📄 报告已保存至：{os.path.abspath(filename)}")
-                        except Exception as save_error:
-                            print(f"⚠️ 文件保存失败：{str(save_error)}")
 
                         # 控制台预览（新增关键指标提取）
                         print("\n=== 分析结果预览 ===")
@@ -245,23 +408,32 @@ class StockAnalyzer:
                         print("⚠️ 收到空响应")
                         analysis = "未获取到有效分析结果"
 
-                except APITimeoutError as e:
-                    print(f"⏰ 请求超时：{str(e)}")
+                except (openai.APITimeoutError, httpx.TimeoutException) as e:
+                    # 流式响应读到一半超时不会被 openai 包装，抛出的是 httpx.ReadTimeout
+                    print(f"⏰ 请求超时：{str(e) or type(e).__name__}")
+                    METRICS.observe_call('deepseek', time.time() - start_time, failed=True)
                     if attempt < max_retries:
+                        METRICS.count_retry('deepseek', timeout=True)
                         wait_time = min(backoff_config['initial'] * (backoff_config['factor'] ** attempt),
                                         backoff_config['max_wait'])
                         print(f"⌛ 第{attempt + 1}次重试等待：{wait_time:.1f}s")
                         time.sleep(wait_time)
-                        # 动态压缩内容（新增压缩比例提示）
-                        new_length = int(len(compressed_content) * 0.7)
-                        print(f"📉 内容长度从 {len(compressed_content)} 压缩至 {new_length}")
-                        compressed_content = compressed_content[:new_length]
+                        # 降低 token 预算重新压缩（先舍弃明细，保留全部股票）
+                        prompt_budget = int(min(prompt_budget, count_tokens(compressed_content)) * 0.7)
+                        new_content = compose(prompt_budget)
+                        print(f"📉 内容长度从 {len(compressed_content)} 压缩至 {len(new_content)}")
+                        compressed_content = new_content
                     else:
                         print("⚠️ 达到最大重试次数，启用降级模式")
                         analysis = self.quick_analysis(stocks_data)
+                        if os.path.exists(filename):
+                            # 流式中途超时留下的是半份报告，改写为降级结果
+                            with open(filename, 'w', encoding='utf-8') as f:
+                                f.write(header + analysis)
 
                 except Exception as e:
                     print(f"‼️ 非超时异常：{str(e)}")
+                    METRICS.observe_call('deepseek', time.time() - start_time, failed=True)
                     if Config.DEBUG_MODE:
                         import traceback
                         traceback.print_exc()
@@ -276,80 +448,237 @@ class StockAnalyzer:
             return f"系统错误：{str(outer_e)}"
 
 
+    def _fan_out_analysis(self, stocks_data, flow_codes, money_flow, concept_table, leader_table,
+                          market_prompt, stock_prompt):
+        """分批并发分析：市场画像一个请求、每 LLM_BATCH_SIZE 支个股一个请求，按原顺序合并成一份报告
+
+        并发数受 LLM_MAX_PARALLEL 限制，总耗时约为最慢一批而不随股票数线性增长；
+        每个请求单独超时/重试/缓存，某一批失败只把该批替换为简要行情，其余部分照常输出。
+        """
+        size = Config.LLM_BATCH_SIZE
+        # 关闭客户端自带的重试（默认2次），否则单次请求最长可达 3×LLM_BATCH_TIMEOUT
+        client = self.deepseek_client.with_options(max_retries=0)
+        batches = [flow_codes[i:i + size] for i in range(0, len(flow_codes), size)]
+        print(f"🔀 分批分析：市场画像 + {len(batches)} 批个股（每批≤{size}支，并发{Config.LLM_MAX_PARALLEL}）")
+
+        def request(label, system_prompt, codes):
+            """单个请求：当日缓存 → 非流式调用（整体超时） → 超时压缩重试"""
+            budget = Config.LLM_PROMPT_BUDGET
+            content = build_prompt(codes, money_flow, concept_table, leader_table, budget)[0]
+            cache_key = self.llm_cache.key(Config.DEEPSEEK_MODEL, system_prompt, content, Config.DEEPSEEK_TEMPERATURE)
+            cached = self.llm_cache.get(cache_key)
+            if cached is not None:
+                print(f"♻️ {label} 命中当日分析缓存")
+                return cached
+            for attempt in range(Config.LLM_BATCH_RETRIES + 1):
+                start_time = time.time()
+                try:
+                    response = client.chat.completions.create(
+                        model=Config.DEEPSEEK_MODEL,
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": content}
+                        ],
+                        temperature=Config.DEEPSEEK_TEMPERATURE,
+                        max_tokens=8000,
+                        timeout=Config.LLM_BATCH_TIMEOUT,
+                        stream=False
+                    )
+                except openai.APITimeoutError:
+                    METRICS.observe_call('deepseek', time.time() - start_time, failed=True)
+                    if attempt == Config.LLM_BATCH_RETRIES:
+                        raise
+                    METRICS.count_retry('deepseek', timeout=True)
+                    budget = int(min(budget, count_tokens(content)) * 0.7)
+                    content = build_prompt(codes, money_flow, concept_table, leader_table, budget)[0]
+                    print(f"⏰ {label} 超时，压缩至约 {count_tokens(content)} tokens 重试")
+                    continue
+                except Exception:
+                    METRICS.observe_call('deepseek', time.time() - start_time, failed=True)
+                    raise
+                elapsed_time = time.time() - start_time
+                METRICS.observe_call('deepseek', elapsed_time)
+                analysis = response.choices[0].message.content if response and response.choices else None
+                if not analysis:
+                    raise ValueError("收到空响应")
+                print(f"✅ {label} 完成 | 耗时：{elapsed_time:.1f}s")
+                self.llm_cache.put(cache_key, analysis, model=Config.DEEPSEEK_MODEL)
+                return analysis
+
+        with ThreadPoolExecutor(max_workers=Config.LLM_MAX_PARALLEL) as pool:
+            market_future = pool.submit(request, "市场画像", market_prompt, None)
+            batch_futures = [pool.submit(request, f"第{i}批", stock_prompt, codes)
+                             for i, codes in enumerate(batches, 1)]
+
+        try:
+            sections = [market_future.result()]
+        except Exception as e:
+            print(f"‼️ 市场画像分析失败：{str(e) or type(e).__name__}")
+            sections = [f"## 市场画像\n⚠️ 分析失败（{str(e) or type(e).__name__}）"]
+
+        by_code = {str(s.get('code', '')).split('.')[0]: s for s in stocks_data}
+        failed = 0
+        for i, (codes, future) in enumerate(zip(batches, batch_futures), 1):
+            try:
+                sections.append(future.result())
+            except Exception as e:
+                failed += 1
+                reason = str(e) or type(e).__name__
+                print(f"‼️ 第{i}批（{', '.join(codes)}）分析失败：{reason}")
+                quotes = [by_code.get(code.split('.')[0], {'code': code}) for code in codes]
+                sections.append(f"⚠️ 第{i}批分析失败（{reason}）\n\n" + self.quick_analysis(quotes))
+
+        analysis = "\n\n".join(sections)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"DeepSeek_Analysis_{timestamp}.md"
+        try:
+            with open(filename, 'w', encoding='utf-8') as f:
+                f.write(self._report_header(timestamp, ", ".join(flow_codes)) + analysis)
+            print(f"📄 报告已保存至：{os.path.abspath(filename)}")
+        except Exception as save_error:
+            print(f"⚠️ 文件保存失败：{str(save_error)}")
+        print(f"📊 分批分析完成：{len(batches) - failed}/{len(batches)} 批成功")
+        return analysis
+
+    def quick_analysis(self, stocks_data):
+        """降级模式：DeepSeek 多次超时后，按实时行情生成不经AI的简要列表"""
+        lines = ["## 简要行情（降级模式，未经AI分析）"]
+        for stock in stocks_data:
+            prev_close, now = stock.get('close'), stock.get('now')
+            if not prev_close or now is None or np.isnan(now):
+                lines.append(f"- {stock.get('code')} {stock.get('name', '')}：暂无行情")
+                continue
+            amplitude = (stock['high'] - stock['low']) / prev_close
+            lines.append(f"- {stock.get('code')} {stock.get('name', '')}：现价 {now:.2f}，"
+                         f"涨跌 {now / prev_close - 1:+.2%}，振幅 {amplitude:.2%}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _report_header(timestamp, content):
+        """分析报告文件的表头（结果正文紧随其后）"""
+        return (f"# DeepSeek分析报告\n\n"
+                f"**生成时间：** {timestamp}\n\n"
+                f"## 输入参数\n{content[:1000]}...\n\n"
+                f"## 分析结果\n")
+
     def _calculate_start_date(self):
         """计算历史数据起始日期（原AmountStrategy中的方法）"""
         required_days = int(Config.MIN_DATA_LENGTH / 4 * 1.3)
         return self.today - timedelta(days=required_days)
 
-    def amount_analysis(self):
-        """成交金额分析主入口（整合原main()函数逻辑）"""
-        status_file = "process_status.json"
-        current_date = self.today.strftime("%Y-%m-%d")
+    @METRICS.timed_stage('amount')
+    def amount_analysis(self, codes=None, write_result=True):
+        """成交金额分析主入口（整合原main()函数逻辑）
 
-        # 读取股票列表
-        with open(Config.INITIAL_SCREENING_PATH) as f:
-            all_codes = [line.strip() for line in f if line.strip()]
+        codes 为空时读取市值筛选结果文件；write_result 控制是否写出 amount_result.txt。
+        """
+        current_date = self.today.strftime("%Y-%m-%d")
+        all_codes = codes if codes is not None else self._read_codes(Config.INITIAL_SCREENING_PATH)
 
         # 断点续传处理
-        processed_codes = []
-        if os.path.exists(status_file):
-            with open(status_file, 'r') as f:
-                status = json.load(f)
-                if status['date'] == current_date:
-                    processed_codes = status['processed']
-                    print(f"检测到未完成任务，已处理 {len(processed_codes)} 支，剩余 {len(all_codes) - len(processed_codes)} 支")
-
-        todo_codes = [c for c in all_codes if c not in processed_codes]
-        results = []
-        all_results = []
-        total_passed = 0
+        journal = StageJournal(Config.JOURNAL_DIR, "amount", current_date)
+        todo_codes = journal.pending(all_codes)
+        if journal.done:
+            print(f"检测到未完成任务，已处理 {len(journal.done)} 支，剩余 {len(todo_codes)} 支")
+
         try:
-            for idx, code in enumerate(todo_codes, 1):
-                if self._analyze_single_stock(code):
-                    results.append(code)
-                    total_passed += 1
-                    print(f"✅ 通过: {code}")
+            completed = self.engine.map(self._analyze_single_stock, todo_codes)
+            for idx, (code, passed, error) in enumerate(completed, 1):
+                if isinstance(error, CircuitOpenError):
+                    print(f"⏸️ {code} 跳过 - {str(error)}")  # 熔断期间不记录，续跑时重试
+                elif error is not None:
+                    print(f"❌ 严重错误: {code} 数据获取失败 - {str(error)}")  # 不记录，续跑时重试
                 else:
-                    if Config.DEBUG_MODE:
+                    journal.record(code, passed)
+                    if passed:
+                        print(f"✅ 通过: {code}")
+                    elif Config.DEBUG_MODE:
                         print(f"❌ 未通过: {code}")
-                # 更新进度
-                processed_codes.append(code)
-
-                # 定期保存进度（每50支或结束时）
-                if idx % 50 == 0 or idx == len(todo_codes):
-                    self._save_results(results, Config.RESULT_PATH)
-                    all_results.extend(results)
-                    results.clear()  # 清空当前批次
-                    self._save_progress(status_file, current_date, processed_codes)
-                    print(f"⏲️ 进度: 已处理 {len(processed_codes)} 支 ({idx / len(todo_codes):.1%})")
-
-                time.sleep(Config.REQUEST_INTERVAL)
-
-            # 最终清理
-            if os.path.exists(status_file):
-                os.remove(status_file)
-            print(f"🎉 分析完成! 共筛选出  {total_passed} 支股票")
+
+                # 定期提交结果（每50支）
+                if idx % 50 == 0:
+                    if write_result:
+                        write_atomic(Config.RESULT_PATH, journal.passed(all_codes))
+                    print(f"⏲️ 进度: 已处理 {len(journal.done)} 支 ({idx / len(todo_codes):.1%})")
+
+            results = journal.passed(all_codes)
+            if write_result:
+                write_atomic(Config.RESULT_PATH, results)
+            print(f"🎉 分析完成! 共筛选出  {len(results)} 支股票")
+            return results
         except requests.exceptions.Timeout:
             print("‼️ API请求超时，请检查网络或减少分析范围")
             return "报告生成超时，建议减少股票数量后重试"
         except Exception as e:
             print(f"‼️ 分析异常：{str(e)}")
             return "报告生成失败，请联系技术支持"
+        finally:
+            journal.close()
+
+    @METRICS.timed_stage('amount')
+    def amount_analysis_panel(self, codes=None, write_result=True):
+        """成交金额分析（面板模式：先增量更新本地K线，再对全市场一次性向量化筛选）"""
+        all_codes = codes if codes is not None else self._read_codes(Config.INITIAL_SCREENING_PATH)
+
+        # 并发更新本地60分钟线并收集成交额序列
+        def load_amounts(code):
+            df = self.bar_store.hist_min(code.split('.')[0], period="60", adjust="hfq")
+            return df['成交额'].values if not df.empty else []
+
+        amounts_by_code = {}
+        for idx, (code, amounts, error) in enumerate(self.engine.map(load_amounts, all_codes), 1):
+            if error is not None:
+                print(f"❌ 严重错误: {code} 数据获取失败 - {str(error)}")
+            amounts_by_code[code] = amounts if error is None else []
+            if idx % 100 == 0:
+                print(f"⏲️ 数据更新: {idx}/{len(all_codes)} ({idx / len(all_codes):.0%})")
+        series_list = [amounts_by_code[code] for code in all_codes]
+
+        # 向量化筛选（与 _amount_passed 逐支判定等价）
+        start_time = time.time()
+        with METRICS.cpu('screen'):
+            panel, lengths = build_panel(series_list, Config.MIN_DATA_LENGTH)
+            passed, historical_mean, recent_mean = amount_ratio_screen(
+                panel, lengths, Config.AMOUNT_WINDOW, Config.AMOUNT_RATIO, Config.MIN_DATA_LENGTH
+            )
+        results = [code for code, ok in zip(all_codes, passed) if ok]
+        print(f"🧮 面板筛选 {len(all_codes)} 支，用时 {(time.time() - start_time) * 1000:.1f}ms")
+
+        if Config.DEBUG_MODE:
+            for code, hist, recent in zip(all_codes, historical_mean, recent_mean):
+                print(f"[{code}] 历史均额:{hist / 1e4:.1f}万 近期均额:{recent / 1e4:.1f}万 倍数:{recent / hist:.2f}x")
+            # 逐支参照取最近 MIN_DATA_LENGTH 根，同 _get_amount_data
+            self._check_parity(all_codes, passed, lambda code: self._amount_passed(
+                code, pd.Series(amounts_by_code[code], dtype=float).iloc[-Config.MIN_DATA_LENGTH:]))
+
+        if write_result:
+            write_atomic(Config.RESULT_PATH, results)
+        print(f"🎉 分析完成! 共筛选出  {len(results)} 支股票")
+        return results
 
+    @staticmethod
+    def _read_codes(path):
+        """读取代码列表文件（每行一个代码）"""
+        with open(path) as f:
+            return [line.strip() for line in f if line.strip()]
 
     def _analyze_single_stock(self, code):
-        """单个股票分析逻辑（原analyze_amount方法）"""
+        """单个股票分析逻辑（原analyze_amount方法），获取失败时抛出"""
+        # 获取金额数据
+        amounts = self._get_amount_data(code)
+        #amounts=code
+        with METRICS.cpu('screen'):
+            return self._amount_passed(code, amounts)
+
+    def _amount_passed(self, code, amounts):
+        """逐支放量判定（面板模式 amount_ratio_screen 的参照实现）"""
         try:
-            # 获取金额数据
-            amounts = self._get_amount_data(code)
-            #amounts=code
-
             if len(amounts) < Config.MIN_DATA_LENGTH:
                 if Config.DEBUG_MODE:
                     print(f"{code} 数据不足 ({len(amounts)}/{Config.MIN_DATA_LENGTH})")
                 return False
             # 动态窗口计算
-            window_size = 20
+            window_size = Config.AMOUNT_WINDOW
 
 
             # 计算指标
@@ -370,44 +699,37 @@ class StockAnalyzer:
             return False
 
     def _get_amount_data(self, code):
-        """获取成交金额数据（仅使用东财接口，60分钟线）"""
-        try:
-            # 代码格式处理
-            if '.' in code:
-                pure_code = code.split('.')[0]
-            else:
-                pure_code = code.lstrip('shsz')  # 清理前缀
-
-            # 计算时间范围（获取约160个60分钟周期）
-            #end_date = datetime.now().strftime("%Y-%m-%d 15:00:00")  # 收盘时间
-            #start_date = (datetime.now() - timedelta(days=40)).strftime("%Y-%m-%d 09:30:00")  # 40
-
-            # 调用东财接口（60分钟线）
-            df = ak.stock_zh_a_hist_min_em(
-                symbol=pure_code,
-                period="60",  # 60分钟周期
-                adjust="hfq",
-                start_date="1979-09-01 09:32:00",  # 格式："YYYY-MM-DD"
-                end_date="2222-01-01 09:32:00",
-            )
-            print(df)
+        """获取成交金额数据（仅使用东财接口，60分钟线）
 
-            # 数据标准化
-            df = self._process_data(df, 'em')
+        获取失败直接抛出，由调用方决定是否记录（阶段日志不记录，续跑时重试）。
+        """
+        # 代码格式处理
+        if '.' in code:
+            pure_code = code.split('.')[0]
+        else:
+            pure_code = code.lstrip('shsz')  # 清理前缀
 
-            print(df)
+        # 计算时间范围（获取约160个60分钟周期）
+        #end_date = datetime.now().strftime("%Y-%m-%d 15:00:00")  # 收盘时间
+        #start_date = (datetime.now() - timedelta(days=40)).strftime("%Y-%m-%d 09:30:00")  # 40
 
+        # 东财60分钟线（本地仓库增量更新）
+        df = self.bar_store.hist_min(
+            pure_code,
+            period="60",  # 60分钟周期
+            adjust="hfq",
+        )
 
-            # 验证数据量
-            print(f"[DEBUG] {code} 获取 {len(df)} 条60分钟数据（预期≥120）")
-            if len(df) < 100:
-                print(f"⚠️ 数据不足: {code} 仅获取到 {len(df)} 条数据")
-                return pd.Series()
-            return df['amount'].iloc[-120:]  # 返回最近160个周期
+        # 数据标准化
+        df = self._process_data(df, 'em')
 
-        except Exception as e:
-            print(f"❌ 严重错误: {code} 数据获取失败 - {str(e)}")
+        # 验证数据量
+        if Config.DEBUG_MODE:
+            print(f"[DEBUG] {code} 获取 {len(df)} 条60分钟数据（预期≥120）")
+        if len(df) < 100:
+            print(f"⚠️ 数据不足: {code} 仅获取到 {len(df)} 条数据")
             return pd.Series()
+        return df['amount'].iloc[-120:]  # 返回最近160个周期
 
     def _process_data(self, df, source):
         """处理东财分钟线数据格式（适配新接口返回的列名和时间格式）"""
@@ -424,250 +746,403 @@ class StockAnalyzer:
 
 
 
-    def _save_results(self, results, path):
-        """保存结果文件"""
-        with open(path, 'a') as f:  # 改为追加模式
-            f.write('\n'.join(results) + '\n')
-
-    def _save_progress(self, path, date, processed):
-        """保存处理进度"""
-        with open(path, 'w') as f:
-            json.dump({
-                'date': date,
-                'processed': processed,
-                'timestamp': datetime.now().isoformat()
-            }, f)
-
-
+    @METRICS.timed_stage('qiangrizhangfu')
     def get_qiangrizhangfu(self, codes):
         """强势涨幅筛选（带详细日志）"""
-        result = []
         total = len(codes)
-        print(f"\n🔄 开始处理 {total} 支股票，预计需要 {total * 0.5 / 60:.1f} 分钟")
-        start_time = time.time()
+        journal = StageJournal(Config.JOURNAL_DIR, "qiangrizhangfu", self.today.strftime("%Y-%m-%d"))
+        todo_codes = journal.pending(codes)
+        print(f"\n🔄 开始处理 {total} 支股票（已完成 {total - len(todo_codes)} 支，"
+              f"并发抓取，限速 {Config.RATE_LIMITS['stock_zh_a_hist'][0]:.0f} 次/秒）")
 
-        for idx, code in enumerate(codes, 1):
-            start_time = time.time()
-            try:
-                # 清洗股票代码格式
-                pure_code = code.split('.')[0]
-                market = 'sh' if code.endswith('XSHG') else 'sz'
+        try:
+            for idx, (code, ok, error) in enumerate(self.engine.map(self._qiangri_single, todo_codes), 1):
+                if error is not None:
+                    print(f"⚠️ 处理 {code} 异常: {str(error)}")  # 不记录，续跑时重试
+                else:
+                    journal.record(code, ok)
 
-                if Config.DEBUG_MODE:
-                    print(f"\n[{idx}/{total}] 分析 {pure_code} [{market}]")
-
-                # 获取后复权日线数据
-                df = ak.stock_zh_a_hist(
-                    symbol=pure_code,
-                    period="daily",
-                    adjust="hfq",
-                    start_date="20240101",
-                    end_date=self.today.strftime("%Y%m%d")
-                )
+                if idx % 10 == 0:
+                    print(f"⏲️ 进度: {idx}/{len(todo_codes)} ({idx / len(todo_codes):.0%}) "
+                          f"已找到 {len(journal.passed(codes))} 支")
+        finally:
+            journal.close()
 
-                # 增强数据校验
-                if df.empty:
-                    print(f"❌ {code} 未获取到数据")
-                    continue
+        result = journal.passed(codes)
+        print(f"\n🎯 筛选完成！通过 {len(result)} 支，淘汰率 {1 - len(result) / total:.0%}")
+        return result
 
-                if len(df) < 30:
-                    print(f"❌ {code} 数据不足（仅 {len(df)} 天）")
-                    continue
+    @METRICS.timed_stage('qiangrizhangfu')
+    def get_qiangrizhangfu_panel(self, codes):
+        """强势涨幅筛选（面板模式：rules.QIANGRI 对全部代码一次求值）"""
+        frames = self._load_frames(self._qiangri_bars, codes)
+        rules = self.rule_sets()['qiangrizhangfu']
 
-                # 转换数据类型
-                df = df.astype({
-                    '开盘': 'float',
-                    '收盘': 'float',
-                    '成交量': 'float'
-                })
-
-                # 提取关键字段
-                closes = df['收盘'].values
-                opens = df['开盘'].values
-                volumes = df['成交量'].values
-                # 条件1: 最近三日阳线
-                condition1 = closes[-1] > opens[-1] and closes[-2] > opens[-2] and closes[-3] > opens[-3]
-                #condition1 = closes[-2] > opens[-2] and closes[-3] > opens[-3]
-                if Config.DEBUG_MODE:
-                    print(f"  → 3日阳线: {'✅' if condition1 else '❌'}")
+        start_time = time.time()
+        with METRICS.cpu('screen'):
+            fields, lengths = self._panel_fields(
+                frames, codes, {'open': '开盘', 'close': '收盘', 'volume': '成交量'}, Config.QIANGRI_MIN_BARS
+            )
+            passed, _ = rules.evaluate(fields, lengths)
+        result = [code for code, ok in zip(codes, passed) if ok]
+        print(f"🧮 面板筛选 {len(codes)} 支，用时 {(time.time() - start_time) * 1000:.1f}ms")
 
-                # 条件2: 成交量递增
-                condition2 = volumes[-1] > volumes[-2] or volumes[-2] > volumes[-3]
-                if Config.DEBUG_MODE:
-                    print(f"  → 量能增长: {'✅' if condition2 else '❌'}")
+        if Config.DEBUG_MODE:
+            self._check_parity(codes, passed, lambda code: self._qiangri_passed(code, frames[code]))
+        print(f"\n🎯 筛选完成！通过 {len(result)} 支，淘汰率 {1 - len(result) / max(len(codes), 1):.0%}")
+        return result
 
-                # 条件3: 六日涨幅区间
-                pct_change = (closes[-1] - closes[-6]) / closes[-6]
-                condition3 = -0.05 <= pct_change <= 0.3
-                if Config.DEBUG_MODE:
-                    print(f"  → 六日涨幅: {pct_change:.2%} {'✅' if condition3 else '❌'}")
+    @staticmethod
+    def rule_params():
+        """筛选规则参数的当前取值 {参数名: 值}"""
+        return {name: getattr(Config, name) for names in STAGE_PARAMS.values() for name in names}
+
+    @classmethod
+    def rule_sets(cls):
+        """按 Config 参数构造各阶段的面板规则集"""
+        return build_rule_sets(cls.rule_params())
+
+    def _load_frames(self, loader, codes):
+        """并发加载各代码K线，失败的记为空表"""
+        frames = {}
+        for idx, (code, df, error) in enumerate(self.engine.map(loader, codes), 1):
+            if error is not None:
+                print(f"⚠️ 处理 {code} 异常: {str(error)}")
+            frames[code] = df if error is None else pd.DataFrame()
+            if idx % 100 == 0:
+                print(f"⏲️ 数据更新: {idx}/{len(codes)} ({idx / len(codes):.0%})")
+        return frames
+
+    @staticmethod
+    def _panel_fields(frames, codes, columns, bars):
+        """{字段: 列名} → ({字段: 面板}, 各代码K线总数)"""
+        fields = {}
+        for field, column in columns.items():
+            series_list = [frames[code][column].values if not frames[code].empty else [] for code in codes]
+            fields[field], _ = build_panel(series_list, bars)
+        lengths = np.array([len(frames[code]) for code in codes], dtype=int)
+        return fields, lengths
+
+    @staticmethod
+    def _check_parity(codes, passed, reference):
+        """调试模式：面板结果与逐支参照实现逐一对照"""
+        mismatched = [code for code, ok in zip(codes, passed) if bool(ok) != bool(reference(code))]
+        if mismatched:
+            print(f"‼️ 面板与逐支判定不一致 {len(mismatched)} 支: {mismatched}")
+        else:
+            print(f"✅ 面板与逐支判定一致（{len(codes)} 支）")
 
-                #if sum([condition1, condition2, condition3]) >= 2:
-                if condition1 and condition2 and condition3:
+    def _qiangri_single(self, code):
+        """单支强势涨幅判定"""
+        start_time = time.time()
+        # 清洗股票代码格式
+        pure_code = code.split('.')[0]
+        market = 'sh' if code.endswith('XSHG') else 'sz'
+
+        if Config.DEBUG_MODE:
+            print(f"\n分析 {pure_code} [{market}]")
+
+        df = self._qiangri_bars(code)
+        with METRICS.cpu('screen'):
+            ok = self._qiangri_passed(code, df)
+        if ok:
+            print(f"✅ [{code}] 通过筛选 | 用时 {time.time() - start_time:.1f}s")
+        return ok
+
+    def _qiangri_bars(self, code):
+        """后复权日线数据（本地仓库增量更新）"""
+        return self.bar_store.hist_daily(
+            code.split('.')[0],
+            adjust="hfq",
+            start_date="20240101",
+            end_date=self.today.strftime("%Y%m%d")
+        )
 
-                    print(f"✅ [{code}] 通过筛选 | 用时 {time.time() - start_time:.1f}s")
-                    result.append(code)
-                else:
-                    if Config.DEBUG_MODE:
-                        print(f"  → 综合判定: ❌")
+    def _qiangri_passed(self, code, df):
+        """逐支强势判定（面板模式 rules.QIANGRI 的参照实现）"""
+        # 增强数据校验
+        if df.empty:
+            print(f"❌ {code} 未获取到数据")
+            return False
 
-            except Exception as e:
-                print(f"⚠️ 处理 {code} 异常: {str(e)}")
+        if len(df) < Config.QIANGRI_MIN_BARS:
+            print(f"❌ {code} 数据不足（仅 {len(df)} 天）")
+            return False
 
-            time.sleep(0.5)
-            if idx % 10 == 0:
-                print(f"⏲️ 进度: {idx}/{total} ({idx / total:.0%}) 已找到 {len(result)} 支")
+        # 转换数据类型
+        df = df.astype({
+            '开盘': 'float',
+            '收盘': 'float',
+            '成交量': 'float'
+        })
 
-        print(f"\n🎯 筛选完成！通过 {len(result)} 支，淘汰率 {1 - len(result) / total:.0%}")
-        return result
+        # 提取关键字段
+        closes = df['收盘'].values
+        opens = df['开盘'].values
+        volumes = df['成交量'].values
+        # 条件1: 最近三日阳线
+        condition1 = closes[-1] > opens[-1] and closes[-2] > opens[-2] and closes[-3] > opens[-3]
+        #condition1 = closes[-2] > opens[-2] and closes[-3] > opens[-3]
+        if Config.DEBUG_MODE:
+            print(f"  → 3日阳线: {'✅' if condition1 else '❌'}")
+
+        # 条件2: 成交量递增
+        condition2 = volumes[-1] > volumes[-2] or volumes[-2] > volumes[-3]
+        if Config.DEBUG_MODE:
+            print(f"  → 量能增长: {'✅' if condition2 else '❌'}")
+
+        # 条件3: 六日涨幅区间
+        pct_change = (closes[-1] - closes[-6]) / closes[-6]
+        condition3 = Config.PCT6_MIN <= pct_change <= Config.PCT6_MAX
+        if Config.DEBUG_MODE:
+            print(f"  → 六日涨幅: {pct_change:.2%} {'✅' if condition3 else '❌'}")
+
+        #if sum([condition1, condition2, condition3]) >= 2:
+        if condition1 and condition2 and condition3:
+            return True
+
+        if Config.DEBUG_MODE:
+            print(f"  → 综合判定: ❌")
+        return False
 
+    @METRICS.timed_stage('technical')
     def technical_analysis(self, codes):
         """技术指标分析（使用pandas_ta替代TA-Lib）"""
-        result = []
-        qualified = []
         total = len(codes)
-        print(f"\n🔄 开始技术分析 {total} 支股票，预计耗时: {total * 0.5 / 60:.1f} 分钟")
-
-        for idx, code in enumerate(codes, 1):
-            try:
-                # 清洗股票代码（去除交易所后缀）
-                pure_code = code.split('.')[0]
-                print(f"\n[{idx}/{total}] 分析 {pure_code}")
-
-                # 获取60分钟K线数据
-                df = ak.stock_zh_a_hist_min_em(
-                    symbol=pure_code,
-                    period="60",
-                    adjust='hfq',
-                    start_date=(self.today - timedelta(days=60)).strftime("%Y-%m-%d"),
-                    end_date=self.today.strftime("%Y-%m-%d")
-                )
+        journal = StageJournal(Config.JOURNAL_DIR, "technical", self.today.strftime("%Y-%m-%d"))
+        todo_codes = journal.pending(codes)
+        print(f"\n🔄 开始技术分析 {total} 支股票（已完成 {total - len(todo_codes)} 支，并发抓取）")
 
-                # 数据校验
-                if len(df) < 100:
-                    print(f"❌ 数据不足 ({len(df)}/100)")
+        try:
+            for code, ok, error in self.engine.map(self._technical_single, todo_codes):
+                if error is not None:
+                    print(f"⚠️ 技术分析异常 {code}: {str(error)}")  # 不记录，续跑时重试
+                    if Config.DEBUG_MODE:
+                        import traceback
+                        traceback.print_exception(type(error), error, error.__traceback__)
                     continue
 
-                # 重命名列并预处理
-                df = df.rename(columns={
-                    '时间': 'datetime',
-                    '开盘': 'open',
-                    '收盘': 'close',
-                    '最高': 'high',
-                    '最低': 'low',
-                    '成交量': 'volume'
-                }).set_index('datetime').astype(float)
-
-                # 计算技术指标 ---------------------------------------------------
-                # 威廉指标 (使用原生计算)
-                high_21 = df['high'].rolling(21).max()
-                low_21 = df['low'].rolling(21).min()
-                wr1 = 100 * (high_21 - df['close']) / (high_21 - low_21)
-
-                high_42 = df['high'].rolling(42).max()
-                low_42 = df['low'].rolling(42).min()
-                wr2 = 100 * (high_42 - df['close']) / (high_42 - low_42)
-
-                # MACD计算 (使用pandas_ta)
-                macd_df = df.ta.macd(fast=12, slow=26, signal=9)
-                dif = macd_df['MACD_12_26_9']
-                dea = macd_df['MACDs_12_26_9']
-                macd_hist = macd_df['MACDh_12_26_9']
-
-                # 条件判断 ------------------------------------------------------
-                conditions = [
-                    wr1.iloc[-1] < 60,  # WR1 < 60
-                    (wr1.iloc[-1] - wr2.iloc[-1]) < 20,  # WR差值 < 20
-                    dif.iloc[-1] > 0,  # DIF > 0
-                    dea.iloc[-1] > 0,  # DEA > 0
-                    (macd_hist.iloc[-1] > macd_hist.iloc[-2]) and  # MACD柱连续增长
-                    (macd_hist.iloc[-2] > macd_hist.iloc[-3]),
-                    any(macd_hist.iloc[i] < 0 for i in [-3, -4, -5, -6])  # 前四日有负值
-                ]
-
-                # 调试信息
-                if Config.DEBUG_MODE:
-                    debug_msg = f"""
-                    [{code}] 技术指标:
-                    WR%1(21日): {wr1.iloc[-1]:.1f} | WR%2(42日): {wr2.iloc[-1]:.1f}
-                    DIF: {dif.iloc[-1]:.2f} | DEA: {dea.iloc[-1]:.2f}
-                    MACD柱变化: {macd_hist.iloc[-3]:.2f} → {macd_hist.iloc[-2]:.2f} → {macd_hist.iloc[-1]:.2f}
-                    条件验证: {[bool(c) for c in conditions]}
-                    """
-                    print(debug_msg)
-
-                if all(conditions):
+                journal.record(code, ok)
+                if ok:
                     print(f"✅ {code} 通过技术筛选")
-                    qualified.append(code)
                 else:
                     print(f"❌ {code} 未通过技术条件")
+        finally:
+            journal.close()
 
-            except Exception as e:
-                print(f"⚠️ 技术分析异常 {code}: {str(e)}")
-                if Config.DEBUG_MODE:
-                    import traceback
-                    traceback.print_exc()
-
-            time.sleep(0.5)
-
+        qualified = journal.passed(codes)
         print(f"\n🎯 技术分析完成！通过 {len(qualified)} 支，淘汰率 {1 - len(qualified) / total:.0%}")
         return qualified
 
+    @METRICS.timed_stage('technical')
+    def technical_analysis_panel(self, codes):
+        """技术指标分析（面板模式：指标按近60天K线整段计算，rules.TECHNICAL 一次求值）"""
+        frames = self._load_frames(self._technical_bars, codes)
+        rules = self.rule_sets()['technical']
+
+        start_time = time.time()
+        width = max([len(df) for df in frames.values()] + [1])
+        with METRICS.cpu('indicators'):
+            prices, lengths = self._panel_fields(frames, codes, {'high': '最高', 'low': '最低', 'close': '收盘'}, width)
+            fields = technical_fields(prices['high'], prices['low'], prices['close'])
+        with METRICS.cpu('screen'):
+            passed, _ = rules.evaluate(fields, lengths)
+        result = [code for code, ok in zip(codes, passed) if ok]
+        print(f"🧮 面板筛选 {len(codes)} 支，用时 {(time.time() - start_time) * 1000:.1f}ms")
+
+        if Config.DEBUG_MODE:
+            rows = {code: i for i, code in enumerate(codes)}
+
+            def reference(code):
+                i = rows[code]
+                if lengths[i] < Config.TECHNICAL_MIN_BARS:
+                    return False
+                return self._technical_passed(code, *(pd.Series(fields[key][i]) for key in TECHNICAL.fields))
+            self._check_parity(codes, passed, reference)
+        print(f"\n🎯 技术分析完成！通过 {len(result)} 支，淘汰率 {1 - len(result) / max(len(codes), 1):.0%}")
+        return result
+
+    def _technical_single(self, code):
+        """单支技术指标判定"""
+        # 清洗股票代码（去除交易所后缀）
+        pure_code = code.split('.')[0]
+        print(f"\n分析 {pure_code}")
 
+        df = self._technical_bars(code)
+
+        # 数据校验
+        if len(df) < Config.TECHNICAL_MIN_BARS:
+            print(f"❌ {code} 数据不足 ({len(df)}/{Config.TECHNICAL_MIN_BARS})")
+            return False
+
+        with METRICS.cpu('indicators'):
+            wr1, wr2, dif, dea, macd_hist = self._technical_indicators(pure_code, df)
+        with METRICS.cpu('screen'):
+            return self._technical_passed(code, wr1, wr2, dif, dea, macd_hist)
+
+    def _technical_indicators(self, pure_code, df):
+        """逐支计算 WR1/WR2/DIF/DEA/MACD柱"""
+        # 计算技术指标 ---------------------------------------------------
+        if Config.INCREMENTAL_INDICATORS:
+            # 增量指标：在仓库全部60分钟线上只推进上次之后的新K线
+            bars = self.bar_store.load(pure_code, "60", 'hfq')
+            state = self.indicators.update(
+                pure_code, bars['时间'], bars['最高'], bars['最低'], bars['收盘'],
+                committed_until=last_session_close().strftime("%Y-%m-%d %H:%M:%S")
+            )
+            wr1, wr2, dif, dea, macd_hist = (
+                pd.Series(state.values(key)) for key in ('wr1', 'wr2', 'dif', 'dea', 'hist')
+            )
+        else:
+            # 重命名列并预处理
+            df = df.rename(columns={
+                '时间': 'datetime',
+                '开盘': 'open',
+                '收盘': 'close',
+                '最高': 'high',
+                '最低': 'low',
+                '成交量': 'volume'
+            }).set_index('datetime').astype(float)
+
+            # 威廉指标 (使用原生计算)
+            high_21 = df['high'].rolling(21).max()
+            low_21 = df['low'].rolling(21).min()
+            wr1 = 100 * (high_21 - df['close']) / (high_21 - low_21)
+
+            high_42 = df['high'].rolling(42).max()
+            low_42 = df['low'].rolling(42).min()
+            wr2 = 100 * (high_42 - df['close']) / (high_42 - low_42)
+
+            # MACD计算 (使用pandas_ta)
+            macd_df = ta.macd(df['close'], fast=12, slow=26, signal=9)
+            dif = macd_df['MACD_12_26_9']
+            dea = macd_df['MACDs_12_26_9']
+            macd_hist = macd_df['MACDh_12_26_9']
+
+        return wr1, wr2, dif, dea, macd_hist
+
+    def _technical_bars(self, code):
+        """近60天的60分钟K线（与成交金额筛选共用本地仓库）"""
+        return self.bar_store.hist_min(
+            code.split('.')[0],
+            period="60",
+            adjust='hfq',
+            start_date=(self.today - timedelta(days=60)).strftime("%Y-%m-%d"),
+            end_date=self.today.strftime("%Y-%m-%d")
+        )
 
+    def _technical_passed(self, code, wr1, wr2, dif, dea, macd_hist):
+        """逐支技术条件判定（面板模式 rules.TECHNICAL 的参照实现）"""
+        conditions = [
+            wr1.iloc[-1] < Config.WR1_MAX,  # WR1 < 60
+            (wr1.iloc[-1] - wr2.iloc[-1]) < Config.WR_DIFF_MAX,  # WR差值 < 20
+            dif.iloc[-1] > 0,  # DIF > 0
+            dea.iloc[-1] > 0,  # DEA > 0
+            (macd_hist.iloc[-1] > macd_hist.iloc[-2]) and  # MACD柱连续增长
+            (macd_hist.iloc[-2] > macd_hist.iloc[-3]),
+            any(macd_hist.iloc[i] < 0 for i in [-3, -4, -5, -6])  # 前四日有负值
+        ]
+
+        # 调试信息
+        if Config.DEBUG_MODE:
+            debug_msg = f"""
+            [{code}] 技术指标:
+            WR%1(21日): {wr1.iloc[-1]:.1f} | WR%2(42日): {wr2.iloc[-1]:.1f}
+            DIF: {dif.iloc[-1]:.2f} | DEA: {dea.iloc[-1]:.2f}
+            MACD柱变化: {macd_hist.iloc[-3]:.2f} → {macd_hist.iloc[-2]:.2f} → {macd_hist.iloc[-1]:.2f}
+            条件验证: {[bool(c) for c in conditions]}
+            """
+            print(debug_msg)
+
+        return all(conditions)
+
+    @METRICS.timed_stage('realtime')
     def get_realtime_data(self, codes):
-        """高效获取指定股票实时数据（直接请求）"""
-        results = []
+        """批量获取实时行情（一次全市场快照，快照中缺失的代码再逐支补查）"""
+        pure_codes = [code.split('.')[0] for code in codes]
+        data_by_code = {}
+        try:
+            snapshot = self.spot_cache.get(max_age=Config.SPOT_REALTIME_MAX_AGE)
+            data_by_code = self._quotes_from_snapshot(snapshot, pure_codes)
+        except Exception as e:
+            print(f"⚠️ 全市场快照获取失败，改为逐支查询: {str(e)}")
 
-        for code in codes:
-            pure_code = code.split('.')[0]  # 提前提取纯代码
-            data_template = {
-                "code": pure_code,
-                "name": "N/A",
-                "open": 0.0,
-                "close": 0.0,
-                "high": 0.0,
-                "low": 0.0,
-                "now": 0.0
+        missing = [code for code, pure_code in zip(codes, pure_codes) if pure_code not in data_by_code]
+        if missing:
+            if Config.DEBUG_MODE:
+                print(f"快照缺失 {len(missing)} 支，逐支补查: {missing}")
+            for code, data, _ in self.engine.map(self._realtime_single, missing):
+                data_by_code[code.split('.')[0]] = data
+        return [dict(data_by_code[pure_code]) for pure_code in pure_codes]
+
+    @staticmethod
+    def _quotes_from_snapshot(snapshot, pure_codes):
+        """从 stock_zh_a_spot_em 快照中取出指定代码的行情（无最新价的视为缺失）"""
+        df = snapshot.assign(代码=snapshot['代码'].astype(str).str.zfill(6))
+        df = df.drop_duplicates('代码').set_index('代码')
+        df = df.reindex(list(dict.fromkeys(pure_codes)))
+        df = df[df['最新价'].notna()]
+
+        return {
+            code: {
+                "code": code,
+                "name": name,
+                "open": float(open_),
+                "close": float(close),
+                "high": float(high),
+                "low": float(low),
+                "now": float(now)
             }
+            for code, name, open_, close, high, low, now in df[
+                ['名称', '今开', '昨收', '最高', '最低', '最新价']
+            ].itertuples()
+        }
 
-            try:
-                # === 获取实时行情数据 ===
-                df_bid_ask = ak.stock_bid_ask_em(symbol=pure_code)
+    def _realtime_single(self, code):
+        """单支股票实时行情（快照缺失时的兜底，失败时返回占位数据）"""
+        pure_code = code.split('.')[0]  # 提前提取纯代码
+        data_template = {
+            "code": pure_code,
+            "name": "N/A",
+            "open": 0.0,
+            "close": 0.0,
+            "high": 0.0,
+            "low": 0.0,
+            "now": 0.0
+        }
 
-                # === 获取股票名称 ===
-                name = "N/A"
-                try:
-                    df_info = ak.stock_individual_info_em(symbol=pure_code)
-                    name_row = df_info[df_info['item'] == '股票简称']
-                    if not name_row.empty:
-                        name = name_row['value'].values[0]
-                except Exception as name_err:
-                    if Config.DEBUG_MODE:
-                        print(f"名称获取失败 {code}: {str(name_err)}")
-
-                # === 构建数据字典 ===
-                data = {
-                    "code": pure_code,
-                    "name": name,
-                    "open": df_bid_ask[df_bid_ask['item'] == '今开']['value'].values[0],
-                    "close": df_bid_ask[df_bid_ask['item'] == '昨收']['value'].values[0],
-                    "high": df_bid_ask[df_bid_ask['item'] == '最高']['value'].values[0],
-                    "low": df_bid_ask[df_bid_ask['item'] == '最低']['value'].values[0],
-                    "now": df_bid_ask[df_bid_ask['item'] == '最新']['value'].values[0]
-                }
-                results.append(data)
+        try:
+            # === 获取实时行情数据 ===
+            df_bid_ask = self.engine.call('stock_bid_ask_em', ak.stock_bid_ask_em, symbol=pure_code)
 
-            except Exception as e:
+            # === 获取股票名称 ===
+            name = "N/A"
+            try:
+                df_info = self.engine.call('stock_individual_info_em', ak.stock_individual_info_em, symbol=pure_code)
+                name_row = df_info[df_info['item'] == '股票简称']
+                if not name_row.empty:
+                    name = name_row['value'].values[0]
+            except Exception as name_err:
                 if Config.DEBUG_MODE:
-                    print(f"获取 {code} 数据失败: {str(e)}")
-                results.append(data_template)
+                    print(f"名称获取失败 {code}: {str(name_err)}")
 
-            # === 请求频率控制 ===
-            time.sleep(0.3)
+            # === 构建数据字典 ===
+            return {
+                "code": pure_code,
+                "name": name,
+                "open": df_bid_ask[df_bid_ask['item'] == '今开']['value'].values[0],
+                "close": df_bid_ask[df_bid_ask['item'] == '昨收']['value'].values[0],
+                "high": df_bid_ask[df_bid_ask['item'] == '最高']['value'].values[0],
+                "low": df_bid_ask[df_bid_ask['item'] == '最低']['value'].values[0],
+                "now": df_bid_ask[df_bid_ask['item'] == '最新']['value'].values[0]
+            }
 
-        return results
+        except Exception as e:
+            if Config.DEBUG_MODE:
+                print(f"获取 {code} 数据失败: {str(e)}")
+            return data_template
 
+    @METRICS.timed_stage('send_report')
     def send_notification(self, data):
         """静默发送微信通知（令牌内置版）"""
         print("\n=== 开始推送通知 ===")
@@ -683,30 +1158,10 @@ class StockAnalyzer:
 
             print("\n🔄 正在生成深度分析...")
             analysis_content = self.deepseek_analysis(data)
-
-            # ========== 构建通知内容 ==========
-            content = []
-
-            # 1. 实时行情表格
-            content.append("## 📈 实时行情")
-            content.append("| 代码 | 名称 | 现价 | 涨跌幅 |\n|---|---|---|---|")
-            for stock in data:
-                chg_pct = (stock['now'] - stock['close']) / stock['close'] * 100
-                content.append(f"| {stock['code']} | {stock['name']} | {stock['now']:.2f} | {chg_pct:.2f}% |")
-
-            content.append(self.send_market)
-
-            # 2. 深度分析报告
-            content.append("\n## 🔍 深度分析")
-            if analysis_content:
-                content.append(analysis_content)
-            else:
-                content.append("⚠️ 深度分析获取失败，请查看日志")
-
-            # 合并内容
-            full_content = "\n".join(content)
+            full_content = self._build_report(data, self.send_market, analysis_content)
 
             # ========== 发送请求 ==========
+            start_time = time.time()
             response = requests.post(
                 'http://www.pushplus.plus/send',
                 json={
@@ -719,6 +1174,8 @@ class StockAnalyzer:
                 timeout=15  # 延长超时时间
             )
 
+            METRICS.observe_call('pushplus', time.time() - start_time, failed=response.status_code != 200)
+
             # 解析响应
             print(f"服务器响应状态码: {response.status_code}")
             if response.status_code == 200:
@@ -736,12 +1193,36 @@ class StockAnalyzer:
                 import traceback
                 traceback.print_exc()
 
-    def run_market_cap_screening(self):
-        """执行市值筛选（30-400亿，排除北交所/科创板）"""
+    @staticmethod
+    def _build_report(data, market_report, analysis_content):
+        """构建推送的Markdown正文：实时行情表 + 市场画像 + 深度分析"""
+        content = []
+
+        # 1. 实时行情表格
+        content.append("## 📈 实时行情")
+        content.append("| 代码 | 名称 | 现价 | 涨跌幅 |\n|---|---|---|---|")
+        for stock in data:
+            chg_pct = (stock['now'] - stock['close']) / stock['close'] * 100
+            content.append(f"| {stock['code']} | {stock['name']} | {stock['now']:.2f} | {chg_pct:.2f}% |")
+
+        content.append(market_report)
+
+        # 2. 深度分析报告
+        content.append("\n## 🔍 深度分析")
+        if analysis_content:
+            content.append(analysis_content)
+        else:
+            content.append("⚠️ 深度分析获取失败，请查看日志")
+
+        return "\n".join(content)
+
+    @METRICS.timed_stage('market_cap')
+    def run_market_cap_screening(self, write_result=True):
+        """执行市值筛选（30-400亿，排除北交所/科创板），返回代码列表，失败返回None"""
         print("\n正在执行市值筛选（30-400亿，排除北交所/科创板）...")
 
         try:
-            df = ak.stock_zh_a_spot_em()
+            df = self.spot_cache.get().copy()
             df["代码"] = df["代码"].astype(str).str.zfill(6)
 
             # 筛选条件
@@ -753,19 +1234,24 @@ class StockAnalyzer:
             )
             filtered_df = df[condition]
 
+            codes = filtered_df["代码"].tolist()
+
             # 保存结果
-            filtered_df["代码"].to_csv(Config.INITIAL_SCREENING_PATH, index=False, header=False)
-            print(f"✅ 筛选完成，共 {len(filtered_df)} 支，结果保存至 {Config.INITIAL_SCREENING_PATH}")
-            return True
+            if write_result:
+                write_atomic(Config.INITIAL_SCREENING_PATH, codes)
+                print(f"✅ 筛选完成，共 {len(codes)} 支，结果保存至 {Config.INITIAL_SCREENING_PATH}")
+            else:
+                print(f"✅ 筛选完成，共 {len(codes)} 支")
+            return codes
         except Exception as e:
             print(f"‼️ 市值筛选失败: {str(e)}")
             if Config.DEBUG_MODE:
                 import traceback
                 traceback.print_exc()
-            return False
+            return None
 
 
-    def run_qiangrizhangfu(self):
+    def run_qiangrizhangfu(self, panel=False):
         if not os.path.exists(Config.RESULT_PATH):
             print("请先执行成交金额筛选！")
             return
@@ -774,13 +1260,12 @@ class StockAnalyzer:
             codes = [line.strip() for line in f]
 
         print(f"\n正在对 {len(codes)} 支股票进行强势筛选...")
-        result = self.get_qiangrizhangfu(codes)
+        result = self.get_qiangrizhangfu_panel(codes) if panel else self.get_qiangrizhangfu(codes)
 
-        with open(Config.TECHNICAL_PATH, 'w') as f:
-            f.write('\n'.join(result))
+        write_atomic(Config.TECHNICAL_PATH, result)
         print(f"筛选完成，剩余 {len(result)} 支，结果保存到 {Config.TECHNICAL_PATH}")
 
-    def run_technical_analysis(self):
+    def run_technical_analysis(self, panel=False):
         if not os.path.exists(Config.TECHNICAL_PATH):
             print("请先执行强势股筛选！")
             return
@@ -789,10 +1274,9 @@ class StockAnalyzer:
             codes = [line.strip() for line in f]
 
         print(f"\n正在对 {len(codes)} 支股票进行技术分析...")
-        result = self.technical_analysis(codes)
+        result = self.technical_analysis_panel(codes) if panel else self.technical_analysis(codes)
 
-        with open(Config.FINAL_RESULT_PATH, 'w') as f:
-            f.write('\n'.join(result))
+        write_atomic(Config.FINAL_RESULT_PATH, result)
         print(f"分析完成，剩余 {len(result)} 支，结果保存到 {Config.FINAL_RESULT_PATH}")
 
     def run_send_notification(self):
@@ -807,6 +1291,57 @@ class StockAnalyzer:
         self.send_notification(data)
         print("通知已发送！")
 
+    def write_metrics(self, reset=False):
+        """写出运行指标（reset 为真时随后清零，常驻流水线每个任务一份）"""
+        try:
+            METRICS.write(Config.METRICS_DIR)
+            print(f"📊 运行指标已写入 {Config.METRICS_DIR}")
+        except OSError as e:
+            print(f"⚠️ 运行指标写出失败: {str(e)}")
+        if reset:
+            METRICS.reset()
+
+    def run_backtest(self, start=None, end=None):
+        """在本地K线仓库上回测 成交金额 → 强势 → 技术 漏斗（代码池为仓库中已保存的全部代码）"""
+        from backtest import Backtest
+
+        codes = self.bar_store.codes("60")
+        if not codes:
+            print("本地K线仓库为空，请先运行一次筛选流程")
+            return None
+        backtest = Backtest(
+            Config.BAR_STORE_DIR,
+            rule_sets=self.rule_sets(),
+            horizons=Config.BACKTEST_HORIZONS,
+            workers=Config.BACKTEST_WORKERS,
+        )
+        result = backtest.run(codes, start, end)
+        result.save(Config.BACKTEST_DIR)
+        print("\n=== 入选后收益 ===")
+        print(result.summary())
+        print(f"结果保存到 {Config.BACKTEST_DIR}")
+        return result
+
+    def run_sweep(self, start=None, end=None):
+        """在本地K线仓库上网格扫描 Config.SWEEP_GRID 中的筛选参数"""
+        from sweep import sweep
+
+        codes = self.bar_store.codes("60")
+        if not codes:
+            print("本地K线仓库为空，请先运行一次筛选流程")
+            return None
+        table = sweep(
+            Config.BAR_STORE_DIR, codes, self.rule_params(), Config.SWEEP_GRID,
+            horizons=Config.BACKTEST_HORIZONS, start=start, end=end, workers=Config.BACKTEST_WORKERS,
+        )
+        os.makedirs(os.path.dirname(Config.SWEEP_PATH), exist_ok=True)
+        table.to_csv(Config.SWEEP_PATH, index=False)
+        key = f'平均收益_{Config.BACKTEST_HORIZONS[0]}'
+        print(f"\n=== 参数扫描（按 {key} 排序，前10组）===")
+        print(table.sort_values(key, ascending=False).head(10).to_string(index=False))
+        print(f"结果保存到 {Config.SWEEP_PATH}")
+        return table
+
 class InteractiveConsole:
     def __init__(self):
         self.analyzer = StockAnalyzer()
@@ -969,6 +1504,46 @@ def parse_arguments():
                         action='store_true',
                         help='仅发送通知报告')
 
+    parser.add_argument('--panel',
+                        action='store_true',
+                        help='成交金额/强势/技术分析使用面板模式（全市场向量化筛选）')
+
+    parser.add_argument('--pipeline',
+                        metavar='STAGES',
+                        help=f'单进程流水线运行：任务名（如 night/morning）或逗号分隔的阶段（{",".join(STAGES)}）')
+
+    parser.add_argument('--daemon',
+                        action='store_true',
+                        help='常驻进程，按 Config.PIPELINE_JOBS 定时运行流水线')
+
+    parser.add_argument('--no-artifacts',
+                        action='store_true',
+                        help='流水线模式下不写出中间结果文件')
+
+    parser.add_argument('--startup-profile',
+                        action='store_true',
+                        help='输出各模块导入与初始化耗时')
+
+    parser.add_argument('--backtest',
+                        metavar='START[:END]',
+                        help='在本地K线仓库上回测筛选漏斗（日期如 2023-01-01:2024-12-31）')
+
+    parser.add_argument('--sweep',
+                        metavar='START[:END]',
+                        help='在本地K线仓库上网格扫描筛选参数（Config.SWEEP_GRID）')
+
+    parser.add_argument('--record',
+                        metavar='CASSETTE',
+                        help='录制本次运行的 akshare/DeepSeek/PushPlus 调用到磁带文件')
+
+    parser.add_argument('--replay',
+                        metavar='CASSETTE',
+                        help='从磁带文件回放外部调用（不联网）')
+
+    parser.add_argument('--replay-latency',
+                        default='0',
+                        help='回放时每次调用的模拟延迟：秒数，或 recorded 使用录制时的耗时')
+
     parser.add_argument('--debug',
                         action='store_true',
                         help='启用调试模式')
@@ -976,9 +1551,28 @@ def parse_arguments():
     return parser.parse_args()
 
 
+def install_cassette(cassette):
+    """把 akshare、DeepSeek 与 PushPlus 的调用换成经磁带录制/回放的代理（须在创建 StockAnalyzer 之前）"""
+    global ak, openai, requests
+    ak = cassette.wrap('akshare', ak)
+    openai = cassette.wrap('openai', openai, calls=set(), factories=dict.fromkeys(Config.CASSETTE_OPENAI_FACTORIES, Config.CASSETTE_OPENAI_CALLS))
+    requests = cassette.wrap('requests', requests, calls=Config.CASSETTE_REQUESTS_CALLS)
+
+
 def main():
     args = parse_arguments()
+    PROFILE.mark("解析命令行参数")
+    if args.record or args.replay:
+        from cassette import Cassette
+        latency = args.replay_latency if args.replay_latency == 'recorded' else float(args.replay_latency)
+        cassette = Cassette(args.record or args.replay, 'record' if args.record else 'replay', latency=latency)
+        install_cassette(cassette)
+        print(f"📼 {'录制' if args.record else '回放'}外部调用：{cassette.path}")
     analyzer = StockAnalyzer()
+    PROFILE.mark("StockAnalyzer 初始化")
+    if args.startup_profile:
+        import atexit
+        atexit.register(lambda: print(PROFILE.report()))
 
     # 设置调试模式
     if args.debug:
@@ -986,13 +1580,36 @@ def main():
         print("=== 调试模式已启用 ===")
 
     try:
+        # 单进程流水线
+        if args.pipeline or args.daemon:
+            pipeline = Pipeline(analyzer, Config, panel=args.panel, write_artifacts=not args.no_artifacts)
+            jobs = [PipelineJob(**job) for job in Config.PIPELINE_JOBS]
+            if args.daemon:
+                pipeline.serve(jobs)
+            job_stages = {job.name: job.stages for job in jobs}
+            pipeline.run(job_stages.get(args.pipeline) or [s.strip() for s in args.pipeline.split(',')])
+            return
+
+        if args.backtest:
+            start, _, end = args.backtest.partition(':')
+            analyzer.run_backtest(start or None, end or None)
+            return
+
+        if args.sweep:
+            start, _, end = args.sweep.partition(':')
+            analyzer.run_sweep(start or None, end or None)
+            return
+
         # 完整流程
         if args.full_process:
             print("\n=== 开始完整分析流程 ===")
             analyzer.run_market_cap_screening()
-            analyzer.amount_analysis()
-            analyzer.run_qiangrizhangfu()
-            analyzer.run_technical_analysis()
+            if args.panel:
+                analyzer.amount_analysis_panel()
+            else:
+                analyzer.amount_analysis()
+            analyzer.run_qiangrizhangfu(panel=args.panel)
+            analyzer.run_technical_analysis(panel=args.panel)
             analyzer.run_send_notification()
             return
 
@@ -1001,13 +1618,16 @@ def main():
             analyzer.run_market_cap_screening()
 
         if args.amount:
-            analyzer.amount_analysis()
+            if args.panel:
+                analyzer.amount_analysis_panel()
+            else:
+                analyzer.amount_analysis()
 
         if args.qiangrizhangfu:
-            analyzer.run_qiangrizhangfu()
+            analyzer.run_qiangrizhangfu(panel=args.panel)
 
         if args.technical:
-            analyzer.run_technical_analysis()
+            analyzer.run_technical_analysis(panel=args.panel)
 
         if args.send_report:
             analyzer.run_send_notification()
@@ -1015,6 +1635,8 @@ def main():
     except Exception as e:
         print(f"\n!!! 分析流程异常: {str(e)}")
         sys.exit(1)
+    finally:
+        analyzer.write_metrics()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# sweep.py
+"""参数扫描：在历史数据上网格评估筛选阈值，统计每组参数的入选数与后N日收益
+
+价格/成交额/指标面板只在主进程加载一次，放入共享内存；工作进程挂载同一份数据，不各自复制。
+各阶段信号只依赖本阶段参数，工作进程内按参数子集缓存，相同子集不重复求值。
+"""
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from backtest import FUNNEL, HORIZONS, collect, load_arrays, stage_signal
+from rules import STAGE_PARAMS, build_stage_rules
+
+
+class SharedArrays:
+    """把一组NumPy数组放入共享内存；spec 可传给子进程，用 attach 按名称挂载"""
+
+    def __init__(self, arrays):
+        self._blocks = []
+        self.spec = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            self._blocks.append(block)
+            self.spec[name] = (block.name, array.shape, array.dtype.str)
+
+    @property
+    def nbytes(self):
+        return sum(block.size for block in self._blocks)
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    @staticmethod
+    def attach(spec):
+        """挂载共享内存，返回 ({名称: 数组}, 内存块)；内存块需保持引用直到不再使用数组"""
+        arrays, blocks = {}, []
+        for name, (block_name, shape, dtype) in spec.items():
+            # 进程池子进程与主进程共用资源跟踪器，由主进程 close() 统一释放
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+        return arrays, blocks
+
+
+# ---- 工作进程 ----
+_WORKER = {}
+
+
+def _init_worker(spec, codes, horizons, start, end):
+    arrays, blocks = SharedArrays.attach(spec)
+    _WORKER.update(arrays=arrays, blocks=blocks, codes=codes, horizons=horizons,
+                   start=start, end=end, signals={})
+
+
+def evaluate_params(params):
+    """评估一组参数，返回统计行"""
+    arrays, signals = _WORKER['arrays'], _WORKER['signals']
+    stage_signals = {}
+    for stage in FUNNEL:
+        key = (stage,) + tuple(params[name] for name in STAGE_PARAMS[stage])
+        if key not in signals:
+            signals[key] = stage_signal(arrays, stage, build_stage_rules(stage, params))
+        stage_signals[stage] = signals[key]
+
+    horizons = _WORKER['horizons']
+    selections, funnel = collect(arrays, _WORKER['codes'], stage_signals, horizons, _WORKER['start'], _WORKER['end'])
+    row = dict(params)
+    row['入选次数'] = len(selections)
+    row['有入选的交易日'] = int((funnel['technical'] > 0).sum())
+    for h in horizons:
+        returns = selections[f'ret_{h}'].dropna()
+        row[f'平均收益_{h}'] = returns.mean()
+        row[f'中位收益_{h}'] = returns.median()
+        row[f'胜率_{h}'] = (returns > 0).mean() if len(returns) else np.nan
+    return row
+
+
+def param_grid(base, grid):
+    """base 为完整参数，grid 为 {参数名: 候选值列表}，返回全部组合"""
+    names = list(grid)
+    return [{**base, **dict(zip(names, values))} for values in itertools.product(*(grid[n] for n in names))]
+
+
+def sweep(store_root, codes, base, grid, horizons=HORIZONS, start=None, end=None, adjust='hfq', workers=None):
+    """网格扫描，返回每组参数一行的统计表"""
+    codes = [code.split('.')[0] for code in codes]
+    combos = param_grid(base, grid)
+    workers = workers or os.cpu_count()
+
+    start_time = time.time()
+    shared = SharedArrays(load_arrays(store_root, codes, horizons, adjust))
+    print(f"📦 面板加载完成：{len(codes)} 支，共享内存 {shared.nbytes / 2 ** 20:.1f}MB，"
+          f"用时 {time.time() - start_time:.1f}s")
+
+    try:
+        init_args = (shared.spec, codes, tuple(horizons), start, end)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as pool:
+            # 相邻组合大多共享阶段参数，成批分发提高缓存命中
+            chunksize = max(1, len(combos) // (workers * 4))
+            rows = list(pool.map(evaluate_params, combos, chunksize=chunksize))
+    finally:
+        shared.close()
+
+    print(f"⏱️ 扫描完成：{len(combos)} 组参数，{workers} 进程，用时 {time.time() - start_time:.1f}s")
+    return pd.DataFrame(rows)
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+# 测试从仓库根目录导入各模块（仓库为扁平脚本结构，没有安装包）
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pandas as pd
+
+from barstore import BarStore
+
+FIRST_SESSION = pd.Timestamp('20240102')
+
+
+class FakeApi:
+    """日线接口替身：记录请求区间，只返回 FIRST_SESSION 之后的工作日"""
+
+    def __init__(self):
+        self.calls = []
+
+    def stock_zh_a_hist(self, symbol, period, adjust, start_date, end_date):
+        self.calls.append((start_date, end_date))
+        days = pd.bdate_range(max(pd.Timestamp(start_date), FIRST_SESSION), pd.Timestamp(end_date))
+        return pd.DataFrame({'日期': days.strftime('%Y-%m-%d'), '收盘': 1.0})
+
+
+def _expire(store, code):
+    os.utime(store._path(code, 'daily', 'hfq'), (0, 0))
+
+
+def test_no_backfill_when_start_has_no_bars(tmp_path):
+    api = FakeApi()
+    store = BarStore(str(tmp_path), api)
+    store.hist_daily('000001', start_date='20240101')  # 元旦休市，第一根K线晚于起始日
+    for _ in range(3):
+        _expire(store, '000001')
+        store.hist_daily('000001', start_date='20240101')
+    assert len(api.calls) == 4  # 首次全量 + 每次一个增量，没有补拉
+    assert all(start != '20240101' for start, _ in api.calls[1:])
+    assert store.covered_from('000001', 'daily') == pd.Timestamp('20240101')
+
+
+def test_backfill_once_for_earlier_start(tmp_path):
+    api = FakeApi()
+    store = BarStore(str(tmp_path), api)
+    store.hist_daily('000001', start_date='20240301')
+    _expire(store, '000001')
+    df = store.hist_daily('000001', start_date='20231201')
+    assert api.calls[1] == ('20231201', '20240301')
+    assert df['日期'].iloc[0] == '2024-01-02'
+    assert store.covered_from('000001', 'daily') == pd.Timestamp('20231201')
+
+    _expire(store, '000001')
+    store.hist_daily('000001', start_date='20231201')
+    assert len(api.calls) == 4  # 已覆盖，不再补拉
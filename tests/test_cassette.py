@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from cassette import Cassette
+
+
+class StreamTimeout(Exception):
+    pass
+
+
+def _stream(n, fail_at=None):
+    for i in range(n):
+        if i == fail_at:
+            raise StreamTimeout(f"第{i}块超时")
+        yield f"块{i}"
+
+
+def _record(path, calls):
+    """按顺序录制若干次流式调用，返回调用方实际收到的块与异常"""
+    tape = Cassette(str(path), 'record')
+    seen = []
+    for n, fail_at in calls:
+        received = []
+        try:
+            for chunk in tape.call('llm.create', lambda: _stream, (n, fail_at), {}):
+                received.append(chunk)
+        except StreamTimeout as e:
+            received.append(str(e))
+        seen.append(received)
+    tape.save()
+    return tape, seen
+
+
+def test_stream_failure_is_recorded_and_replayed(tmp_path):
+    path = tmp_path / 'tape.bin'
+    tape, recorded = _record(path, [(5, 3), (5, None)])
+    assert recorded == [['块0', '块1', '块2', '第3块超时'], ['块0', '块1', '块2', '块3', '块4']]
+    assert len(tape.entries) == 2
+
+    replay = Cassette(str(path), 'replay')
+    stream = replay.call('llm.create', None, (5, 3), {})
+    assert [next(stream) for _ in range(3)] == ['块0', '块1', '块2']
+    with pytest.raises(StreamTimeout, match='第3块超时'):
+        next(stream)
+    assert list(replay.call('llm.create', None, (5, None), {})) == recorded[1]
+
+
+def test_stream_passes_chunks_through_while_recording(tmp_path):
+    tape = Cassette(str(tmp_path / 'tape.bin'), 'record')
+    stream = tape.call('llm.create', lambda: _stream, (3,), {})
+    assert next(stream) == '块0'
+    assert tape.entries == []  # 边收边转交，不先读完整个流
+    stream.close()  # 调用方提前放弃：记录已收到的部分
+    assert len(tape.entries) == 1 and tape.entries[0]['error'] is None
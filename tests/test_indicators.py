@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import (IncrementalIndicators, MacdWrState, macd_2d, macd_wr_full, rolling_max_2d,
+                        rolling_min_2d, willr_2d)
+
+KEYS = ('dif', 'dea', 'hist', 'wr1', 'wr2')
+
+
+def _bars(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = np.exp(np.cumsum(rng.normal(0, 0.02, n))) * 10
+    high = close * (1 + rng.uniform(0, 0.02, n))
+    low = close * (1 - rng.uniform(0, 0.02, n))
+    times = [str(t) for t in pd.date_range('2024-01-02 10:30', periods=n, freq='h')]
+    return times, high, low, close
+
+
+def _assert_tail(state, high, low, close):
+    """状态中最近 tail 根的指标与整段重算一致（预热期同为NaN）"""
+    full = macd_wr_full(high, low, close)
+    for key in KEYS:
+        expected = full[key].to_numpy()[-len(state.values(key)):]
+        np.testing.assert_allclose(state.values(key), expected, rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=key)
+
+
+def test_incremental_matches_full_across_appends(tmp_path):
+    times, high, low, close = _bars(240)
+    engine = IncrementalIndicators(str(tmp_path))
+    # 分多次追加，覆盖 EMA/信号线/威廉窗口的预热边界；最后一根视为盘中未走完
+    for n in (5, 21, 26, 34, 35, 42, 43, 100, 101, 240):
+        state = engine.update('000001', times[:n], high[:n], low[:n], close[:n], committed_until=times[n - 2])
+        assert state.count == n
+        _assert_tail(state, high[:n], low[:n], close[:n])
+        assert engine.load('000001').last_time == times[n - 2]  # 未走完的K线不落盘
+
+
+def test_save_restore_round_trip(tmp_path):
+    times, high, low, close = _bars(150, seed=1)
+    engine = IncrementalIndicators(str(tmp_path))
+    engine.update('000001', times[:120], high[:120], low[:120], close[:120], committed_until=times[119])
+
+    restored = IncrementalIndicators(str(tmp_path)).load('000001')
+    assert restored.count == 120
+    assert restored.to_dict() == MacdWrState.from_dict(restored.to_dict()).to_dict()
+
+    uninterrupted = MacdWrState()
+    for i in range(150):
+        uninterrupted.push(times[i], high[i], low[i], close[i])
+    for i in range(120, 150):
+        restored.push(times[i], high[i], low[i], close[i])
+    for key in KEYS:
+        np.testing.assert_array_equal(restored.values(key), uninterrupted.values(key))
+    _assert_tail(restored, high, low, close)
+
+
+def test_rebuilds_when_history_changes(tmp_path):
+    times, high, low, close = _bars(120, seed=2)
+    engine = IncrementalIndicators(str(tmp_path))
+    engine.update('000001', times[:100], high[:100], low[:100], close[:100], committed_until=times[99])
+
+    # 仓库重建后前段K线不同：状态对不上，应从头重算
+    close = close * 1.5
+    state = engine.update('000001', times[60:], high[60:] * 1.5, low[60:] * 1.5, close[60:],
+                          committed_until=times[-1])
+    assert state.count == 60
+    _assert_tail(state, high[60:] * 1.5, low[60:] * 1.5, close[60:])
+
+
+def test_flat_window_willr():
+    state = MacdWrState(wr_windows=(2, 3))
+    for i in range(3):
+        state.push(str(i), 10.0, 10.0, 10.0)
+    assert math.isnan(state.values('wr1')[-1])
+
+
+# ---- 二维面板指标 ----
+def _panel(n_codes=60, n_bars=240, seed=0):
+    """右对齐价格面板，约两成代码历史较短（左侧补NaN）"""
+    rng = np.random.default_rng(seed)
+    close = np.exp(np.cumsum(rng.normal(0, 0.02, (n_codes, n_bars)), axis=1)) * 10
+    high = close * (1 + rng.uniform(0, 0.02, close.shape))
+    low = close * (1 - rng.uniform(0, 0.02, close.shape))
+    for i in np.nonzero(rng.random(n_codes) < 0.2)[0]:
+        cut = rng.integers(1, n_bars)
+        close[i, :cut] = high[i, :cut] = low[i, :cut] = np.nan
+    return high, low, close
+
+
+def _assert_panel_matches(reference, atol):
+    high, low, close = _panel()
+    dif, dea, hist = macd_2d(close)
+    panel = {'dif': dif, 'dea': dea, 'hist': hist,
+             'wr1': willr_2d(high, low, close, 21), 'wr2': willr_2d(high, low, close, 42)}
+    for i in range(len(close)):
+        valid = ~np.isnan(close[i])
+        expected = reference(high[i][valid], low[i][valid], close[i][valid])
+        for key, values in panel.items():
+            np.testing.assert_allclose(values[i][valid], np.asarray(expected[key], dtype=float),
+                                       rtol=0, atol=atol, equal_nan=True, err_msg=f"{key} 第{i}行")
+
+
+def test_panel_matches_full():
+    _assert_panel_matches(macd_wr_full, atol=1e-9)
+
+
+def test_panel_matches_pandas_ta():
+    ta = pytest.importorskip('pandas_ta', reason="未安装 pandas_ta，跳过与原逐支实现的对照")
+
+    def reference(high, low, close):
+        high, low, close = pd.Series(high), pd.Series(low), pd.Series(close)
+        macd = ta.macd(close, fast=12, slow=26, signal=9)
+        return {'dif': macd['MACD_12_26_9'], 'dea': macd['MACDs_12_26_9'], 'hist': macd['MACDh_12_26_9'],
+                'wr1': -ta.willr(high, low, close, length=21), 'wr2': -ta.willr(high, low, close, length=42)}
+    _assert_panel_matches(reference, atol=1e-8)
+
+
+def test_panel_matches_talib_tail():
+    talib = pytest.importorskip('talib', reason="未安装 TA-Lib")
+    high, low, close = _panel()
+    dif, dea, hist = macd_2d(close)
+    wr1 = willr_2d(high, low, close, 21)
+    # TA-Lib 的快线EMA从慢线起点才开始，只对照种子影响衰减后的尾部（完整历史的代码）
+    tail = slice(close.shape[1] // 2, None)
+    for i in np.nonzero(~np.isnan(close).any(axis=1))[0]:
+        m, s, h = talib.MACD(close[i], fastperiod=12, slowperiod=26, signalperiod=9)
+        w = -talib.WILLR(high[i], low[i], close[i], timeperiod=21)
+        for mine, theirs in ((dif[i], m), (dea[i], s), (hist[i], h), (wr1[i], w)):
+            np.testing.assert_allclose(mine[tail], theirs[tail], rtol=0, atol=1e-6)
+
+
+def test_rolling_extremes_match_pandas():
+    high, low, _ = _panel(n_codes=20, n_bars=100, seed=4)
+    for window in (1, 5, 21, 100, 101):
+        np.testing.assert_allclose(rolling_max_2d(high, window),
+                                   pd.DataFrame(high).T.rolling(window).max().T.to_numpy(), equal_nan=True)
+        np.testing.assert_allclose(rolling_min_2d(low, window),
+                                   pd.DataFrame(low).T.rolling(window).min().T.to_numpy(), equal_nan=True)
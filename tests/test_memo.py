@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from memo import FetchMemo
+
+
+def test_cached_skips_results_rejected_by_cache_if():
+    memo = FetchMemo()
+    results = iter([{}, {}, {'概念热度': 1}, {'概念热度': 2}])
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return next(results)
+
+    # 获取失败的空结果不记忆：每次重新计算，直到拿到有效结果
+    assert memo.cached('market', compute, max_age=1800, cache_if=bool) == {}
+    assert memo.cached('market', compute, max_age=1800, cache_if=bool) == {}
+    assert memo.cached('market', compute, max_age=1800, cache_if=bool) == {'概念热度': 1}
+    assert memo.cached('market', compute, max_age=1800, cache_if=bool) == {'概念热度': 1}
+    assert len(calls) == 3
+
+
+def test_cached_keeps_any_result_by_default():
+    memo = FetchMemo()
+    calls = []
+    for _ in range(2):
+        assert memo.cached('market', lambda: calls.append(1) or {}, max_age=1800) == {}
+    assert len(calls) == 1
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""面板放量筛选 amount_ratio_screen 与 StockAnalyzer._amount_passed 逐支判定的对照"""
+import contextlib
+import io
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import benchmark
+from panel import amount_ratio_screen, build_panel
+
+# 覆盖数据量门槛两侧；短于 MIN_DATA_LENGTH 的在面板左侧补NaN，长于的只取最近一段
+LENGTHS = (0, 1, 20, 21, 99, 100, 119, 120, 121, 160, 400)
+
+
+@pytest.fixture(scope='module')
+def env(tmp_path_factory):
+    main = benchmark._load_main()
+    benchmark._configure(main.Config, str(tmp_path_factory.mktemp('panel')))
+    analyzer = main.StockAnalyzer()
+    yield SimpleNamespace(analyzer=analyzer, config=main.Config)
+    analyzer.engine.shutdown()
+
+
+def _amount_series(seed=0):
+    """各长度若干支；近期窗口按 0.5~3 倍放量，部分序列含停牌NaN"""
+    rng = np.random.default_rng(seed)
+    series_list = []
+    for length in LENGTHS:
+        for _ in range(8):
+            amounts = rng.uniform(1e6, 5e6, length)
+            amounts[-20:] *= rng.uniform(0.5, 3.0)
+            if length > 40 and rng.random() < 0.3:
+                amounts[rng.integers(0, length, 3)] = np.nan
+            series_list.append(amounts)
+    return series_list
+
+
+def test_amount_ratio_screen_matches_per_code(env):
+    analyzer, config = env.analyzer, env.config
+    series_list = _amount_series()
+    panel, lengths = build_panel(series_list, config.MIN_DATA_LENGTH)
+    passed, _, _ = amount_ratio_screen(panel, lengths, config.AMOUNT_WINDOW, config.AMOUNT_RATIO,
+                                       config.MIN_DATA_LENGTH)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        # 逐支路径由 _get_amount_data 取最近 MIN_DATA_LENGTH 根
+        reference = np.array([analyzer._amount_passed(str(i), pd.Series(values).iloc[-config.MIN_DATA_LENGTH:])
+                              for i, values in enumerate(series_list)], dtype=bool)
+    assert 0 < reference.sum() < len(reference)
+    np.testing.assert_array_equal(passed, reference)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import io
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from barstore import last_session_close
+from pipeline import Pipeline, StageResult
+
+
+class FakeAnalyzer:
+    def __init__(self):
+        self.today = datetime.now()
+        self.screened = []
+
+    def get_qiangrizhangfu(self, codes):
+        self.screened.append(list(codes))
+        return codes
+
+    @staticmethod
+    def _read_codes(path):
+        with open(path) as f:
+            return [line.strip() for line in f if line.strip()]
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    config = SimpleNamespace(**{name: str(tmp_path / f'{name}.txt') for name in
+                                ('INITIAL_SCREENING_PATH', 'RESULT_PATH', 'TECHNICAL_PATH', 'FINAL_RESULT_PATH')},
+                             JOURNAL_DIR=str(tmp_path / 'journal'))
+    return Pipeline(FakeAnalyzer(), config, write_artifacts=False)
+
+
+def _run(pipeline, stages):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return pipeline.run(stages)
+
+
+def _amount_result(started_at):
+    return StageResult('amount', ['000001'], started_at, 1.0)
+
+
+def test_uses_upstream_from_current_session(pipeline):
+    pipeline.results['amount'] = _amount_result(datetime.now())
+    _run(pipeline, ['qiangrizhangfu'])
+    assert pipeline.analyzer.screened == [['000001']]
+
+
+def test_outdated_upstream_result_fails(pipeline):
+    # 常驻进程里前几晚的成交金额结果：本晚任务失败后不应被早盘沿用
+    pipeline.results['amount'] = _amount_result(last_session_close() - timedelta(hours=1))
+    with pytest.raises(RuntimeError, match='amount'):
+        _run(pipeline, ['qiangrizhangfu'])
+    assert pipeline.analyzer.screened == []
+
+
+def test_artifact_checked_by_modification_time(pipeline):
+    path = pipeline.artifacts['amount']
+    with pytest.raises(RuntimeError, match='无结果文件'):
+        _run(pipeline, ['qiangrizhangfu'])
+
+    with open(path, 'w') as f:
+        f.write('000002\n')
+    stale = (last_session_close() - timedelta(days=2)).timestamp()
+    os.utime(path, (stale, stale))
+    with pytest.raises(RuntimeError, match='结果文件'):
+        _run(pipeline, ['qiangrizhangfu'])
+
+    os.utime(path, None)
+    _run(pipeline, ['qiangrizhangfu'])
+    assert pipeline.analyzer.screened == [['000002']]
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from resample import compare_bars, resample
+
+DAYS = ('2024-12-27', '2024-12-30', '2024-12-31', '2025-01-02', '2025-01-03', '2025-01-06')
+
+
+def _clock_times(day, step):
+    """东财口径的分钟线时间：09:30 集合竞价一根，之后以K线结束时间标记，午休无K线"""
+    morning = pd.date_range(f'{day} 09:30', f'{day} 11:30', freq=f'{step}min')
+    afternoon = pd.date_range(f'{day} 13:00', f'{day} 15:00', freq=f'{step}min')[1:]
+    return morning.append(afternoon)
+
+
+def _minute_bars(step=5, days=DAYS, seed=0):
+    times = pd.DatetimeIndex([]).append([_clock_times(day, step) for day in days])
+    rng = np.random.default_rng(seed)
+    close = np.round(10 + np.cumsum(rng.normal(0, 0.02, len(times))), 2)
+    open_ = np.round(close + rng.normal(0, 0.01, len(times)), 2)
+    return pd.DataFrame({
+        '时间': times.strftime('%Y-%m-%d %H:%M:%S'),
+        '开盘': open_,
+        '收盘': close,
+        '最高': np.maximum(open_, close) + 0.01,
+        '最低': np.minimum(open_, close) - 0.01,
+        '成交量': rng.integers(100, 1000, len(times)),
+        '成交额': np.round(rng.uniform(1e5, 1e6, len(times)), 2),
+    })
+
+
+def _expected(df, intervals):
+    """按 (标签时钟, 起, 止] 区间独立聚合，作为交易所K线的参照"""
+    times = pd.to_datetime(df['时间'])
+    clock = times.dt.strftime('%H:%M')
+    rows = []
+    for day, bars in df.groupby(times.dt.date):
+        bar_clock = clock[bars.index]
+        for label, start, stop in intervals:
+            part = bars[(bar_clock > start) & (bar_clock <= stop)]
+            rows.append({'时间': f'{day} {label}:00', '开盘': part['开盘'].iloc[0], '收盘': part['收盘'].iloc[-1],
+                         '最高': part['最高'].max(), '最低': part['最低'].min(),
+                         '成交量': part['成交量'].sum(), '成交额': part['成交额'].sum()})
+    return pd.DataFrame(rows)
+
+
+# 09:30 的集合竞价并入第一根；11:30 收盘的K线不跨午休；15:00 之后的盘后K线并入最后一根
+HOURLY = [('10:30', '09:00', '10:30'), ('11:30', '10:30', '11:30'),
+          ('14:00', '13:00', '14:00'), ('15:00', '14:00', '15:30')]
+TWO_HOURLY = [('11:30', '09:00', '11:30'), ('15:00', '13:00', '15:30')]
+
+
+@pytest.mark.parametrize('step', [1, 5, 15, 30])
+def test_hourly_session_boundaries(step):
+    source = _minute_bars(step)
+    local = resample(source, '60')
+    assert list(pd.to_datetime(local['时间']).dt.strftime('%H:%M')[:4]) == ['10:30', '11:30', '14:00', '15:00']
+    assert compare_bars(local, _expected(source, HOURLY)).empty
+
+
+def test_two_hourly_and_after_hours():
+    source = _minute_bars(5)
+    # 科创板盘后固定价格交易：15:30 的盘后K线并入当日最后一根
+    after = source[source['时间'].str.endswith('15:00:00')].copy()
+    after['时间'] = after['时间'].str.replace('15:00:00', '15:30:00')
+    source = pd.concat([source, after], ignore_index=True)
+
+    assert compare_bars(resample(source, '120'), _expected(source, TWO_HOURLY)).empty
+    hourly = resample(source, '60')
+    assert len(hourly) == 4 * len(DAYS)
+    assert compare_bars(hourly, _expected(source, HOURLY)).empty
+
+
+def test_daily_matches_session_totals():
+    source = _minute_bars(5)
+    daily = resample(source, 'daily')
+    expected = _expected(source, [('00:00', '00:00', '23:59')])
+    expected['时间'] = pd.to_datetime(expected['时间']).dt.date
+    assert list(daily['日期']) == list(expected['时间'])
+    assert compare_bars(daily, expected.rename(columns={'时间': '日期'})).empty
+
+
+def test_weekly_labels():
+    daily = resample(_minute_bars(30), 'daily')
+    weekly = resample(daily, 'weekly')
+    # 以当周最后一个交易日标记；元旦所在周跨年按ISO周合并（12-30 ~ 01-03）
+    assert [str(d) for d in weekly['日期']] == ['2024-12-27', '2025-01-03', '2025-01-06']
+    week = daily.iloc[1:5]
+    row = weekly.iloc[1]
+    assert row['开盘'] == week['开盘'].iloc[0] and row['收盘'] == week['收盘'].iloc[-1]
+    assert row['最高'] == week['最高'].max() and row['最低'] == week['最低'].min()
+    assert row['成交量'] == week['成交量'].sum()
+    # 分钟线直接合成周线与经日线合成一致
+    pd.testing.assert_frame_equal(resample(_minute_bars(30), 'weekly'), weekly)
+
+
+def test_compare_bars_reports_mismatch_and_missing():
+    source = _minute_bars(5, days=DAYS[:2])
+    expected = _expected(source, HOURLY)
+    expected.loc[1, '成交量'] += 1000
+    expected = expected.drop(index=5)
+    report = compare_bars(resample(source, '60'), expected, columns=['成交量'])
+    assert len(report) == 2
+    assert report['交易所'].isna().sum() == 1
+
+
+def test_daily_cannot_resample_intraday():
+    with pytest.raises(ValueError):
+        resample(resample(_minute_bars(30), 'daily'), '60')
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""面板规则集与 StockAnalyzer 逐支判定的对照（合成行情 + 临时目录下的本地K线仓库）"""
+import contextlib
+import io
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import benchmark
+from indicators import macd_wr_full
+from rules import technical_fields
+
+# 部分代码截短历史，覆盖各阶段数据量门槛两侧（及面板左侧补NaN）
+DAILY_LENGTHS = (5, 29, 30, 31, 60)
+MIN_LENGTHS = (50, 99, 100, 119, 120, 121, 200)
+
+
+@pytest.fixture(scope='module')
+def env(tmp_path_factory):
+    main = benchmark._load_main()
+    market = benchmark.SyntheticMarket(160, seed=3)
+    main.ak = market
+    benchmark._configure(main.Config, str(tmp_path_factory.mktemp('rules')))
+    analyzer = main.StockAnalyzer()
+    store = analyzer.bar_store
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for code, length in zip(market.codes, DAILY_LENGTHS):
+            store.save(code, 'daily', 'hfq', store.hist_daily(code).tail(length))
+        for code, length in zip(market.codes[-len(MIN_LENGTHS):], MIN_LENGTHS):
+            store.save(code, '60', 'hfq', store.hist_min(code).tail(length))
+    yield SimpleNamespace(analyzer=analyzer, config=main.Config, codes=market.codes, store=store)
+    analyzer.engine.shutdown()
+
+
+def _quiet(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+
+def _assert_parity(passed, reference):
+    reference = np.array(reference, dtype=bool)
+    assert 0 < reference.sum() < len(reference)  # 通过与淘汰都要有，避免全 False 的空对照
+    np.testing.assert_array_equal(passed, reference)
+
+
+def test_qiangri_matches_per_code(env):
+    analyzer, codes = env.analyzer, env.codes
+    frames = {code: _quiet(analyzer._qiangri_bars, code) for code in codes}
+    fields, lengths = analyzer._panel_fields(
+        frames, codes, {'open': '开盘', 'close': '收盘', 'volume': '成交量'}, env.config.QIANGRI_MIN_BARS
+    )
+    passed, _ = analyzer.rule_sets()['qiangrizhangfu'].evaluate(fields, lengths)
+    _assert_parity(passed, [_quiet(analyzer._qiangri_passed, code, frames[code]) for code in codes])
+
+
+def test_amount_matches_per_code(env):
+    analyzer, codes = env.analyzer, env.codes
+    frames = {code: _quiet(env.store.hist_min, code) for code in codes}
+    fields, lengths = analyzer._panel_fields(frames, codes, {'amount': '成交额'}, env.config.MIN_DATA_LENGTH)
+    passed, _ = analyzer.rule_sets()['amount'].evaluate(fields, lengths)
+    _assert_parity(passed, [_quiet(analyzer._analyze_single_stock, code) for code in codes])
+
+
+def test_technical_matches_per_code(env):
+    analyzer, codes = env.analyzer, env.codes
+    frames = {code: _quiet(analyzer._technical_bars, code) for code in codes}
+    width = max(len(df) for df in frames.values())
+    prices, lengths = analyzer._panel_fields(frames, codes, {'high': '最高', 'low': '最低', 'close': '收盘'}, width)
+    fields = technical_fields(prices['high'], prices['low'], prices['close'])
+    passed, _ = analyzer.rule_sets()['technical'].evaluate(fields, lengths)
+
+    reference = []
+    for code in codes:
+        df = frames[code]
+        if len(df) < env.config.TECHNICAL_MIN_BARS:
+            reference.append(False)  # 同 _technical_single 的数据量校验
+            continue
+        ind = macd_wr_full(df['最高'].values, df['最低'].values, df['收盘'].values)
+        reference.append(_quiet(analyzer._technical_passed, code, ind['wr1'], ind['wr2'], ind['dif'],
+                                ind['dea'], ind['hist']))
+    _assert_parity(passed, reference)
+
+
+def test_series_last_bar_matches_evaluate(env):
+    analyzer, codes = env.analyzer, env.codes
+    frames = {code: _quiet(env.store.hist_min, code) for code in codes}
+    fields, lengths = analyzer._panel_fields(frames, codes, {'amount': '成交额'}, env.config.MIN_DATA_LENGTH)
+    rules = analyzer.rule_sets()['amount']
+    series = rules.evaluate_series(fields, lengths)
+    np.testing.assert_array_equal(series[:, -1], rules.evaluate(fields, lengths)[0])